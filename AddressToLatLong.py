@@ -16,7 +16,10 @@
 import json
 import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
-from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
+from nifiapi.properties import PropertyDescriptor, PropertyDependency, StandardValidators, ExpressionLanguageScope
+
+ATTRIBUTE = "attribute"
+RECORDS = "records"
 
 ### https://openstreetmap.org/copyright
 ### “OpenStreetMap” a link to openstreetmap.org/copyright, 
@@ -24,7 +27,7 @@ from nifiapi.properties import PropertyDescriptor, StandardValidators, Expressio
 ### (which OpenStreetMap needs to credit)
 ### as well as the ODbL.
 ### https://medium.com/@gopesh3652/geocoding-with-python-using-nominatim-a-beginners-guide-220b250ca48d
-### pip3 install geopy
+### pip3 install requests
 ### Address to Latitude and Longitude
 class AddressToLatLong(FlowFileTransform):
     class Java:
@@ -32,39 +35,256 @@ class AddressToLatLong(FlowFileTransform):
 
     class ProcessorDetails:
         version = '2.0.0-M2'
-        dependencies = ['geopy' ]
+        dependencies = ['requests' ]
         description = """OpenStreamMaps ODBL openstreetmap.org/copyright Nominatim for parsing addresses and getting lat/long"""
-        tags = ["locations","osm",  "latitude", "longitude", "NLP", "Nominatim", "addresses", "lat/long", "ai", "OpenStreamMaps", "geopy", "text"]
+        tags = ["locations","osm",  "latitude", "longitude", "NLP", "Nominatim", "addresses", "lat/long", "ai", "OpenStreamMaps", "text"]
+
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="attribute geocodes the Parse Text value. records reads JSON Lines or CSV records and adds a geocode object with the same fields as the attributes to each record, geocoding the distinct addresses of a batch concurrently",
+        required=True,
+        default_value=ATTRIBUTE,
+        allowable_values=[ATTRIBUTE, RECORDS]
+    )
 
     PARSE_TEXT = PropertyDescriptor(
         name="Parse Text",
         description="Specifies the text to extract latitude and longitude for addresse",
         required=True,
         validators=[StandardValidators.NON_EMPTY_VALIDATOR],
-        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    RECORD_FORMAT = PropertyDescriptor(
+        name="Record Format",
+        description="records input: jsonl (one JSON object per line) or csv (with a header row). The output uses the same format",
+        required=True,
+        default_value="jsonl",
+        allowable_values=["jsonl", "csv"]
+    )
+
+    ADDRESS_FIELD = PropertyDescriptor(
+        name="Address Field",
+        description="records input: field of each record that holds the address",
+        required=True,
+        default_value="address",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RECORD_BATCH_SIZE = PropertyDescriptor(
+        name="Record Batch Size",
+        description="records input: number of records geocoded together",
+        required=True,
+        default_value="100",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    BULK_CONCURRENCY = PropertyDescriptor(
+        name="Bulk Concurrency",
+        description="records input: addresses of a batch geocoded at the same time. Requests Per Second still applies",
+        required=True,
+        default_value="4",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    GEOCODER = PropertyDescriptor(
+        name="Geocoder",
+        description="nominatim asks the OpenStreetMap Nominatim service, offline matches the address against a local gazetteer file without any network call",
+        required=True,
+        default_value="nominatim",
+        allowable_values=["nominatim", "offline"]
+    )
+
+    GAZETTEER_FILE = PropertyDescriptor(
+        name="Gazetteer File",
+        description="CSV (with a header row) or Parquet file of places for the offline geocoder, with display_name or name, lat and lon columns and optionally address, osm_id, place_id, class, type, place_rank, importance, addresstype and boundingbox. Parquet needs pyarrow",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    MIN_MATCH_SCORE = PropertyDescriptor(
+        name="Minimum Match Score",
+        description="Lowest trigram similarity (0 to 1) the offline geocoder accepts as a match, 1 only accepts exact normalized addresses",
+        required=True,
+        default_value="0.5",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    NOMINATIM_URL = PropertyDescriptor(
+        name="Nominatim URL",
+        description="Base URL of the Nominatim server, such as a self hosted one on localhost",
+        required=True,
+        default_value="https://nominatim.openstreetmap.org",
+        validators=[StandardValidators.URL_VALIDATOR]
+    )
+
+    REQUESTS_PER_SECOND = PropertyDescriptor(
+        name="Requests Per Second",
+        description="Nominatim requests per second shared by all concurrent tasks (the public server allows 1). 0 is unlimited, for a server of your own",
+        required=True,
+        default_value="1",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    GEOCODE_CACHE_SIZE = PropertyDescriptor(
+        name="Geocode Cache Size",
+        description="Number of geocoded addresses kept in memory, keyed by the normalized address (case, punctuation, whitespace and street/unit/direction abbreviations folded). 0 disables the cache",
+        required=True,
+        default_value="10000",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    GEOCODE_CACHE_TTL = PropertyDescriptor(
+        name="Geocode Cache TTL (s)",
+        description="Seconds a geocoded address stays valid. 0 keeps it until it is evicted",
+        required=True,
+        default_value="2592000",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    NEGATIVE_CACHE_TTL = PropertyDescriptor(
+        name="Negative Cache TTL (s)",
+        description="Seconds an address the geocoder could not find is remembered as not found. 0 does not cache misses",
+        required=True,
+        default_value="86400",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    GEOCODE_CACHE_PATH = PropertyDescriptor(
+        name="Geocode Cache Path",
+        description="Optional SQLite file for an on-disk cache tier that survives restarts",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    GEOCODE_CACHE_DISK_ENTRIES = PropertyDescriptor(
+        name="Geocode Cache Disk Entries",
+        description="Maximum number of addresses in the SQLite file, the least recently used are removed first. 0 is unlimited",
+        required=True,
+        default_value="1000000",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
     )
 
     property_descriptors = [
-        PARSE_TEXT
+        PARSE_TEXT,
+        INPUT_SOURCE,
+        RECORD_FORMAT,
+        ADDRESS_FIELD,
+        RECORD_BATCH_SIZE,
+        BULK_CONCURRENCY,
+        GEOCODER,
+        GAZETTEER_FILE,
+        MIN_MATCH_SCORE,
+        NOMINATIM_URL,
+        REQUESTS_PER_SECOND,
+        GEOCODE_CACHE_SIZE,
+        GEOCODE_CACHE_TTL,
+        NEGATIVE_CACHE_TTL,
+        GEOCODE_CACHE_PATH,
+        GEOCODE_CACHE_DISK_ENTRIES,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.PARSE_TEXT)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.RECORD_FORMAT)
+        self.property_descriptors.append(self.ADDRESS_FIELD)
+        self.property_descriptors.append(self.RECORD_BATCH_SIZE)
+        self.property_descriptors.append(self.BULK_CONCURRENCY)
+        self.property_descriptors.append(self.GEOCODER)
+        self.property_descriptors.append(self.GAZETTEER_FILE)
+        self.property_descriptors.append(self.MIN_MATCH_SCORE)
+        self.property_descriptors.append(self.NOMINATIM_URL)
+        self.property_descriptors.append(self.REQUESTS_PER_SECOND)
+        self.property_descriptors.append(self.GEOCODE_CACHE_SIZE)
+        self.property_descriptors.append(self.GEOCODE_CACHE_TTL)
+        self.property_descriptors.append(self.NEGATIVE_CACHE_TTL)
+        self.property_descriptors.append(self.GEOCODE_CACHE_PATH)
+        self.property_descriptors.append(self.GEOCODE_CACHE_DISK_ENTRIES)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
-    def transform(self, context, flowfile):
-        from geopy.geocoders import Nominatim
+    def getOfflineGeocoder(self, context):
+        from offline_geocoder import load_geocoder
 
-        # Instantiate a new Nominatim client
-        app = Nominatim(user_agent="nifi-AddressToLatLong-nominatim")
+        path = context.getProperty(self.GAZETTEER_FILE).getValue()
+        if not path:
+            raise ValueError("Gazetteer File is required for the offline geocoder")
+        return load_geocoder(path)
 
-        parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
+    def onScheduled(self, context):
+        # build the trigram index before the first FlowFile
+        if context.getProperty(self.GEOCODER).getValue() == "offline":
+            self.getOfflineGeocoder(context)
+
+    def getGeocodeCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.GEOCODE_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("AddressToLatLong", size,
+                         context.getProperty(self.GEOCODE_CACHE_TTL).asInteger(),
+                         context.getProperty(self.GEOCODE_CACHE_PATH).getValue(),
+                         context.getProperty(self.GEOCODE_CACHE_DISK_ENTRIES).asInteger())
+
+    def getClient(self, context):
+        from geocoding_client import get_client
+
+        return get_client(context.getProperty(self.NOMINATIM_URL).getValue(), "nifi-AddressToLatLong-nominatim",
+                          float(context.getProperty(self.REQUESTS_PER_SECOND).getValue()))
+
+    def geocodeAddress(self, context, cache, address, timer=None):
+        """(raw location or None, cache hit, match score or None) for address.
+
+        timer is None when addresses are geocoded concurrently.
+        """
+        from stage_timer import optional_stage
+
+        if context.getProperty(self.GEOCODER).getValue() == "offline":
+            with optional_stage(timer, "load"):
+                geocoder = self.getOfflineGeocoder(context)
 
-        location = app.geocode(str(parse_text)).raw
+            with optional_stage(timer, "lookup"):
+                location, score = geocoder.geocode(address, float(context.getProperty(self.MIN_MATCH_SCORE).getValue()))
+            return location, False, score
 
+        # repeated addresses, and addresses Nominatim did not find, are answered from the cache
+        if cache is not None:
+            from geocode_cache import address_key
+
+            with optional_stage(timer, "cache"):
+                cache_key = address_key(address, "AddressToLatLong:nominatim")
+                cached = cache.get(cache_key)
+            if cached is not None:
+                return cached["raw"], True, None
+
+        # one shared client: rate limited, keep-alive, concurrent requests for one address share the call
+        with optional_stage(timer, "http"):
+            location = self.getClient(context).geocode(address)
+
+        if cache is not None:
+            if location is not None:
+                cache.put(cache_key, {"raw": location})
+            elif context.getProperty(self.NEGATIVE_CACHE_TTL).asInteger() > 0:
+                cache.put(cache_key, {"raw": None}, context.getProperty(self.NEGATIVE_CACHE_TTL).asInteger())
+        return location, False, None
+
+    def locationAttributes(self, location, cachehit, score, cache):
         latitude = ""
         longitude = ""
         license = ""
@@ -79,27 +299,93 @@ class AddressToLatLong(FlowFileTransform):
         boundingbox = ""
         osm_importance = ""
 
-        try:
-            latitude = str(location['lat'])
-            longitude = str(location['lon'])
-            license = str(location['licence'])
-            osm_id = str(location['osm_id'])
-            place_id = str(location['place_id'])
-            osm_class = str(location['class'])
-            osm_type = str(location['type'])
-            place_rank = str(location['place_rank'])
-            osm_importance = str(location['importance'])
-            addresstype = str(location['addresstype'])
-            osm_name = str(location['name'])
-            display_name = str(location['display_name'])
-            boundingbox = str(location['boundingbox'])
-        except Exception as ex:
-            print(ex)
+        if location is not None:
+            try:
+                latitude = str(location['lat'])
+                longitude = str(location['lon'])
+                license = str(location['licence'])
+                osm_id = str(location['osm_id'])
+                place_id = str(location['place_id'])
+                osm_class = str(location['class'])
+                osm_type = str(location['type'])
+                place_rank = str(location['place_rank'])
+                osm_importance = str(location['importance'])
+                addresstype = str(location['addresstype'])
+                osm_name = str(location['name'])
+                display_name = str(location['display_name'])
+                boundingbox = str(location['boundingbox'])
+            except Exception as ex:
+                print(ex)
 
         attributes = { "latitude": latitude, "longitude": longitude,
                        "osmlicense": license,  "osmid": osm_id,
                        "place_id": place_id, "osmclass": osm_class,
                        "osmtype": osm_type, "placerank": place_rank,
                        "osmimportance": osm_importance, "addresstype": addresstype,
-                       "osmname": osm_name, "displayname": display_name, "boundingbox": boundingbox }
+                       "osmname": osm_name, "displayname": display_name, "boundingbox": boundingbox,
+                       "geocoded": str(location is not None).lower() }
+        if score is not None:
+            attributes["matchscore"] = "{:.3f}".format(score)
+        if cache is not None:
+            attributes["cachehit"] = str(cachehit).lower()
+        return attributes
+
+    def recordBatch(self, context, cache, addresses):
+        from concurrent.futures import ThreadPoolExecutor
+        from geocode_cache import normalize_address
+
+        # each distinct address is geocoded once per batch
+        distinct = dict()
+        for address in addresses:
+            if address.strip() != "":
+                distinct.setdefault(normalize_address(address), address)
+        keys = list(distinct)
+        with ThreadPoolExecutor(max_workers=context.getProperty(self.BULK_CONCURRENCY).asInteger()) as pool:
+            results = dict(zip(keys, pool.map(lambda key: self.geocodeAddress(context, cache, distinct[key]), keys)))
+
+        fields = []
+        for address in addresses:
+            location, cachehit, score = results.get(normalize_address(address), (None, False, None))
+            fields.append({"geocode": self.locationAttributes(location, cachehit, score, cache)})
+        return fields
+
+    def transformRecords(self, context, flowfile, timer):
+        from record_io import enrich, MIME_TYPES
+
+        cache = self.getGeocodeCache(context) if context.getProperty(self.GEOCODER).getValue() != "offline" else None
+        record_format = context.getProperty(self.RECORD_FORMAT).getValue()
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        geocoded = [0]
+
+        def geocode(addresses):
+            fields = self.recordBatch(context, cache, addresses)
+            geocoded[0] += sum(1 for field in fields if field["geocode"]["geocoded"] == "true")
+            return fields
+
+        contents, recordcount = enrich(data, record_format, context.getProperty(self.ADDRESS_FIELD).getValue(),
+                                       context.getProperty(self.RECORD_BATCH_SIZE).asInteger(), geocode, timer)
+
+        attributes = {"record.count": str(recordcount), "geocodedcount": str(geocoded[0]), "mime.type": MIME_TYPES[record_format]}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transform(self, context, flowfile):
+        import stage_timer
+
+        timer = stage_timer.start("AddressToLatLong")
+        if context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+            return self.transformRecords(context, flowfile, timer)
+
+        parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
+        if parse_text is None or parse_text.strip() == "":
+            self.logger.error("Nothing to geocode, Parse Text is empty")
+            return FlowFileTransformResult(relationship = "failure")
+
+        # the offline geocoder is a local lookup and needs no cache
+        cache = self.getGeocodeCache(context) if context.getProperty(self.GEOCODER).getValue() != "offline" else None
+        location, cachehit, score = self.geocodeAddress(context, cache, str(parse_text), timer)
+
+        attributes = self.locationAttributes(location, cachehit, score, cache)
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
         return FlowFileTransformResult(relationship = "success", contents=str(location), attributes=attributes)        
@@ -0,0 +1,210 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
+from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
+
+# One processor for NSFWImageDetection, FacialEmotionsImageDetection,
+# RESNetImageClassification and CaptionImage.  The image is read and decoded
+# once, resized once per input size and normalized once per preprocessing
+# config, then every selected head runs on the shared tensors.
+# Models come from the shared model registry, so they are the same instances
+# the single-head processors use.
+
+NSFW = "nsfw"
+EMOTIONS = "emotions"
+RESNET = "resnet"
+CAPTION = "caption"
+
+HEAD_MODELS = {
+    NSFW: "Falconsai/nsfw_image_detection",
+    EMOTIONS: "dima806/facial_emotions_image_detection",
+    RESNET: "microsoft/resnet-50",
+    CAPTION: "Salesforce/blip-image-captioning-large"
+}
+
+TOP_K = 5
+
+### Multi-head image analysis
+class AnalyzeImage(FlowFileTransform):
+    class Java:
+        implements = ['org.apache.nifi.python.processor.FlowFileTransform']
+
+    class ProcessorDetails:
+        version = '2.0.0-M2'
+        dependencies = ['transformers', 'torch', 'pillow']
+        description = """Run NSFW, facial emotion, ResNet classification and caption heads on an image with a single decode"""
+        tags = ["image detection", "image classification", "caption", "nsfw", "emotions", "resnet", "huggingface", "ai", "artificial intelligence", "ml", "machine learning", "images", "LLM"]
+
+    IMAGE_HEADS = PropertyDescriptor(
+        name="Image Heads",
+        description="Comma separated list of heads to run: nsfw, emotions, resnet, caption",
+        required=True,
+        default_value="nsfw,emotions,resnet,caption",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR],
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    property_descriptors = [
+        IMAGE_HEADS,
+        TIMING_ATTRIBUTES
+    ]
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.property_descriptors.append(self.IMAGE_HEADS)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
+
+    def getPropertyDescriptors(self):
+        return self.property_descriptors
+
+    def parseHeads(self, value):
+        heads = [head.strip().lower() for head in str(value).split(",") if head.strip() != ""]
+        unknown = [head for head in heads if head not in HEAD_MODELS]
+        if len(unknown) > 0:
+            raise ValueError("Unknown image heads " + ", ".join(unknown) + ", expected " + ", ".join(HEAD_MODELS))
+        return list(dict.fromkeys(heads))
+
+    def loadHead(self, head):
+        from model_registry import get_model
+
+        model_name = HEAD_MODELS[head]
+
+        if head == CAPTION:
+            def caption_loader():
+                from transformers import BlipProcessor, BlipForConditionalGeneration
+                return (BlipProcessor.from_pretrained(model_name), BlipForConditionalGeneration.from_pretrained(model_name))
+
+            processor, model = get_model("image-to-text:" + model_name, caption_loader)
+            return (processor.image_processor, processor, model)
+
+        if head == RESNET:
+            def resnet_loader():
+                from transformers import AutoImageProcessor, ResNetForImageClassification
+                model = ResNetForImageClassification.from_pretrained(model_name)
+                model.eval()
+                return (AutoImageProcessor.from_pretrained(model_name), model)
+
+            image_processor, model = get_model("image-classification-model:" + model_name, resnet_loader)
+            return (image_processor, None, model)
+
+        def pipeline_loader():
+            from transformers import pipeline
+            return pipeline("image-classification", model=model_name)
+
+        classifier = get_model("image-classification:" + model_name, pipeline_loader)
+        return (classifier.image_processor, None, classifier.model)
+
+    def onScheduled(self, context):
+        import model_registry
+        import stage_timer
+
+        with stage_timer.timed("AnalyzeImage", "load"):
+            for head in self.parseHeads(context.getProperty(self.IMAGE_HEADS).getValue() or ",".join(HEAD_MODELS)):
+                self.loadHead(head)
+        self.logger.info("Model registry " + json.dumps(model_registry.stats()))
+
+    def preprocess(self, image, image_processor, resized, tensors):
+        # Identical preprocessing configs share one tensor
+        config = image_processor.to_dict()
+        config.pop("_processor_class", None)
+        config.pop("image_processor_type", None)
+        signature = json.dumps(config, sort_keys=True, default=str)
+        if signature in tensors:
+            return tensors[signature]
+
+        # Fixed height/width resizes are shared across configs that only differ in normalization
+        size = config.get("size") or {}
+        kwargs = dict()
+        if config.get("do_resize") and "height" in size and "width" in size:
+            resize_key = (size["height"], size["width"], config.get("resample"))
+            if resize_key not in resized:
+                from PIL import Image
+                resample = config.get("resample")
+                resized[resize_key] = image.resize((size["width"], size["height"]), resample=Image.Resampling(resample) if resample is not None else None)
+            image = resized[resize_key]
+            kwargs["do_resize"] = False
+
+        pixel_values = image_processor(image, return_tensors="pt", **kwargs)["pixel_values"]
+        tensors[signature] = pixel_values
+        return pixel_values
+
+    def transform(self, context, flowfile):
+        from PIL import Image
+        import io
+        import torch
+        import stage_timer
+
+        timer = stage_timer.start("AnalyzeImage")
+        heads = self.parseHeads(context.getProperty(self.IMAGE_HEADS).evaluateAttributeExpressions(flowfile).getValue())
+
+        # Read and decode the FlowFile content once for every head
+        with timer.stage("read"):
+            imagebinary = flowfile.getContentsAsBytes()
+        with timer.stage("decode"):
+            raw_image = Image.open(io.BytesIO(imagebinary)).convert("RGB")
+
+        attributes = {"imageheads": ",".join(heads)}
+        resized = dict()
+        tensors = dict()
+
+        for head in heads:
+            with timer.stage("load"):
+                image_processor, processor, model = self.loadHead(head)
+            with timer.stage("preprocess"):
+                pixel_values = self.preprocess(raw_image, image_processor, resized, tensors)
+
+            with timer.stage("inference"), torch.no_grad():
+                if head == CAPTION:
+                    out = model.generate(pixel_values=pixel_values)
+                    attributes["caption"] = processor.decode(out[0], skip_special_tokens=True)
+                    continue
+
+                logits = model(pixel_values=pixel_values).logits[0]
+
+            if head == RESNET:
+                attributes["classificationlabel"] = str(model.config.id2label[int(logits.argmax(-1).item())])
+                continue
+
+            scores = logits.softmax(-1)
+            top = scores.topk(min(TOP_K, scores.shape[-1]))
+            results = [{"label": model.config.id2label[int(index)], "score": float(score)} for score, index in zip(top.values.tolist(), top.indices.tolist())]
+
+            if head == NSFW:
+                for result in results:
+                    if str(result['label']) == 'normal':
+                        attributes["normal"] = str(result['score'])
+                    else:
+                        attributes["nsfw"] = str(result['score'])
+            else:
+                icount = 1
+                for result in results:
+                    attributes["label" + str(icount)] = str(result['label'])
+                    attributes["score" + str(icount)] = str(result['score'])
+                    icount = icount + 1
+
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+
+        return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
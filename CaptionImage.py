@@ -18,6 +18,8 @@ import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 
+MODEL_NAME = "Salesforce/blip-image-captioning-large"
+
 ### BLIP for image captioning
 class CaptionImage(FlowFileTransform):
 	class Java:
@@ -37,36 +39,157 @@ class CaptionImage(FlowFileTransform):
 		expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
 	)
 
+	MAX_BATCH_SIZE = PropertyDescriptor(
+		name="Max Batch Size",
+		description="Maximum number of images from concurrent tasks that are run in one forward pass",
+		required=True,
+		default_value="8",
+		validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+	)
+
+	MAX_BATCH_WAIT = PropertyDescriptor(
+		name="Max Batch Wait (ms)",
+		description="How long the first image of a batch waits for other images to join it",
+		required=True,
+		default_value="10",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	RESULT_CACHE_SIZE = PropertyDescriptor(
+		name="Result Cache Size",
+		description="Number of results kept in memory, keyed by a hash of the image bytes and the model. 0 disables the cache",
+		required=True,
+		default_value="0",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	RESULT_CACHE_TTL = PropertyDescriptor(
+		name="Result Cache TTL (s)",
+		description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+		required=True,
+		default_value="3600",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	RESULT_CACHE_PATH = PropertyDescriptor(
+		name="Result Cache Path",
+		description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+		required=False,
+		validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+	)
+
+	TIMING_ATTRIBUTES = PropertyDescriptor(
+		name="Emit Timing Attributes",
+		description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+		required=True,
+		default_value="false",
+		allowable_values=["true", "false"]
+	)
+
 	property_descriptors = [
-		CAPTION_OPTION
+		CAPTION_OPTION,
+		MAX_BATCH_SIZE,
+		MAX_BATCH_WAIT,
+		RESULT_CACHE_SIZE,
+		RESULT_CACHE_TTL,
+		RESULT_CACHE_PATH,
+		TIMING_ATTRIBUTES
 	]
 
 	def __init__(self, **kwargs):
 		super().__init__()
 		self.property_descriptors.append(self.CAPTION_OPTION)
+		self.property_descriptors.append(self.MAX_BATCH_SIZE)
+		self.property_descriptors.append(self.MAX_BATCH_WAIT)
+		self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+		self.property_descriptors.append(self.RESULT_CACHE_TTL)
+		self.property_descriptors.append(self.RESULT_CACHE_PATH)
+		self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
 	def getPropertyDescriptors(self):
 		return self.property_descriptors
 
+	def loadModel(self):
+		from model_registry import get_model
+
+		def loader():
+			from transformers import BlipProcessor, BlipForConditionalGeneration
+			processor = BlipProcessor.from_pretrained(MODEL_NAME)
+			model = BlipForConditionalGeneration.from_pretrained(MODEL_NAME)
+			return (processor, model)
+
+		return get_model("image-to-text:" + MODEL_NAME, loader)
+
+	def captionBatch(self, images):
+		processor, model = self.loadModel()
+		inputs = processor(images=images, return_tensors="pt")
+		out = model.generate(**inputs)
+		return processor.batch_decode(out, skip_special_tokens=True)
+
+	def getBatcher(self, context):
+		from inference_batcher import get_batcher
+
+		return get_batcher("image-to-text:" + MODEL_NAME, self.captionBatch,
+			context.getProperty(self.MAX_BATCH_SIZE).asInteger(),
+			context.getProperty(self.MAX_BATCH_WAIT).asInteger())
+
+	def getResultCache(self, context):
+		from result_cache import get_cache
+
+		size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+		if size is None or size <= 0:
+			return None
+
+		return get_cache("image-to-text:" + MODEL_NAME, size,
+			context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+			context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+	def onScheduled(self, context):
+		import model_registry
+		import stage_timer
+
+		with stage_timer.timed("CaptionImage", "load"):
+			self.loadModel()
+		self.logger.info("Model registry " + json.dumps(model_registry.stats()))
+
 	def transform(self, context, flowfile):
 		import requests
 		from PIL import Image
-		from transformers import BlipProcessor, BlipForConditionalGeneration
 		import sys
 		import io
+		from result_cache import content_key
+		import stage_timer
 
+		timer = stage_timer.start("CaptionImage")
 		caption_option = context.getProperty(self.CAPTION_OPTION).evaluateAttributeExpressions(flowfile).getValue()
 
-		processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-		model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
+		batcher = self.getBatcher(context)
 		
 		# Read the FlowFile content as "image".
-		imagebinary = flowfile.getContentsAsBytes() # .decode()
-		raw_image = Image.open(io.BytesIO(imagebinary))
+		with timer.stage("read"):
+			imagebinary = flowfile.getContentsAsBytes() # .decode()
+
+		cache = self.getResultCache(context)
+		cached = None
+		if cache is not None:
+			with timer.stage("cache"):
+				cache_key = content_key(imagebinary, MODEL_NAME)
+				cached = cache.get(cache_key)
+
+		if cached is not None:
+			caption = cached["caption"]
+		else:
+			with timer.stage("load"):
+				self.loadModel()
+			with timer.stage("decode"):
+				raw_image = Image.open(io.BytesIO(imagebinary)).convert("RGB")
+			with timer.stage("inference"):
+				caption = batcher.submit(raw_image)
+			if cache is not None:
+				cache.put(cache_key, {"caption": caption})
 
-		inputs = processor(raw_image, return_tensors="pt")
-		out = model.generate(**inputs)
-		caption = (processor.decode(out[0], skip_special_tokens=True))
 		attributes = {"caption": caption, "captionoption": caption_option}
+		attributes["cachehit"] = str(cached is not None).lower()
+		attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
 
 		return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
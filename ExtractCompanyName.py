@@ -16,7 +16,31 @@
 import json
 import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
-from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
+from nifiapi.properties import PropertyDescriptor, PropertyDependency, StandardValidators, ExpressionLanguageScope
+from nifiapi.relationship import Relationship
+
+MODEL_CHECKPOINT = "xlm-roberta-large-finetuned-conll03-english"
+
+LARGE = "large"
+LARGE_INT8 = "large-int8"
+DISTILLED = "distilled"
+
+ATTRIBUTE = "attribute"
+CONTENT = "content"
+RECORDS = "records"
+
+FALLBACK = "fallback"
+ALWAYS = "always"
+GAZETTEER_ONLY = "gazetteer-only"
+
+# path that produced a company name, reported in companysources
+GAZETTEER = "gazetteer"
+MODEL = "model"
+BOTH = "both"
+
+OFF = "off"
+REUSE = "reuse"
+ROUTE = "route"
 
 ### NLP
 class ExtractCompanyName(FlowFileTransform):
@@ -29,52 +53,513 @@ class ExtractCompanyName(FlowFileTransform):
         description = """Extract Company Name """
         tags = ["company name", "xlm-roberta-large-finetuned-conll03-english", "NLP", "extract text", "SPacY", "ai", "artificial intelligence", "ml", "machine learning", "text", "LLM"]
 
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="attribute parses the Parse Text value. content parses the FlowFile content in sentence aligned, overlapping chunks on a pool of worker processes. records reads JSON Lines or CSV records and adds companies and companysources to each record",
+        required=True,
+        default_value=ATTRIBUTE,
+        allowable_values=[ATTRIBUTE, CONTENT, RECORDS]
+    )
+
     PARSE_TEXT = PropertyDescriptor(
         name="Parse Text",
-        description="Specifies the text to parse for company names",
-        required=True,
+        description="Specifies the text to parse for company names, used when Input Source is attribute. When empty, the text of spaCy annotations from ExtractEntities is parsed",
+        required=False,
         validators=[StandardValidators.NON_EMPTY_VALIDATOR],
-        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    RECORD_FORMAT = PropertyDescriptor(
+        name="Record Format",
+        description="records input: jsonl (one JSON object per line) or csv (with a header row). The output uses the same format",
+        required=True,
+        default_value="jsonl",
+        allowable_values=["jsonl", "csv"]
+    )
+
+    TEXT_FIELD = PropertyDescriptor(
+        name="Text Field",
+        description="records input: field of each record that holds the text to parse",
+        required=True,
+        default_value="text",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RECORD_BATCH_SIZE = PropertyDescriptor(
+        name="Record Batch Size",
+        description="records input: number of records parsed together",
+        required=True,
+        default_value="64",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_SIZE = PropertyDescriptor(
+        name="Chunk Size (chars)",
+        description="content input: maximum number of characters per chunk, chunks are cut at sentence ends. Keep it under the 512 token window of the model",
+        required=True,
+        default_value="1000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_OVERLAP = PropertyDescriptor(
+        name="Chunk Overlap (chars)",
+        description="content input: characters of the previous chunk repeated at the start of the next one, so names on a boundary are not split",
+        required=True,
+        default_value="100",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    WORKER_PROCESSES = PropertyDescriptor(
+        name="Worker Processes",
+        description="content input: number of worker processes the chunks run on, 0 uses one per CPU, 1 runs in the processor itself",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    MODEL_TIER = PropertyDescriptor(
+        name="Model Tier",
+        description="large runs " + MODEL_CHECKPOINT + " in fp32. large-int8 runs the same model with int8 dynamic quantization, faster on CPU for a small loss of accuracy. distilled runs the smaller NER checkpoint in Model Directory. benchmarks/evaluate_company_ner.py compares the tiers",
+        required=True,
+        default_value=LARGE,
+        allowable_values=[LARGE, LARGE_INT8, DISTILLED]
+    )
+
+    MODEL_DIRECTORY = PropertyDescriptor(
+        name="Model Directory",
+        description="distilled tier: local directory of a token classification checkpoint with ORG labels, as written by save_pretrained",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    COMPANY_LIST_FILE = PropertyDescriptor(
+        name="Company List File",
+        description="Local file of known company names, one per line or alias<TAB>name, matched before the model runs. Built once into an Aho-Corasick automaton and rebuilt when the file changes",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    GAZETTEER_POLICY = PropertyDescriptor(
+        name="Gazetteer Policy",
+        description="With a Company List File: fallback runs the model only when no known name is found. always runs the model as well and merges both, for names missing from the list. gazetteer-only never runs the model",
+        required=True,
+        default_value=FALLBACK,
+        allowable_values=[FALLBACK, ALWAYS, GAZETTEER_ONLY]
+    )
+
+    RESULT_CACHE_SIZE = PropertyDescriptor(
+        name="Result Cache Size",
+        description="Number of results kept in memory, keyed by a hash of the normalized Parse Text and the model. 0 disables the cache",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_TTL = PropertyDescriptor(
+        name="Result Cache TTL (s)",
+        description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+        required=True,
+        default_value="3600",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_PATH = PropertyDescriptor(
+        name="Result Cache Path",
+        description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    NEAR_DUPLICATE_ACTION = PropertyDescriptor(
+        name="Near Duplicate Action",
+        description="Parse Text input: off, reuse (a text close to a recent one gets that text's results without running the model) or route (near duplicates go to the duplicate relationship)",
+        required=True,
+        default_value=OFF,
+        allowable_values=[OFF, REUSE, ROUTE]
+    )
+
+    NEAR_DUPLICATE_THRESHOLD = PropertyDescriptor(
+        name="Near Duplicate Threshold",
+        description="Estimated Jaccard similarity (0 to 1) of the 5 character shingles of two texts from which they are near duplicates. An edited word changes about as many shingles as it has characters plus 4, so at 0.8 a one word edit is caught in texts of about 150 characters or more, while shorter texts only match on whitespace, case or URL query changes. Lower it (0.7) to catch edits in short texts, at the cost of more unrelated short texts matching",
+        required=True,
+        default_value="0.8",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    NEAR_DUPLICATE_WINDOW = PropertyDescriptor(
+        name="Near Duplicate Window",
+        description="Number of recent texts a new text is compared with, the oldest are forgotten first",
+        required=True,
+        default_value="10000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    LANGUAGE_MODEL_FILE = PropertyDescriptor(
+        name="Language ID Model File",
+        description="Path of a fastText language identification model (lid.176.ftz). When set, Parse Text is tagged with language and languageconfidence, and the model only runs on the Model Languages",
+        required=False,
+        validators=[StandardValidators.FILE_EXISTS_VALIDATOR]
+    )
+
+    MODEL_LANGUAGES = PropertyDescriptor(
+        name="Model Languages",
+        description="Comma separated languages the model runs on. Texts in other languages are only matched against the Company List File and get nerskipped=true. Add und to run the model on texts whose language is undetermined",
+        required=True,
+        default_value="en",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    MIN_LANGUAGE_CONFIDENCE = PropertyDescriptor(
+        name="Minimum Language Confidence",
+        description="Texts identified with a lower confidence (0 to 1) get language und",
+        required=True,
+        default_value="0.5",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    REUSE_ANNOTATIONS = PropertyDescriptor(
+        name="Reuse Annotations",
+        description="When the FlowFile carries spaCy annotations from ExtractEntities (DocBin content or a spacy.docbin.path sidecar), take its ORG entities instead of running the model. The text is always taken from them when Parse Text is empty or the content is a DocBin",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    ANNOTATION_DIRECTORY = PropertyDescriptor(
+        name="Annotation Directory",
+        description="Annotation Directory of the ExtractEntities that writes sidecar DocBin files. spacy.docbin.path is only read when it names a file inside it; when empty, sidecars are ignored",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    REL_DUPLICATE = Relationship(
+        name="duplicate",
+        description="FlowFiles whose text is a near duplicate of a recent one, when Near Duplicate Action is route"
     )
 
     property_descriptors = [
-        PARSE_TEXT
+        PARSE_TEXT,
+        INPUT_SOURCE,
+        RECORD_FORMAT,
+        TEXT_FIELD,
+        RECORD_BATCH_SIZE,
+        CHUNK_SIZE,
+        CHUNK_OVERLAP,
+        WORKER_PROCESSES,
+        MODEL_TIER,
+        MODEL_DIRECTORY,
+        COMPANY_LIST_FILE,
+        GAZETTEER_POLICY,
+        RESULT_CACHE_SIZE,
+        RESULT_CACHE_TTL,
+        RESULT_CACHE_PATH,
+        NEAR_DUPLICATE_ACTION,
+        NEAR_DUPLICATE_THRESHOLD,
+        NEAR_DUPLICATE_WINDOW,
+        LANGUAGE_MODEL_FILE,
+        MODEL_LANGUAGES,
+        MIN_LANGUAGE_CONFIDENCE,
+        REUSE_ANNOTATIONS,
+        ANNOTATION_DIRECTORY,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.PARSE_TEXT)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.RECORD_FORMAT)
+        self.property_descriptors.append(self.TEXT_FIELD)
+        self.property_descriptors.append(self.RECORD_BATCH_SIZE)
+        self.property_descriptors.append(self.CHUNK_SIZE)
+        self.property_descriptors.append(self.CHUNK_OVERLAP)
+        self.property_descriptors.append(self.WORKER_PROCESSES)
+        self.property_descriptors.append(self.MODEL_TIER)
+        self.property_descriptors.append(self.MODEL_DIRECTORY)
+        self.property_descriptors.append(self.COMPANY_LIST_FILE)
+        self.property_descriptors.append(self.GAZETTEER_POLICY)
+        self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+        self.property_descriptors.append(self.RESULT_CACHE_TTL)
+        self.property_descriptors.append(self.RESULT_CACHE_PATH)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_ACTION)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_THRESHOLD)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_WINDOW)
+        self.property_descriptors.append(self.LANGUAGE_MODEL_FILE)
+        self.property_descriptors.append(self.MODEL_LANGUAGES)
+        self.property_descriptors.append(self.MIN_LANGUAGE_CONFIDENCE)
+        self.property_descriptors.append(self.REUSE_ANNOTATIONS)
+        self.property_descriptors.append(self.ANNOTATION_DIRECTORY)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
+    def annotationDirectory(self, context):
+        return context.getProperty(self.ANNOTATION_DIRECTORY).getValue()
+
+    def getRelationships(self):
+        return [self.REL_DUPLICATE]
+
+    def tierModel(self, context):
+        from nlp_models import tier_model
+        return tier_model(context.getProperty(self.MODEL_TIER).getValue() or LARGE, MODEL_CHECKPOINT,
+                          context.getProperty(self.MODEL_DIRECTORY).getValue())
+
+    def loadModel(self, context):
+        from nlp_models import load_token_classifier
+        return load_token_classifier(*self.tierModel(context))
+
+    def getResultCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("ExtractCompanyName", size,
+                         context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+                         context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+    def cacheModelId(self, context):
+        # anything that changes the result belongs in the key
+        import os
+
+        checkpoint, quantize = self.tierModel(context)
+        path = context.getProperty(self.COMPANY_LIST_FILE).getValue()
+        gazetteer = path.strip() + "@" + str(os.path.getmtime(path.strip())) if path is not None and path.strip() != "" else ""
+        # the language gate decides nerskipped and whether the model runs
+        language_model = self.languageModelFile(context)
+        language = ""
+        if language_model is not None:
+            language = ",".join([language_model + "@" + str(os.path.getmtime(language_model)),
+                                 context.getProperty(self.MODEL_LANGUAGES).getValue() or "",
+                                 context.getProperty(self.MIN_LANGUAGE_CONFIDENCE).getValue() or ""])
+        return ":".join(["ExtractCompanyName", self.ProcessorDetails.version, checkpoint, str(quantize), gazetteer,
+                         context.getProperty(self.GAZETTEER_POLICY).getValue() or FALLBACK, language])
+
+    def getNearDuplicateIndex(self, context):
+        from near_duplicates import get_index
+
+        return get_index(self.cacheModelId(context),
+                         float(context.getProperty(self.NEAR_DUPLICATE_THRESHOLD).getValue()),
+                         context.getProperty(self.NEAR_DUPLICATE_WINDOW).asInteger())
+
+    def nearDuplicate(self, context, flowfile, timer, action, match):
+        payload, similarity = match
+        attributes = dict()
+        if action == REUSE:
+            attributes.update(payload["attributes"])
+        attributes["duplicateof"] = payload["uuid"]
+        attributes["duplicatesimilarity"] = "%.3f" % similarity
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "duplicate" if action == ROUTE else "success", contents=None, attributes=attributes)
+
+    def languageModelFile(self, context):
+        path = context.getProperty(self.LANGUAGE_MODEL_FILE).getValue()
+        return path.strip() if path is not None and path.strip() != "" else None
+
+    def identifyLanguage(self, context, text):
+        from language_id import identify, load_language_model
+
+        return identify(load_language_model(self.languageModelFile(context)), text,
+                        float(context.getProperty(self.MIN_LANGUAGE_CONFIDENCE).getValue()))
+
+    def loadGazetteer(self, context):
+        path = context.getProperty(self.COMPANY_LIST_FILE).getValue()
+        if path is None or path.strip() == "":
+            return None
+        from gazetteer import load_gazetteer
+        return load_gazetteer(path.strip())
+
+    def onScheduled(self, context):
+        import model_registry
+        import stage_timer
+
+        with stage_timer.timed("ExtractCompanyName", "load"):
+            gazetteer = self.loadGazetteer(context)
+            if gazetteer is not None:
+                self.logger.info("Company list with " + str(gazetteer.size) + " names")
+
+            if gazetteer is None or context.getProperty(self.GAZETTEER_POLICY).getValue() != GAZETTEER_ONLY:
+                if context.getProperty(self.INPUT_SOURCE).getValue() == CONTENT:
+                    # chunks are parsed in the worker processes, start them and load the model there
+                    from text_chunker import map_chunks, token_entities
+                    list(map_chunks(token_entities, self.tierModel(context), [(0, " ")], context.getProperty(self.WORKER_PROCESSES).asInteger()))
+                else:
+                    self.loadModel(context)
+            if self.languageModelFile(context) is not None:
+                from language_id import load_language_model
+                load_language_model(self.languageModelFile(context))
+        self.logger.info("Model tier " + str(context.getProperty(self.MODEL_TIER).getValue()) + ", model registry " + json.dumps(model_registry.stats()))
+
+    def companySources(self, known, res):
+        sources = dict()
+        for name in known:
+            sources[name] = GAZETTEER
+        for name in filter(None, res): # Remove empty strings
+            sources[name] = BOTH if sources.get(name, MODEL) != MODEL else MODEL
+        return sources
+
+    def recordBatch(self, context, texts):
+        gazetteer = self.loadGazetteer(context)
+        policy = context.getProperty(self.GAZETTEER_POLICY).getValue()
+
+        known = [[match["name"] for match in gazetteer.find(text)] if gazetteer is not None else [] for text in texts]
+        found = [[] for text in texts]
+        # only the texts the policy sends to the model go through it, as one batch
+        pending = [index for index in range(len(texts)) if texts[index].strip() != "" and
+                   (gazetteer is None or policy == ALWAYS or (policy != GAZETTEER_ONLY and len(known[index]) == 0))]
+        if len(pending) > 0:
+            token_classifier = self.loadModel(context)
+            for index, classifier in zip(pending, token_classifier([texts[index] for index in pending], batch_size=len(pending))):
+                found[index] = [item['word'] for item in classifier if item["entity_group"] == "ORG"]
+
+        fields = []
+        for index in range(len(texts)):
+            sources = self.companySources(known[index], found[index])
+            fields.append({"companies": list(sources), "companysources": sources})
+        return fields
+
+    def transformRecords(self, context, flowfile, timer):
+        from record_io import enrich, MIME_TYPES
+
+        record_format = context.getProperty(self.RECORD_FORMAT).getValue()
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        contents, recordcount = enrich(data, record_format, context.getProperty(self.TEXT_FIELD).getValue(),
+                                       context.getProperty(self.RECORD_BATCH_SIZE).asInteger(),
+                                       lambda texts: self.recordBatch(context, texts), timer)
+
+        attributes = {"record.count": str(recordcount), "mime.type": MIME_TYPES[record_format]}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
     def transform(self, context, flowfile):
-        from transformers import pipeline
-        import spacy
-        from spacy.matcher import Matcher
-        
-        parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
-
-        # nlp = spacy.load('en_core_web_sm')
-        model_checkpoint = "xlm-roberta-large-finetuned-conll03-english"
-        token_classifier = pipeline(
-            "token-classification", model=model_checkpoint, aggregation_strategy="simple"
-        )
-
-        classifier = token_classifier(parse_text)
+        import stage_timer
+
+        timer = stage_timer.start("ExtractCompanyName")
+        chunkcount = None
+        if context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+            return self.transformRecords(context, flowfile, timer)
+        content = context.getProperty(self.INPUT_SOURCE).getValue() == CONTENT
+
+        from spacy_annotations import annotation_entities, annotation_text, read_annotations
+
+        data = None
+        if content:
+            with timer.stage("read"):
+                data = flowfile.getContentsAsBytes()
+        with timer.stage("annotations"):
+            docs = read_annotations(flowfile, data, self.annotationDirectory(context))
+        if content and docs is not None:
+            data = annotation_text(docs).encode("utf-8")
+        elif not content:
+            parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
+            if (parse_text is None or parse_text.strip() == "") and docs is not None:
+                parse_text = annotation_text(docs)
+            if parse_text is None or parse_text.strip() == "":
+                self.logger.error("Nothing to parse, Parse Text is empty and the FlowFile has no spaCy annotations")
+                return FlowFileTransformResult(relationship = "failure")
+        # the ORG entities of ExtractEntities stand in for the model, the result then depends on more than the text
+        reuse = docs is not None and context.getProperty(self.REUSE_ANNOTATIONS).asBoolean()
+
+        # repeated texts return the stored attributes
+        cache = None if content or reuse else self.getResultCache(context)
+        cache_key = None
+        if cache is not None:
+            from result_cache import text_key
+
+            with timer.stage("cache"):
+                cache_key = text_key(parse_text, self.cacheModelId(context))
+                cached = cache.get(cache_key)
+            if cached is not None:
+                attributes = dict(cached)
+                attributes["cachehit"] = "true"
+                attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+                return FlowFileTransformResult(relationship = "success", contents=None, attributes=attributes)
+
+        # near duplicates of a recent text reuse its results or leave through the duplicate relationship
+        action = context.getProperty(self.NEAR_DUPLICATE_ACTION).getValue() or OFF
+        index = None
+        if not content and not reuse and action != OFF:
+            index = self.getNearDuplicateIndex(context)
+            with timer.stage("dedupe"):
+                signature = index.signature(parse_text)
+                match = index.query(signature)
+            if match is not None:
+                return self.nearDuplicate(context, flowfile, timer, action, match)
+
+        # the model only runs on the languages it knows
+        language = dict()
+        skipped = False
+        if not content and self.languageModelFile(context) is not None:
+            from language_id import parse_languages
+
+            with timer.stage("language"):
+                code, confidence = self.identifyLanguage(context, parse_text)
+            language = {"language": code, "languageconfidence": "%.3f" % confidence}
+            skipped = code not in parse_languages(context.getProperty(self.MODEL_LANGUAGES).getValue())
+
+        # known names first, the model only runs when the policy asks for it
+        known = []
+        gazetteer = self.loadGazetteer(context)
+        policy = context.getProperty(self.GAZETTEER_POLICY).getValue()
+        if gazetteer is not None:
+            with timer.stage("gazetteer"):
+                known = [match["name"] for match in gazetteer.find(data.decode("utf-8", errors="replace") if content else parse_text)]
+
+        classifier = []
+        if not skipped and (gazetteer is None or policy == ALWAYS or (policy != GAZETTEER_ONLY and len(known) == 0)):
+            if reuse:
+                classifier = [{"entity_group": entity["label"], "word": entity["text"]} for entity in annotation_entities(docs)]
+            elif content:
+                from text_chunker import extract, token_entities
+
+                with timer.stage("inference"):
+                    classifier, chunkcount = extract(token_entities, self.tierModel(context), data,
+                                                     context.getProperty(self.CHUNK_SIZE).asInteger(),
+                                                     context.getProperty(self.CHUNK_OVERLAP).asInteger(),
+                                                     context.getProperty(self.WORKER_PROCESSES).asInteger())
+                classifier = [{"entity_group": entity["label"], "word": entity["text"]} for entity in classifier]
+            else:
+                with timer.stage("load"):
+                    token_classifier = self.loadModel(context)
+
+                with timer.stage("inference"):
+                    classifier = token_classifier(parse_text)
         values = [item for item in classifier if item["entity_group"] == "ORG"]
         res = [sub['word'] for sub in values]
-        final1 = list(set(res))  # Remove duplicates
-        final = list(filter(None, final1)) # Remove empty strings
-        # print(final[0])
+
+        sources = self.companySources(known, res)
+        final = list(sources) # Remove duplicates
 
         companyList = ''
         companyName = ''
 
         if (final != None):
             companyList = json.dumps(final)
-            companyName = final[0]
+            companyName = final[0] if len(final) > 0 else ''
 
-        attributes = {"companylist": companyList, "parsedcompany": companyName}
+        attributes = {"companylist": companyList, "parsedcompany": companyName, "companysources": json.dumps(sources)}
+        if chunkcount is not None:
+            attributes["chunkcount"] = str(chunkcount)
+        attributes.update(language)
+        if skipped:
+            attributes["nerskipped"] = "true"
+        if index is not None:
+            index.add(signature, {"uuid": flowfile.getAttribute("uuid") or "", "attributes": dict(attributes)})
+        if cache is not None:
+            cache.put(cache_key, dict(attributes))
+            attributes["cachehit"] = "false"
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
 
         return FlowFileTransformResult(relationship = "success", contents=None, attributes=attributes)
@@ -18,6 +18,12 @@ import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 
+MODEL_CHECKPOINT = "xlm-roberta-large-finetuned-conll03-english"
+
+LARGE = "large"
+LARGE_INT8 = "large-int8"
+DISTILLED = "distilled"
+
 ### NLP
 class ExtractCompanyName(FlowFileTransform):
     class Java:
@@ -37,47 +43,156 @@ class ExtractCompanyName(FlowFileTransform):
         expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
     )
 
+    MODEL_TIER = PropertyDescriptor(
+        name="Model Tier",
+        description="large runs " + MODEL_CHECKPOINT + " in fp32. large-int8 runs the same model with int8 dynamic quantization, faster on CPU for a small loss of accuracy. distilled runs the smaller NER checkpoint in Model Directory. benchmarks/evaluate_company_ner.py compares the tiers",
+        required=True,
+        default_value=LARGE,
+        allowable_values=[LARGE, LARGE_INT8, DISTILLED]
+    )
+
+    MODEL_DIRECTORY = PropertyDescriptor(
+        name="Model Directory",
+        description="distilled tier: local directory of a token classification checkpoint with ORG labels, as written by save_pretrained",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RESULT_CACHE_SIZE = PropertyDescriptor(
+        name="Result Cache Size",
+        description="Number of results kept in memory, keyed by a hash of the normalized Parse Text and the model. 0 disables the cache",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_TTL = PropertyDescriptor(
+        name="Result Cache TTL (s)",
+        description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+        required=True,
+        default_value="3600",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_PATH = PropertyDescriptor(
+        name="Result Cache Path",
+        description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
     property_descriptors = [
-        PARSE_TEXT
+        PARSE_TEXT,
+        MODEL_TIER,
+        MODEL_DIRECTORY,
+        RESULT_CACHE_SIZE,
+        RESULT_CACHE_TTL,
+        RESULT_CACHE_PATH,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.PARSE_TEXT)
+        self.property_descriptors.append(self.MODEL_TIER)
+        self.property_descriptors.append(self.MODEL_DIRECTORY)
+        self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+        self.property_descriptors.append(self.RESULT_CACHE_TTL)
+        self.property_descriptors.append(self.RESULT_CACHE_PATH)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
+    def tierModel(self, context):
+        from nlp_models import tier_model
+        return tier_model(context.getProperty(self.MODEL_TIER).getValue() or LARGE, MODEL_CHECKPOINT,
+                          context.getProperty(self.MODEL_DIRECTORY).getValue())
+
+    def loadModel(self, context):
+        from nlp_models import load_token_classifier
+        return load_token_classifier(*self.tierModel(context))
+
+    def getResultCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("ExtractCompanyName2", size,
+                         context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+                         context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+    def cacheModelId(self, context):
+        # anything that changes the result belongs in the key
+        checkpoint, quantize = self.tierModel(context)
+        return ":".join(["ExtractCompanyName2", self.ProcessorDetails.version, checkpoint, str(quantize)])
+
+    def onScheduled(self, context):
+        import model_registry
+        import stage_timer
+
+        with stage_timer.timed("ExtractCompanyName2", "load"):
+            self.loadModel(context)
+        self.logger.info("Model tier " + str(context.getProperty(self.MODEL_TIER).getValue()) + ", model registry " + json.dumps(model_registry.stats()))
+
     def transform(self, context, flowfile):
-        from transformers import pipeline
-        import spacy
-        from spacy.matcher import Matcher
-        
+        import stage_timer
+
+        timer = stage_timer.start("ExtractCompanyName2")
         parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
 
-        # nlp = spacy.load('en_core_web_sm')
-        model_checkpoint = "xlm-roberta-large-finetuned-conll03-english"
-        token_classifier = pipeline(
-            "token-classification", model=model_checkpoint, aggregation_strategy="simple"
-        )
+        # repeated texts return the stored attributes
+        cache = self.getResultCache(context)
+        cache_key = None
+        if cache is not None:
+            from result_cache import text_key
+
+            with timer.stage("cache"):
+                cache_key = text_key(parse_text, self.cacheModelId(context))
+                cached = cache.get(cache_key)
+            if cached is not None:
+                attributes = dict(cached)
+                attributes["cachehit"] = "true"
+                attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+                return FlowFileTransformResult(relationship = "success", contents=None, attributes=attributes)
 
-        classifier = token_classifier(parse_text)
+        with timer.stage("load"):
+            token_classifier = self.loadModel(context)
+
+        with timer.stage("inference"):
+            classifier = token_classifier(parse_text)
         values = [item for item in classifier if item["entity_group"] == "ORG"]
         res = [sub['word'] for sub in values]
-        final1 = list(set(res))  # Remove duplicates
+        final1 = list(dict.fromkeys(res))  # Remove duplicates, first seen order
         final = list(filter(None, final1)) # Remove empty strings
 
         companyList = ''
         companyName = ''
 
-        if (final != None):
+        if len(final) > 0:
             companyList = json.dumps(final)
             companyName = final[0]
 
         attributes = {"companylist": companyList, "parsedcompany": companyName}
 
-        if (final != None):
+        if len(final) > 0:
             for i, val in enumerate(final):
                 attributes["company" + str(i)] =val
 
+        if cache is not None:
+            cache.put(cache_key, dict(attributes))
+            attributes["cachehit"] = "false"
+
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+
         return FlowFileTransformResult(relationship = "success", contents=None, attributes=attributes)
@@ -16,7 +16,25 @@
 import json
 import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
-from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
+from nifiapi.properties import PropertyDescriptor, PropertyDependency, StandardValidators, ExpressionLanguageScope
+from nifiapi.relationship import Relationship
+
+SPACY_MODEL = 'en_core_web_sm'
+
+FULL = "full"
+NER = "ner"
+
+ATTRIBUTE = "attribute"
+CONTENT = "content"
+RECORDS = "records"
+
+OFF = "off"
+REUSE = "reuse"
+ROUTE = "route"
+
+# where the spaCy Doc goes, besides CONTENT
+NONE = "none"
+SIDECAR = "sidecar"
 
 ### NLP
 ### https://spacy.io/usage/spacy-101
@@ -31,32 +49,502 @@ class ExtractEntities(FlowFileTransform):
         description = """Extract NLP Entities """
         tags = ["locations", "NLP", "extract text", "SPacY", "ai", "artificial intelligence", "ml", "machine learning", "text", "LLM"]
 
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="attribute parses the Parse Text value. content parses the FlowFile content in sentence aligned, overlapping chunks on a pool of worker processes with the ner pipeline and writes the entities with document offsets as JSON content. records reads JSON Lines or CSV records and adds an entities list to each record",
+        required=True,
+        default_value=ATTRIBUTE,
+        allowable_values=[ATTRIBUTE, CONTENT, RECORDS]
+    )
+
     PARSE_TEXT = PropertyDescriptor(
         name="Parse Text",
-        description="Specifies the text to parse for company names",
+        description="Specifies the text to parse for company names, used when Input Source is attribute",
         required=True,
         validators=[StandardValidators.NON_EMPTY_VALIDATOR],
-        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    RECORD_FORMAT = PropertyDescriptor(
+        name="Record Format",
+        description="records input: jsonl (one JSON object per line) or csv (with a header row). The output uses the same format",
+        required=True,
+        default_value="jsonl",
+        allowable_values=["jsonl", "csv"]
+    )
+
+    TEXT_FIELD = PropertyDescriptor(
+        name="Text Field",
+        description="records input: field of each record that holds the text to parse",
+        required=True,
+        default_value="text",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RECORD_BATCH_SIZE = PropertyDescriptor(
+        name="Record Batch Size",
+        description="records input: number of records parsed together",
+        required=True,
+        default_value="64",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_SIZE = PropertyDescriptor(
+        name="Chunk Size (chars)",
+        description="content input: maximum number of characters per chunk, chunks are cut at sentence ends",
+        required=True,
+        default_value="20000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_OVERLAP = PropertyDescriptor(
+        name="Chunk Overlap (chars)",
+        description="content input: characters of the previous chunk repeated at the start of the next one, so entities on a boundary are not split",
+        required=True,
+        default_value="200",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    WORKER_PROCESSES = PropertyDescriptor(
+        name="Worker Processes",
+        description="content input: number of worker processes the chunks run on, 0 uses one per CPU, 1 runs in the processor itself",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    EXTRACTION_MODE = PropertyDescriptor(
+        name="Extraction Mode",
+        description="full runs the whole spaCy pipeline and writes comma separated attributes. ner keeps only the components NER needs, batches texts from concurrent tasks through nlp.pipe and writes the entities with character offsets as JSON content",
+        required=True,
+        default_value=FULL,
+        allowable_values=[FULL, NER]
+    )
+
+    ENTITY_LABELS = PropertyDescriptor(
+        name="Entity Labels",
+        description="ner mode, content and records input: comma separated entity labels to keep, e.g. ORG,PERSON,GPE. Empty keeps every label",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    MAX_BATCH_SIZE = PropertyDescriptor(
+        name="Max Batch Size",
+        description="ner mode: maximum number of texts from concurrent tasks that are run through nlp.pipe together",
+        required=True,
+        default_value="32",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    MAX_BATCH_WAIT = PropertyDescriptor(
+        name="Max Batch Wait (ms)",
+        description="ner mode: how long the first text of a batch waits for other texts to join it",
+        required=True,
+        default_value="5",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_SIZE = PropertyDescriptor(
+        name="Result Cache Size",
+        description="Number of results kept in memory, keyed by a hash of the normalized Parse Text (the exact text in ner mode) and the model. 0 disables the cache",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_TTL = PropertyDescriptor(
+        name="Result Cache TTL (s)",
+        description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+        required=True,
+        default_value="3600",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_PATH = PropertyDescriptor(
+        name="Result Cache Path",
+        description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    NEAR_DUPLICATE_ACTION = PropertyDescriptor(
+        name="Near Duplicate Action",
+        description="Parse Text input: off, reuse (a text close to a recent one gets that text's results without running the model) or route (near duplicates go to the duplicate relationship)",
+        required=True,
+        default_value=OFF,
+        allowable_values=[OFF, REUSE, ROUTE]
+    )
+
+    NEAR_DUPLICATE_THRESHOLD = PropertyDescriptor(
+        name="Near Duplicate Threshold",
+        description="Estimated Jaccard similarity (0 to 1) of the 5 character shingles of two texts from which they are near duplicates. An edited word changes about as many shingles as it has characters plus 4, so at 0.8 a one word edit is caught in texts of about 150 characters or more, while shorter texts only match on whitespace, case or URL query changes. Lower it (0.7) to catch edits in short texts, at the cost of more unrelated short texts matching",
+        required=True,
+        default_value="0.8",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    NEAR_DUPLICATE_WINDOW = PropertyDescriptor(
+        name="Near Duplicate Window",
+        description="Number of recent texts a new text is compared with, the oldest are forgotten first",
+        required=True,
+        default_value="10000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    LANGUAGE_MODEL_FILE = PropertyDescriptor(
+        name="Language ID Model File",
+        description="Path of a fastText language identification model (lid.176.ftz). When set, Parse Text is tagged with language and languageconfidence, and only languages listed in Language Models go through NER",
+        required=False,
+        validators=[StandardValidators.FILE_EXISTS_VALIDATOR]
+    )
+
+    LANGUAGE_MODELS = PropertyDescriptor(
+        name="Language Models",
+        description="Comma separated language=spaCy model pairs, e.g. en=en_core_web_sm,de=de_core_news_sm. Texts in other languages skip NER and get nerskipped=true. Add und=<model> to parse texts whose language is undetermined",
+        required=True,
+        default_value="en=" + SPACY_MODEL,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    MIN_LANGUAGE_CONFIDENCE = PropertyDescriptor(
+        name="Minimum Language Confidence",
+        description="Texts identified with a lower confidence (0 to 1) get language und",
+        required=True,
+        default_value="0.5",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    ANNOTATION_OUTPUT = PropertyDescriptor(
+        name="Annotation Output",
+        description="Parse Text input: also emit the processed spaCy Doc as a DocBin for ExtractCompanyName and ParseAddresses to reuse. content replaces the FlowFile content (mime.type application/x-spacy-docbin), sidecar writes it to Annotation Directory and sets spacy.docbin.path. The result cache and near duplicate reuse are not used while it is on",
+        required=True,
+        default_value=NONE,
+        allowable_values=[NONE, CONTENT, SIDECAR]
+    )
+
+    ANNOTATION_DIRECTORY = PropertyDescriptor(
+        name="Annotation Directory",
+        description="Directory of the sidecar DocBin files, named after their hash",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    REL_DUPLICATE = Relationship(
+        name="duplicate",
+        description="FlowFiles whose text is a near duplicate of a recent one, when Near Duplicate Action is route"
     )
 
     property_descriptors = [
-        PARSE_TEXT
+        PARSE_TEXT,
+        INPUT_SOURCE,
+        RECORD_FORMAT,
+        TEXT_FIELD,
+        RECORD_BATCH_SIZE,
+        CHUNK_SIZE,
+        CHUNK_OVERLAP,
+        WORKER_PROCESSES,
+        EXTRACTION_MODE,
+        ENTITY_LABELS,
+        MAX_BATCH_SIZE,
+        MAX_BATCH_WAIT,
+        RESULT_CACHE_SIZE,
+        RESULT_CACHE_TTL,
+        RESULT_CACHE_PATH,
+        NEAR_DUPLICATE_ACTION,
+        NEAR_DUPLICATE_THRESHOLD,
+        NEAR_DUPLICATE_WINDOW,
+        LANGUAGE_MODEL_FILE,
+        LANGUAGE_MODELS,
+        MIN_LANGUAGE_CONFIDENCE,
+        ANNOTATION_OUTPUT,
+        ANNOTATION_DIRECTORY,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.PARSE_TEXT)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.RECORD_FORMAT)
+        self.property_descriptors.append(self.TEXT_FIELD)
+        self.property_descriptors.append(self.RECORD_BATCH_SIZE)
+        self.property_descriptors.append(self.CHUNK_SIZE)
+        self.property_descriptors.append(self.CHUNK_OVERLAP)
+        self.property_descriptors.append(self.WORKER_PROCESSES)
+        self.property_descriptors.append(self.EXTRACTION_MODE)
+        self.property_descriptors.append(self.ENTITY_LABELS)
+        self.property_descriptors.append(self.MAX_BATCH_SIZE)
+        self.property_descriptors.append(self.MAX_BATCH_WAIT)
+        self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+        self.property_descriptors.append(self.RESULT_CACHE_TTL)
+        self.property_descriptors.append(self.RESULT_CACHE_PATH)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_ACTION)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_THRESHOLD)
+        self.property_descriptors.append(self.NEAR_DUPLICATE_WINDOW)
+        self.property_descriptors.append(self.LANGUAGE_MODEL_FILE)
+        self.property_descriptors.append(self.LANGUAGE_MODELS)
+        self.property_descriptors.append(self.MIN_LANGUAGE_CONFIDENCE)
+        self.property_descriptors.append(self.ANNOTATION_OUTPUT)
+        self.property_descriptors.append(self.ANNOTATION_DIRECTORY)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
+    def getRelationships(self):
+        return [self.REL_DUPLICATE]
+
+    def loadModel(self, model_name=SPACY_MODEL):
+        from nlp_models import load_spacy
+        return load_spacy(model_name)
+
+    def loadNerModel(self, model_name=SPACY_MODEL):
+        from nlp_models import load_spacy_ner
+        return load_spacy_ner(model_name)
+
+    def nerBatch(self, texts, model_name=SPACY_MODEL):
+        nlp = self.loadNerModel(model_name)
+        return list(nlp.pipe(texts, batch_size=len(texts)))
+
+    def getBatcher(self, context, model_name=SPACY_MODEL):
+        from inference_batcher import get_batcher
+
+        return get_batcher("spacy-ner:" + model_name, lambda texts: self.nerBatch(texts, model_name),
+                           context.getProperty(self.MAX_BATCH_SIZE).asInteger(),
+                           context.getProperty(self.MAX_BATCH_WAIT).asInteger())
+
+    def getResultCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("ExtractEntities", size,
+                         context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+                         context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+    def cacheModelId(self, context, model_name=SPACY_MODEL):
+        # anything that changes the result belongs in the key
+        mode = context.getProperty(self.EXTRACTION_MODE).getValue() or FULL
+        labels = self.entityLabels(context) if mode == NER else None
+        return ":".join(["ExtractEntities", self.ProcessorDetails.version, mode, model_name, ",".join(sorted(labels or []))])
+
+    def getNearDuplicateIndex(self, context, model_name=SPACY_MODEL):
+        from near_duplicates import get_index
+
+        return get_index(self.cacheModelId(context, model_name),
+                         float(context.getProperty(self.NEAR_DUPLICATE_THRESHOLD).getValue()),
+                         context.getProperty(self.NEAR_DUPLICATE_WINDOW).asInteger())
+
+    def nearDuplicate(self, context, flowfile, timer, action, match):
+        payload, similarity = match
+        attributes = dict()
+        if action == REUSE:
+            attributes.update(payload["attributes"])
+        attributes["duplicateof"] = payload["uuid"]
+        attributes["duplicatesimilarity"] = "%.3f" % similarity
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "duplicate" if action == ROUTE else "success", contents=flowfile, attributes=attributes)
+
+    def languageModelFile(self, context):
+        path = context.getProperty(self.LANGUAGE_MODEL_FILE).getValue()
+        return path.strip() if path is not None and path.strip() != "" else None
+
+    def identifyLanguage(self, context, text):
+        from language_id import identify, load_language_model
+
+        return identify(load_language_model(self.languageModelFile(context)), text,
+                        float(context.getProperty(self.MIN_LANGUAGE_CONFIDENCE).getValue()))
+
+    def languageModels(self, context):
+        from language_id import parse_languages
+
+        return parse_languages(context.getProperty(self.LANGUAGE_MODELS).getValue(), SPACY_MODEL)
+
+    def annotate(self, context, doc, model_name, contents, attributes):
+        """contents with the Doc added as DocBin content or sidecar, attributes are updated in place."""
+        from spacy_annotations import MIME_TYPE, MODEL_ATTRIBUTE, PATH_ATTRIBUTE, to_bytes, write_sidecar
+
+        output = context.getProperty(self.ANNOTATION_OUTPUT).getValue() or NONE
+        if output == NONE:
+            return contents
+        data = to_bytes([doc])
+        attributes[MODEL_ATTRIBUTE] = model_name
+        if output == CONTENT:
+            attributes["mime.type"] = MIME_TYPE
+            return data
+
+        directory = context.getProperty(self.ANNOTATION_DIRECTORY).getValue()
+        if directory is None or directory.strip() == "":
+            raise ValueError("Annotation Output sidecar needs an Annotation Directory")
+        attributes[PATH_ATTRIBUTE] = write_sidecar(directory.strip(), data)
+        return contents
+
+    def entityLabels(self, context):
+        labels = context.getProperty(self.ENTITY_LABELS).getValue()
+        if labels is None:
+            return None
+        return set(label.strip().upper() for label in labels.split(",") if label.strip() != "")
+
+    def onScheduled(self, context):
+        import model_registry
+        import stage_timer
+
+        with stage_timer.timed("ExtractEntities", "load"):
+            if context.getProperty(self.INPUT_SOURCE).getValue() == CONTENT:
+                # chunks are parsed in the worker processes, start them and load the model there
+                from text_chunker import map_chunks, spacy_entities
+                list(map_chunks(spacy_entities, SPACY_MODEL, [(0, "")], context.getProperty(self.WORKER_PROCESSES).asInteger()))
+            elif context.getProperty(self.EXTRACTION_MODE).getValue() == NER or context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+                self.loadNerModel()
+            else:
+                self.loadModel()
+            if self.languageModelFile(context) is not None:
+                from language_id import load_language_model
+                load_language_model(self.languageModelFile(context))
+        self.logger.info("Model registry " + json.dumps(model_registry.stats()))
+
+    def transformNer(self, context, flowfile, parse_text, timer, cache=None, cache_key=None, model_name=SPACY_MODEL, language=None):
+        labels = self.entityLabels(context)
+
+        with timer.stage("load"):
+            self.loadNerModel(model_name)
+        with timer.stage("inference"):
+            doc = self.getBatcher(context, model_name).submit(parse_text)
+
+        with timer.stage("serialize"):
+            entities = [{"text": entity.text, "label": entity.label_, "start": entity.start_char, "end": entity.end_char}
+                        for entity in doc.ents if labels is None or entity.label_ in labels]
+            contents = json.dumps({"entities": entities})
+
+        attributes = {"entitycount": str(len(entities)), "mime.type": "application/json"}
+        attributes.update(language or {})
+        if cache is not None:
+            cache.put(cache_key, {"contents": contents, "attributes": dict(attributes)})
+            attributes["cachehit"] = "false"
+        with timer.stage("annotations"):
+            contents = self.annotate(context, doc, model_name, contents, attributes)
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def recordBatch(self, context, texts):
+        labels = self.entityLabels(context)
+        return [{"entities": [{"text": entity.text, "label": entity.label_, "start": entity.start_char, "end": entity.end_char}
+                              for entity in doc.ents if labels is None or entity.label_ in labels]}
+                for doc in self.nerBatch(texts)]
+
+    def transformRecords(self, context, flowfile, timer):
+        from record_io import enrich, MIME_TYPES
+
+        record_format = context.getProperty(self.RECORD_FORMAT).getValue()
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        contents, recordcount = enrich(data, record_format, context.getProperty(self.TEXT_FIELD).getValue(),
+                                       context.getProperty(self.RECORD_BATCH_SIZE).asInteger(),
+                                       lambda texts: self.recordBatch(context, texts), timer)
+
+        attributes = {"record.count": str(recordcount), "mime.type": MIME_TYPES[record_format]}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transformContent(self, context, flowfile, timer):
+        from text_chunker import extract, spacy_entities
+
+        labels = self.entityLabels(context)
+
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        with timer.stage("inference"):
+            found, chunkcount = extract(spacy_entities, SPACY_MODEL, data,
+                                        context.getProperty(self.CHUNK_SIZE).asInteger(),
+                                        context.getProperty(self.CHUNK_OVERLAP).asInteger(),
+                                        context.getProperty(self.WORKER_PROCESSES).asInteger())
+
+        with timer.stage("serialize"):
+            entities = [entity for entity in found if labels is None or entity["label"] in labels]
+            contents = json.dumps({"entities": entities})
+
+        attributes = {"entitycount": str(len(entities)), "chunkcount": str(chunkcount), "mime.type": "application/json"}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
     def transform(self, context, flowfile):
-        import spacy
-        
+        import stage_timer
+
+        timer = stage_timer.start("ExtractEntities")
+        if context.getProperty(self.INPUT_SOURCE).getValue() == CONTENT:
+            return self.transformContent(context, flowfile, timer)
+        if context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+            return self.transformRecords(context, flowfile, timer)
+
         parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
+        if parse_text is None or parse_text.strip() == "":
+            self.logger.error("Nothing to parse, Parse Text is empty")
+            return FlowFileTransformResult(relationship = "failure")
+        ner = context.getProperty(self.EXTRACTION_MODE).getValue() == NER
+
+        # tag the language first, texts without a model for their language skip NER
+        model_name = SPACY_MODEL
+        language = dict()
+        if self.languageModelFile(context) is not None:
+            with timer.stage("language"):
+                code, confidence = self.identifyLanguage(context, parse_text)
+            language = {"language": code, "languageconfidence": "%.3f" % confidence}
+            model_name = self.languageModels(context).get(code)
+            if model_name is None:
+                attributes = dict(language)
+                attributes["nerskipped"] = "true"
+                attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+                return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
+
+        # repeated texts return the stored result, ner results hold offsets so their key is the exact text
+        annotate = (context.getProperty(self.ANNOTATION_OUTPUT).getValue() or NONE) != NONE
+        cache = None if annotate else self.getResultCache(context)
+        cache_key = None
+        if cache is not None:
+            from result_cache import text_key
+
+            with timer.stage("cache"):
+                cache_key = text_key(parse_text, self.cacheModelId(context, model_name), normalize=not ner)
+                cached = cache.get(cache_key)
+            if cached is not None:
+                attributes = dict(cached["attributes"])
+                attributes["cachehit"] = "true"
+                attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+                contents = cached["contents"] if cached["contents"] is not None else flowfile
+                return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+        # near duplicates of a recent text reuse its results or leave through the duplicate relationship
+        action = context.getProperty(self.NEAR_DUPLICATE_ACTION).getValue() or OFF
+        index = None
+        if action == ROUTE or (action == REUSE and not ner and not annotate):
+            index = self.getNearDuplicateIndex(context, model_name)
+            with timer.stage("dedupe"):
+                signature = index.signature(parse_text)
+                match = index.query(signature)
+            if match is not None:
+                return self.nearDuplicate(context, flowfile, timer, action, match)
+
+        if ner:
+            # ner results hold offsets into their own text, so they are only ever routed, never reused
+            if index is not None:
+                index.add(signature, {"uuid": flowfile.getAttribute("uuid") or "", "attributes": None})
+            return self.transformNer(context, flowfile, parse_text, timer, cache, cache_key, model_name, language)
 
-        nlp = spacy.load('en_core_web_sm')
-        doc = nlp(parse_text)
+        with timer.stage("load"):
+            nlp = self.loadModel(model_name)
+        with timer.stage("inference"):
+            doc = nlp(parse_text)
 
         orgs=[]
         dates=[]
@@ -136,4 +624,13 @@ class ExtractEntities(FlowFileTransform):
         attributes = {"orgs": orgstr, "dates": datestr, "persons": personstr, "locs": locstr,
                       "moneys": moneystr, "times": timestr, "products": productstr, "quantities": quantitiestr,
                       "events": eventstr, "facs": facstr, "gpes": gpestr }
-        return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
+        attributes.update(language)
+        if index is not None:
+            index.add(signature, {"uuid": flowfile.getAttribute("uuid") or "", "attributes": dict(attributes)})
+        if cache is not None:
+            cache.put(cache_key, {"contents": None, "attributes": dict(attributes)})
+            attributes["cachehit"] = "false"
+        with timer.stage("annotations"):
+            contents = self.annotate(context, doc, model_name, flowfile, attributes)
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
@@ -71,11 +71,20 @@ class GetGTFSCompoundFeed(FlowFileTransform):
         default_value=TRIP_UPDATE
     )
 
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
     property_descriptors = [
         GTFS_URL,
         API_KEY,
         HEADER_NAME,
-        GTFS_TYPE
+        GTFS_TYPE,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
@@ -84,6 +93,7 @@ class GetGTFSCompoundFeed(FlowFileTransform):
         self.property_descriptors.append(self.API_KEY)
         self.property_descriptors.append(self.HEADER_NAME)
         self.property_descriptors.append(self.GTFS_TYPE)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
@@ -95,8 +105,10 @@ class GetGTFSCompoundFeed(FlowFileTransform):
         from google.transit import gtfs_realtime_pb2
         from google.protobuf.json_format import MessageToDict
         from google.protobuf.json_format import MessageToJson
+        import stage_timer
 
 		# https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/lirr%2Fgtfs-lirr
+        timer = stage_timer.start("GetGTFSCompoundFeed")
         gtfsurl = context.getProperty(self.GTFS_URL).evaluateAttributeExpressions(flowfile).getValue()
         apikey = context.getProperty(self.API_KEY).evaluateAttributeExpressions(flowfile).getValue()
         headername = context.getProperty(self.HEADER_NAME).evaluateAttributeExpressions(flowfile).getValue()
@@ -117,9 +129,12 @@ class GetGTFSCompoundFeed(FlowFileTransform):
             gtfs_type = context.getProperty(self.GTFS_TYPE).evaluateAttributeExpressions(flowfile).getValue()
         
             try:
-                transitrequest = urllib.request.Request(url=gtfsurl, headers=headers)
-                response = urllib.request.urlopen(transitrequest)
-                feed.ParseFromString(response.read())
+                with timer.stage("http"):
+                    transitrequest = urllib.request.Request(url=gtfsurl, headers=headers)
+                    response = urllib.request.urlopen(transitrequest)
+                    body = response.read()
+                with timer.stage("parse"):
+                    feed.ParseFromString(body)
 
                 if gtfs_type == TRIP_UPDATE:
                     trip_updates = gtfs_realtime_pb2.FeedMessage()
@@ -130,7 +145,8 @@ class GetGTFSCompoundFeed(FlowFileTransform):
                 if gtfs_type == ALERT:
                     alerts = gtfs_realtime_pb2.FeedMessage()
                 
-                json_obj = MessageToJson(feed)
+                with timer.stage("serialize"):
+                    json_obj = MessageToJson(feed)
 
                 if gtfs_type == TRIP_UPDATE:
                     trip_updates.header.CopyFrom(feed.header)
@@ -168,17 +184,21 @@ class GetGTFSCompoundFeed(FlowFileTransform):
                             e = alerts.entity.add()
                             e.CopyFrom(feedentity)
 
-                if gtfs_type == TRIP_UPDATE:
-                    json_obj = MessageToJson(trip_updates)
+                with timer.stage("serialize"):
+                    if gtfs_type == TRIP_UPDATE:
+                        json_obj = MessageToJson(trip_updates)
 
-                if gtfs_type == VEHICLE:
-                    json_obj = MessageToJson(vehicles)
+                    if gtfs_type == VEHICLE:
+                        json_obj = MessageToJson(vehicles)
 
-                if gtfs_type == ALERT:
-                    json_obj = MessageToJson(alerts)
+                    if gtfs_type == ALERT:
+                        json_obj = MessageToJson(alerts)
                 #json_obj = str( jsontu + "\n" + jsonvehicles + "\n" + jsonalerts + "\n")
 
             except Exception as ex:
                 print(ex)
 
-        return FlowFileTransformResult(relationship = "success", contents=json_obj, attributes={"gtfsurl": gtfsurl,"gtfstype": gtfs_type})
+        attributes = {"gtfsurl": gtfsurl,"gtfstype": gtfs_type}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+
+        return FlowFileTransformResult(relationship = "success", contents=json_obj, attributes=attributes)
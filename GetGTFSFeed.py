@@ -40,13 +40,23 @@ class GetGTFSFeed(FlowFileTransform):
         expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
     )
 
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
     property_descriptors = [
-        GTFS_URL
+        GTFS_URL,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.GTFS_URL)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
@@ -58,17 +68,25 @@ class GetGTFSFeed(FlowFileTransform):
         from google.transit import gtfs_realtime_pb2
         from google.protobuf.json_format import MessageToDict
         from google.protobuf.json_format import MessageToJson
+        import stage_timer
 		# from collections import OrderedDict
 
 		# https://gtfs.halifax.ca/realtime/Vehicle/VehiclePositions.pb
+        timer = stage_timer.start("GetGTFSFeed")
         gtfsurl = context.getProperty(self.GTFS_URL).evaluateAttributeExpressions(flowfile).getValue()
 
         attributes = {"gtfsurl": gtfsurl}
 
         if (gtfsurl != None):
             feed = gtfs_realtime_pb2.FeedMessage()
-            response = urllib.request.urlopen(gtfsurl)
-            feed.ParseFromString(response.read())
-            json_obj = MessageToJson(feed)
+            with timer.stage("http"):
+                response = urllib.request.urlopen(gtfsurl)
+                body = response.read()
+            with timer.stage("parse"):
+                feed.ParseFromString(body)
+            with timer.stage("serialize"):
+                json_obj = MessageToJson(feed)
+
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
 
         return FlowFileTransformResult(relationship = "success", contents=json_obj, attributes=attributes)
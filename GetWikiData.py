@@ -15,13 +15,25 @@
 
 import json
 import re
+import threading
+import time
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 
+PAGE = "page"
+BULK = "bulk"
+
 ### Wiki Data Retrieve
 ### wikipedia-api
 ### https://wikipedia-api.readthedocs.io/en/latest/README.html
 ### pip3 install wikipedia-api
+### One wikipediaapi client (and so one keep-alive HTTP session) per language and format is kept
+### by the processor.  With the page cache on, pages are fetched with their revision id in one
+### query on the shared requests session (wiki_bulk.py) and laid out like wikipediaapi's page.text:
+### a cached page costs a cheap prop=info call for the last revision id instead of the extract,
+### and no call at all for Revalidate After seconds after it was last checked.
+### Bulk mode asks the MediaWiki API for the intro extracts of up to 50 titles per query
+### (wiki_bulk.py) on a bounded pool and writes one JSON Lines record per title
 class GetWikiData(FlowFileTransform):
     class Java:
         implements = ['org.apache.nifi.python.processor.FlowFileTransform']
@@ -42,41 +54,280 @@ class GetWikiData(FlowFileTransform):
 
     WIKIPAGE = PropertyDescriptor(
         name="Wiki Page",
-        description="Specifies which wiki page",
-        required=True,
+        description="Specifies which wiki page. bulk input: the titles, one per line or separated by |, when empty the FlowFile content holds them",
+        required=False,
         validators=[StandardValidators.NON_EMPTY_VALIDATOR],
         expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
     )
 
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="page fetches the Wiki Page article into the results attribute. bulk fetches the intro extract of every title in Wiki Page or the content, Titles Per Request titles per API query, and writes one JSON record per title with title, pagetitle, pageid, revid, extract and missing",
+        required=True,
+        default_value=PAGE,
+        allowable_values=[PAGE, BULK]
+    )
+
+    TITLES_PER_REQUEST = PropertyDescriptor(
+        name="Titles Per Request",
+        description="bulk input: titles per MediaWiki API query, at most 50",
+        required=True,
+        default_value="50",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    BULK_CONCURRENCY = PropertyDescriptor(
+        name="Bulk Concurrency",
+        description="bulk input: API queries running at the same time",
+        required=True,
+        default_value="4",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    LANGUAGE = PropertyDescriptor(
+        name="Language",
+        description="Wikipedia language edition, such as en or de",
+        required=True,
+        default_value="en",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    PAGE_CACHE_SIZE = PropertyDescriptor(
+        name="Page Cache Size",
+        description="Number of pages kept in memory with their revision id, keyed by language, title and format. 0 disables the cache",
+        required=True,
+        default_value="1000",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    PAGE_CACHE_TTL = PropertyDescriptor(
+        name="Page Cache TTL (s)",
+        description="Seconds a cached page is kept, revalidated or not. 0 keeps it until it is evicted",
+        required=True,
+        default_value="604800",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    REVALIDATE_AFTER = PropertyDescriptor(
+        name="Revalidate After (s)",
+        description="Seconds a cached page is served without checking its revision id. 0 checks the revision id every time",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    PAGE_CACHE_PATH = PropertyDescriptor(
+        name="Page Cache Path",
+        description="Optional SQLite file for an on-disk page cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
     property_descriptors = [
         FORMAT,
-        WIKIPAGE
+        WIKIPAGE,
+        INPUT_SOURCE,
+        TITLES_PER_REQUEST,
+        BULK_CONCURRENCY,
+        LANGUAGE,
+        PAGE_CACHE_SIZE,
+        PAGE_CACHE_TTL,
+        REVALIDATE_AFTER,
+        PAGE_CACHE_PATH,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.FORMAT)
         self.property_descriptors.append(self.WIKIPAGE)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.TITLES_PER_REQUEST)
+        self.property_descriptors.append(self.BULK_CONCURRENCY)
+        self.property_descriptors.append(self.LANGUAGE)
+        self.property_descriptors.append(self.PAGE_CACHE_SIZE)
+        self.property_descriptors.append(self.PAGE_CACHE_TTL)
+        self.property_descriptors.append(self.REVALIDATE_AFTER)
+        self.property_descriptors.append(self.PAGE_CACHE_PATH)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
+        self.clients = dict()
+        self.clients_lock = threading.Lock()
+        self.session = None
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
-    def transform(self, context, flowfile):
+    def getWiki(self, language, whichone):
         import wikipediaapi
-        
+
+        # the client keeps its HTTP session, connections are reused across FlowFiles
+        with self.clients_lock:
+            wiki_wiki = self.clients.get((language, whichone))
+            if wiki_wiki is None:
+                if (whichone == "text"):
+                    wiki_wiki = wikipediaapi.Wikipedia(user_agent='NiFi tspann@cloudera',language=language,extract_format=wikipediaapi.ExtractFormat.WIKI)
+                else:
+                    wiki_wiki = wikipediaapi.Wikipedia(user_agent='NiFi tspann@cloudera',language=language,extract_format=wikipediaapi.ExtractFormat.HTML)
+                self.clients[(language, whichone)] = wiki_wiki
+            return wiki_wiki
+
+    def getSession(self):
+        import requests
+
+        with self.clients_lock:
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.headers["User-Agent"] = "NiFi tspann@cloudera"
+            return self.session
+
+    def getPageCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.PAGE_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("GetWikiData", size,
+                         context.getProperty(self.PAGE_CACHE_TTL).asInteger(),
+                         context.getProperty(self.PAGE_CACHE_PATH).getValue())
+
+    def fetchPage(self, context, language, whichone, wikipage, timer):
+        """(text, revision id, page cache status) of a page, revalidating a cached copy by its revision id.
+
+        Without the page cache the wikipediaapi client fetches the text.  With it a page that is not
+        cached (or changed) costs one query for its extract and revision id, and a cached page one
+        prop=info query for the revision id.
+        """
+        cache = self.getPageCache(context)
+        if cache is None:
+            with timer.stage("http"):
+                return str(self.getWiki(language, whichone).page(wikipage).text), None, None
+
+        from result_cache import text_key
+        from wiki_bulk import fetch_batch, fetch_revisions, page_text
+
+        session = self.getSession()
+        with timer.stage("cache"):
+            cache_key = text_key(wikipage, "GetWikiData:" + language + ":" + whichone, normalize=False)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            if time.time() - cached["checked"] < context.getProperty(self.REVALIDATE_AFTER).asInteger():
+                return cached["text"], cached["revid"], "fresh"
+            with timer.stage("revalidate"):
+                revid = fetch_revisions(session, language, [wikipage])[wikipage]
+            # missing pages have no revision, there is no extract to fetch or cache
+            if revid is None:
+                return "", None, "missing"
+            if cached["revid"] == revid:
+                cache.put(cache_key, {"text": cached["text"], "revid": revid, "checked": time.time()})
+                return cached["text"], revid, "revalidated"
+
+        with timer.stage("http"):
+            page = fetch_batch(session, language, [wikipage], whichone == "html", intro=False)[wikipage]
+        if page.get("missing"):
+            return "", None, "missing"
+        text = page_text(page.get("extract", ""), whichone == "html")
+        cache.put(cache_key, {"text": text, "revid": page.get("revid"), "checked": time.time()})
+        return text, page.get("revid"), "miss"
+
+    def transformBulk(self, context, flowfile, timer):
+        from concurrent.futures import ThreadPoolExecutor
+        from result_cache import text_key
+        from wiki_bulk import batches, fetch_batch, fetch_revisions, parse_titles
+
+        language = context.getProperty(self.LANGUAGE).getValue()
+        whichone = context.getProperty(self.FORMAT).evaluateAttributeExpressions(flowfile).getValue()
+        with timer.stage("read"):
+            titles = context.getProperty(self.WIKIPAGE).evaluateAttributeExpressions(flowfile).getValue()
+            if titles is None or titles.strip() == "":
+                titles = flowfile.getContentsAsBytes().decode("utf-8")
+            titles = parse_titles(titles)
+
+        # intro extracts are served from the page cache, those checked more than Revalidate After
+        # seconds ago once their revision ids, queried in batches, show they did not change
+        cache = self.getPageCache(context)
+        cache_id = "GetWikiData:" + language + ":" + whichone + ":intro"
+        revalidate_after = context.getProperty(self.REVALIDATE_AFTER).asInteger()
+        per_request = context.getProperty(self.TITLES_PER_REQUEST).asInteger()
+        concurrency = context.getProperty(self.BULK_CONCURRENCY).asInteger()
+        session = self.getSession()
+        pages = dict()
+        stale = dict()
+        if cache is not None:
+            with timer.stage("cache"):
+                for title in titles:
+                    cached = cache.get(text_key(title, cache_id, normalize=False))
+                    if cached is None:
+                        continue
+                    if time.time() - cached["checked"] < revalidate_after:
+                        pages[title] = cached["page"]
+                    else:
+                        stale[title] = cached["page"]
+
+        checks = batches(list(stale), per_request)
+        if len(checks) > 0:
+            with timer.stage("revalidate"):
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    for revisions in pool.map(lambda batch: fetch_revisions(session, language, batch), checks):
+                        for title, revid in revisions.items():
+                            if revid is not None and revid == stale[title].get("revid"):
+                                pages[title] = stale[title]
+                                cache.put(text_key(title, cache_id, normalize=False), {"page": stale[title], "checked": time.time()})
+
+        queries = batches([title for title in titles if title not in pages], per_request)
+        with timer.stage("http"):
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for fetched in pool.map(lambda batch: fetch_batch(session, language, batch, whichone == "html"), queries):
+                    pages.update(fetched)
+        if cache is not None:
+            for batch in queries:
+                for title in batch:
+                    if not pages[title].get("missing"):
+                        cache.put(text_key(title, cache_id, normalize=False), {"page": pages[title], "checked": time.time()})
+
+        with timer.stage("serialize"):
+            lines = []
+            for title in titles:
+                page = pages[title]
+                lines.append(json.dumps({"title": title, "pagetitle": page["title"], "pageid": page.get("pageid"), "revid": page.get("revid"),
+                                         "extract": page.get("extract", ""), "missing": bool(page.get("missing"))}))
+            contents = "".join(line + "\n" for line in lines)
+
+        attributes = {"format": whichone, "titlecount": str(len(titles)), "requestbatches": str(len(queries)),
+                      "revalidationbatches": str(len(checks)),
+                      "foundcount": str(sum(1 for title in titles if not pages[title].get("missing"))),
+                      "mime.type": "application/x-ndjson"}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transform(self, context, flowfile):
+        import stage_timer
+
+        timer = stage_timer.start("GetWikiData")
+        if context.getProperty(self.INPUT_SOURCE).getValue() == BULK:
+            return self.transformBulk(context, flowfile, timer)
         wikipage = context.getProperty(self.WIKIPAGE).evaluateAttributeExpressions(flowfile).getValue()
         whichone = context.getProperty(self.FORMAT).evaluateAttributeExpressions(flowfile).getValue()
+        language = context.getProperty(self.LANGUAGE).getValue()
 
         attributes = {"format": whichone, "wikipage": wikipage}
 
-        if (whichone != None):
-            if (whichone == "text"):
-            	wiki_wiki = wikipediaapi.Wikipedia(user_agent='NiFi tspann@cloudera',language='en',extract_format=wikipediaapi.ExtractFormat.WIKI)
-            else: 
-            	wiki_wiki = wikipediaapi.Wikipedia(user_agent='NiFi tspann@cloudera',language='en',extract_format=wikipediaapi.ExtractFormat.HTML)
-
         if (wikipage != None):
-        	results = wiki_wiki.page(wikipage)
-       		attributes["results"] = str(results.text)
+            text, revid, pagecache = self.fetchPage(context, language, whichone, wikipage, timer)
+            attributes["results"] = text
+            if revid is not None:
+                attributes["revid"] = str(revid)
+            if pagecache is not None:
+                attributes["pagecache"] = pagecache
+
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
 
         return FlowFileTransformResult(relationship = "success", contents=None, attributes=attributes)
@@ -0,0 +1,239 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
+from nifiapi.properties import PropertyDescriptor, PropertyDependency, StandardValidators, ExpressionLanguageScope
+
+ATTRIBUTE = "attribute"
+RECORDS = "records"
+DOCUMENT = "document"
+
+### https://openstreetmap.org/copyright
+### Latitude and Longitude to the nearest place of a local gazetteer (OSM / Nominatim export)
+### Reverse geocoding without a remote call per point, for vehicle positions
+### from GetGTFSCompoundFeed or latitude/longitude from GetFakeRecord
+class LatLongToAddress(FlowFileTransform):
+    class Java:
+        implements = ['org.apache.nifi.python.processor.FlowFileTransform']
+
+    class ProcessorDetails:
+        version = '2.0.0-M2'
+        dependencies = ['numpy' ]
+        description = """Reverse geocoding of latitude/longitude to the nearest place of a local OpenStreetMap ODBL gazetteer"""
+        tags = ["locations","osm",  "latitude", "longitude", "reverse geocoding", "gazetteer", "addresses", "lat/long", "gtfs", "OpenStreamMaps", "kd-tree"]
+
+    GAZETTEER_FILE = PropertyDescriptor(
+        name="Gazetteer File",
+        description="CSV (with a header row) or Parquet file of places, with display_name or name, lat and lon columns and optionally osm_id, class, type and the other Nominatim fields. Parquet needs pyarrow",
+        required=True,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="attribute looks up the Latitude and Longitude values and adds the place as attributes. records reads JSON Lines or CSV records and adds a nearestplace field next to every pair of latitude and longitude fields, also inside nested objects. document does the same for every object of one JSON document, such as a GTFS vehicle positions feed",
+        required=True,
+        default_value=ATTRIBUTE,
+        allowable_values=[ATTRIBUTE, RECORDS, DOCUMENT]
+    )
+
+    LATITUDE = PropertyDescriptor(
+        name="Latitude",
+        description="attribute input: latitude in decimal degrees",
+        required=True,
+        default_value="${latitude}",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR],
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    LONGITUDE = PropertyDescriptor(
+        name="Longitude",
+        description="attribute input: longitude in decimal degrees",
+        required=True,
+        default_value="${longitude}",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR],
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    RECORD_FORMAT = PropertyDescriptor(
+        name="Record Format",
+        description="records input: jsonl (one JSON object per line) or csv (with a header row). The output uses the same format",
+        required=True,
+        default_value="jsonl",
+        allowable_values=["jsonl", "csv"]
+    )
+
+    LATITUDE_FIELD = PropertyDescriptor(
+        name="Latitude Field",
+        description="records and document input: name of the latitude field",
+        required=True,
+        default_value="latitude",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    LONGITUDE_FIELD = PropertyDescriptor(
+        name="Longitude Field",
+        description="records and document input: name of the longitude field",
+        required=True,
+        default_value="longitude",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RECORD_BATCH_SIZE = PropertyDescriptor(
+        name="Record Batch Size",
+        description="records input: number of records looked up together",
+        required=True,
+        default_value="1000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    MAX_DISTANCE = PropertyDescriptor(
+        name="Max Distance (km)",
+        description="Points farther than this from every place get no place. 0 always takes the nearest place",
+        required=True,
+        default_value="25",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    property_descriptors = [
+        GAZETTEER_FILE,
+        INPUT_SOURCE,
+        LATITUDE,
+        LONGITUDE,
+        RECORD_FORMAT,
+        LATITUDE_FIELD,
+        LONGITUDE_FIELD,
+        RECORD_BATCH_SIZE,
+        MAX_DISTANCE,
+        TIMING_ATTRIBUTES
+    ]
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.property_descriptors.append(self.GAZETTEER_FILE)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.LATITUDE)
+        self.property_descriptors.append(self.LONGITUDE)
+        self.property_descriptors.append(self.RECORD_FORMAT)
+        self.property_descriptors.append(self.LATITUDE_FIELD)
+        self.property_descriptors.append(self.LONGITUDE_FIELD)
+        self.property_descriptors.append(self.RECORD_BATCH_SIZE)
+        self.property_descriptors.append(self.MAX_DISTANCE)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
+
+    def getPropertyDescriptors(self):
+        return self.property_descriptors
+
+    def getReverseGeocoder(self, context):
+        from reverse_geocoder import load_reverse_geocoder
+        return load_reverse_geocoder(context.getProperty(self.GAZETTEER_FILE).getValue())
+
+    def onScheduled(self, context):
+        # build the KD-tree before the first FlowFile
+        self.getReverseGeocoder(context)
+
+    def maxDistance(self, context):
+        return float(context.getProperty(self.MAX_DISTANCE).getValue()) or None
+
+    def enrichPoints(self, context, geocoder, values):
+        """Add nearestplace to every latitude/longitude object in values, returns (points, places found)."""
+        from reverse_geocoder import positions, summary
+
+        latitude_field = context.getProperty(self.LATITUDE_FIELD).getValue()
+        longitude_field = context.getProperty(self.LONGITUDE_FIELD).getValue()
+        max_km = self.maxDistance(context)
+        points = 0
+        found = 0
+        for value in values:
+            # collected first, the added field must not be walked into
+            for point in list(positions(value, latitude_field, longitude_field)):
+                place, distance = geocoder.nearest(point[latitude_field], point[longitude_field], max_km)
+                point["nearestplace"] = summary(place, distance)
+                points += 1
+                found += place is not None
+        return points, found
+
+    def transformRecords(self, context, flowfile, timer):
+        from record_io import enrich_records, MIME_TYPES
+
+        with timer.stage("load"):
+            geocoder = self.getReverseGeocoder(context)
+        record_format = context.getProperty(self.RECORD_FORMAT).getValue()
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        counts = [0, 0]
+
+        def lookup(batch):
+            points, found = self.enrichPoints(context, geocoder, batch)
+            counts[0] += points
+            counts[1] += found
+
+        contents, recordcount = enrich_records(data, record_format, context.getProperty(self.RECORD_BATCH_SIZE).asInteger(), lookup, timer)
+
+        attributes = {"record.count": str(recordcount), "pointcount": str(counts[0]), "geocodedcount": str(counts[1]),
+                      "mime.type": MIME_TYPES[record_format]}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transformDocument(self, context, flowfile, timer):
+        with timer.stage("load"):
+            geocoder = self.getReverseGeocoder(context)
+        with timer.stage("parse"):
+            document = json.loads(flowfile.getContentsAsBytes().decode("utf-8"))
+        with timer.stage("inference"):
+            points, found = self.enrichPoints(context, geocoder, [document])
+        with timer.stage("serialize"):
+            contents = json.dumps(document)
+
+        attributes = {"pointcount": str(points), "geocodedcount": str(found), "mime.type": "application/json"}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transform(self, context, flowfile):
+        import stage_timer
+
+        timer = stage_timer.start("LatLongToAddress")
+        if context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+            return self.transformRecords(context, flowfile, timer)
+        if context.getProperty(self.INPUT_SOURCE).getValue() == DOCUMENT:
+            return self.transformDocument(context, flowfile, timer)
+
+        latitude = context.getProperty(self.LATITUDE).evaluateAttributeExpressions(flowfile).getValue()
+        longitude = context.getProperty(self.LONGITUDE).evaluateAttributeExpressions(flowfile).getValue()
+
+        with timer.stage("load"):
+            geocoder = self.getReverseGeocoder(context)
+        with timer.stage("inference"):
+            place, distance = geocoder.nearest(latitude, longitude, self.maxDistance(context))
+
+        attributes = {"geocoded": str(place is not None).lower()}
+        if place is not None:
+            attributes.update({"osmid": str(place["osm_id"]), "osmclass": str(place["class"]), "osmtype": str(place["type"]),
+                               "osmname": str(place["name"]), "displayname": str(place["display_name"]),
+                               "placelatitude": str(place["lat"]), "placelongitude": str(place["lon"]),
+                               "osmlicense": str(place["licence"]), "distancekm": "%.3f" % distance})
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
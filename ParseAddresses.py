@@ -16,7 +16,12 @@
 import json
 import re
 from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
-from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
+from nifiapi.properties import PropertyDescriptor, PropertyDependency, StandardValidators, ExpressionLanguageScope
+
+ATTRIBUTE = "attribute"
+CONTENT = "content"
+RECORDS = "records"
+STREAM = "stream"
 
 ### Parse Addresses
 class ParseAddresses(FlowFileTransform):
@@ -29,31 +34,298 @@ class ParseAddresses(FlowFileTransform):
         description = """Extract NLP Addresses """
         tags = ["locations", "NLP", "pyap", "extract addresses", "addresses", "ai", "artificial intelligence", "ml", "machine learning", "text", "LLM"]
 
+    INPUT_SOURCE = PropertyDescriptor(
+        name="Input Source",
+        description="attribute parses the Parse Text value. content parses the FlowFile content in sentence aligned, overlapping chunks on a pool of worker processes and writes every address with its document offsets as JSON content. records reads JSON Lines or CSV records and adds an addresses list to each record. stream reads the content line by line, only parses the lines around street number + street suffix, PO box or postal code candidates, and writes every address with its document offsets as JSON Lines",
+        required=True,
+        default_value=ATTRIBUTE,
+        allowable_values=[ATTRIBUTE, CONTENT, RECORDS, STREAM]
+    )
+
     PARSE_TEXT = PropertyDescriptor(
         name="Parse Text",
-        description="Specifies the text to parse for addresses",
-        required=True,
+        description="Specifies the text to parse for addresses, used when Input Source is attribute. When empty, the text of spaCy annotations from ExtractEntities is parsed",
+        required=False,
         validators=[StandardValidators.NON_EMPTY_VALIDATOR],
-        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
+        expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES,
+        dependencies=[PropertyDependency(INPUT_SOURCE, ATTRIBUTE)]
+    )
+
+    RECORD_FORMAT = PropertyDescriptor(
+        name="Record Format",
+        description="records input: jsonl (one JSON object per line) or csv (with a header row). The output uses the same format",
+        required=True,
+        default_value="jsonl",
+        allowable_values=["jsonl", "csv"]
+    )
+
+    TEXT_FIELD = PropertyDescriptor(
+        name="Text Field",
+        description="records input: field of each record that holds the text to parse",
+        required=True,
+        default_value="text",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    RECORD_BATCH_SIZE = PropertyDescriptor(
+        name="Record Batch Size",
+        description="records input: number of records parsed together",
+        required=True,
+        default_value="64",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_SIZE = PropertyDescriptor(
+        name="Chunk Size (chars)",
+        description="content input: maximum number of characters per chunk, chunks are cut at sentence ends",
+        required=True,
+        default_value="20000",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    CHUNK_OVERLAP = PropertyDescriptor(
+        name="Chunk Overlap (chars)",
+        description="content input: characters of the previous chunk repeated at the start of the next one, so addresses on a boundary are not split",
+        required=True,
+        default_value="200",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    WORKER_PROCESSES = PropertyDescriptor(
+        name="Worker Processes",
+        description="content input: number of worker processes the chunks run on, 0 uses one per CPU, 1 runs in the processor itself",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    COUNTRIES = PropertyDescriptor(
+        name="Countries",
+        description="Comma separated address formats to look for: US, CA, GB. When several find the same address, the first listed wins",
+        required=True,
+        default_value="US",
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    WINDOW_LINES = PropertyDescriptor(
+        name="Window Lines",
+        description="stream input: lines before and after a candidate line (including it) handed to the parser, enough to hold a multi-line address",
+        required=True,
+        default_value="3",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_SIZE = PropertyDescriptor(
+        name="Result Cache Size",
+        description="Number of results kept in memory, keyed by a hash of the Parse Text. 0 disables the cache",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_TTL = PropertyDescriptor(
+        name="Result Cache TTL (s)",
+        description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+        required=True,
+        default_value="3600",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    RESULT_CACHE_PATH = PropertyDescriptor(
+        name="Result Cache Path",
+        description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    ANNOTATION_DIRECTORY = PropertyDescriptor(
+        name="Annotation Directory",
+        description="Annotation Directory of the ExtractEntities that writes sidecar DocBin files. spacy.docbin.path is only read when it names a file inside it; when empty, sidecars are ignored",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
     )
 
     property_descriptors = [
-        PARSE_TEXT
+        PARSE_TEXT,
+        INPUT_SOURCE,
+        RECORD_FORMAT,
+        TEXT_FIELD,
+        RECORD_BATCH_SIZE,
+        CHUNK_SIZE,
+        CHUNK_OVERLAP,
+        WORKER_PROCESSES,
+        COUNTRIES,
+        WINDOW_LINES,
+        RESULT_CACHE_SIZE,
+        RESULT_CACHE_TTL,
+        RESULT_CACHE_PATH,
+        ANNOTATION_DIRECTORY,
+        TIMING_ATTRIBUTES
     ]
 
     def __init__(self, **kwargs):
         super().__init__()
         self.property_descriptors.append(self.PARSE_TEXT)
+        self.property_descriptors.append(self.INPUT_SOURCE)
+        self.property_descriptors.append(self.RECORD_FORMAT)
+        self.property_descriptors.append(self.TEXT_FIELD)
+        self.property_descriptors.append(self.RECORD_BATCH_SIZE)
+        self.property_descriptors.append(self.CHUNK_SIZE)
+        self.property_descriptors.append(self.CHUNK_OVERLAP)
+        self.property_descriptors.append(self.WORKER_PROCESSES)
+        self.property_descriptors.append(self.COUNTRIES)
+        self.property_descriptors.append(self.WINDOW_LINES)
+        self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+        self.property_descriptors.append(self.RESULT_CACHE_TTL)
+        self.property_descriptors.append(self.RESULT_CACHE_PATH)
+        self.property_descriptors.append(self.ANNOTATION_DIRECTORY)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
     def getPropertyDescriptors(self):
         return self.property_descriptors
 
+    def annotationDirectory(self, context):
+        return context.getProperty(self.ANNOTATION_DIRECTORY).getValue()
+
+    def getResultCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("ParseAddresses", size,
+                         context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+                         context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+    def countries(self, context):
+        from address_scanner import parse_countries
+        return parse_countries(context.getProperty(self.COUNTRIES).getValue())
+
+    def recordBatch(self, context, texts):
+        import pyap
+
+        countries = self.countries(context)
+        return [{"addresses": [address.as_dict() for country in countries for address in pyap.parse(text, country=country) if str(address) != ""]}
+                for text in texts]
+
+    def transformRecords(self, context, flowfile, timer):
+        from record_io import enrich, MIME_TYPES
+
+        record_format = context.getProperty(self.RECORD_FORMAT).getValue()
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        contents, recordcount = enrich(data, record_format, context.getProperty(self.TEXT_FIELD).getValue(),
+                                       context.getProperty(self.RECORD_BATCH_SIZE).asInteger(),
+                                       lambda texts: self.recordBatch(context, texts), timer)
+
+        attributes = {"record.count": str(recordcount), "mime.type": MIME_TYPES[record_format]}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transformContent(self, context, flowfile, timer):
+        from spacy_annotations import annotation_text, read_annotations
+        from text_chunker import extract, pyap_addresses
+
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        # a DocBin from ExtractEntities carries the text, addresses are found in it
+        with timer.stage("annotations"):
+            docs = read_annotations(flowfile, data, self.annotationDirectory(context))
+        if docs is not None:
+            data = annotation_text(docs).encode("utf-8")
+        with timer.stage("inference"):
+            addresses, chunkcount = extract(pyap_addresses, self.countries(context), data,
+                                            context.getProperty(self.CHUNK_SIZE).asInteger(),
+                                            context.getProperty(self.CHUNK_OVERLAP).asInteger(),
+                                            context.getProperty(self.WORKER_PROCESSES).asInteger())
+
+        with timer.stage("serialize"):
+            contents = json.dumps({"addresses": [{"address": address["text"], "start": address["start"], "end": address["end"],
+                                                  "country": address["country"], "parsed": address["address"]} for address in addresses]})
+
+        primaryaddress = addresses[-1]["text"] if len(addresses) > 0 else ""
+        attributes = {"primaryaddress": primaryaddress, "addresscount": str(len(addresses)), "chunkcount": str(chunkcount),
+                      "mime.type": "application/json"}
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
+    def transformStream(self, context, flowfile, timer):
+        from address_scanner import AddressScanner
+        from spacy_annotations import annotation_text, read_annotations
+
+        with timer.stage("read"):
+            data = flowfile.getContentsAsBytes()
+        with timer.stage("annotations"):
+            docs = read_annotations(flowfile, data, self.annotationDirectory(context))
+        if docs is not None:
+            data = annotation_text(docs)
+
+        scanner = AddressScanner(self.countries(context), context.getProperty(self.WINDOW_LINES).asInteger())
+        lines = []
+        primaryaddress = ""
+        # scanning and parsing interleave, the inference stage covers both
+        with timer.stage("inference"):
+            for address in scanner.scan(data):
+                lines.append(json.dumps(address))
+                primaryaddress = address["address"]
+        with timer.stage("serialize"):
+            contents = "".join(line + "\n" for line in lines)
+
+        attributes = {"primaryaddress": primaryaddress, "addresscount": str(len(lines)), "mime.type": "application/x-ndjson"}
+        attributes.update(scanner.stats())
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+        return FlowFileTransformResult(relationship = "success", contents=contents, attributes=attributes)
+
     def transform(self, context, flowfile):
         import pyap
+        import stage_timer
+
+        timer = stage_timer.start("ParseAddresses")
+        if context.getProperty(self.INPUT_SOURCE).getValue() == CONTENT:
+            return self.transformContent(context, flowfile, timer)
+        if context.getProperty(self.INPUT_SOURCE).getValue() == RECORDS:
+            return self.transformRecords(context, flowfile, timer)
+        if context.getProperty(self.INPUT_SOURCE).getValue() == STREAM:
+            return self.transformStream(context, flowfile, timer)
 
         parse_text = context.getProperty(self.PARSE_TEXT).evaluateAttributeExpressions(flowfile).getValue()
+        if parse_text is None or parse_text.strip() == "":
+            from spacy_annotations import annotation_text, read_annotations
+
+            with timer.stage("annotations"):
+                docs = read_annotations(flowfile, directory=self.annotationDirectory(context))
+            if docs is not None:
+                parse_text = annotation_text(docs)
+        if parse_text is None or parse_text.strip() == "":
+            self.logger.error("Nothing to parse, Parse Text is empty and the FlowFile has no spaCy annotations")
+            return FlowFileTransformResult(relationship = "failure")
+
+        # repeated texts return the stored result, addresses hold offsets so the key is the exact text
+        cache = self.getResultCache(context)
+        cache_key = None
+        if cache is not None:
+            from result_cache import text_key
+
+            with timer.stage("cache"):
+                cache_key = text_key(parse_text, "ParseAddresses:" + self.ProcessorDetails.version + ":" + ",".join(self.countries(context)), normalize=False)
+                cached = cache.get(cache_key)
+            if cached is not None:
+                attributes = dict(cached["attributes"])
+                attributes["cachehit"] = "true"
+                attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+                return FlowFileTransformResult(relationship = "success", contents=cached["contents"], attributes=attributes)
 
-        addresses = pyap.parse(parse_text, country='US')
+        with timer.stage("inference"):
+            addresses = [address for country in self.countries(context) for address in pyap.parse(parse_text, country=country)]
 
         primaryaddress = ""
         json_string = ""
@@ -68,4 +340,8 @@ class ParseAddresses(FlowFileTransform):
             print(ex)
 
         attributes = { "primaryaddress": primaryaddress }
+        if cache is not None:
+            cache.put(cache_key, {"contents": json_string, "attributes": dict(attributes)})
+            attributes["cachehit"] = "false"
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
         return FlowFileTransformResult(relationship = "success", contents=json_string, attributes=attributes)        
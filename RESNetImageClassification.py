@@ -20,6 +20,8 @@ from nifiapi.properties import PropertyDescriptor, StandardValidators, Expressio
 
 # https://huggingface.co/microsoft/resnet-50
 
+MODEL_NAME = "microsoft/resnet-50"
+
 ### RES Net image classification
 class RESNetImageClassification(FlowFileTransform):
 	class Java:
@@ -39,49 +41,216 @@ class RESNetImageClassification(FlowFileTransform):
 		expression_language_scope=ExpressionLanguageScope.FLOWFILE_ATTRIBUTES
 	)
 
+	MAX_BATCH_SIZE = PropertyDescriptor(
+		name="Max Batch Size",
+		description="Maximum number of images from concurrent tasks that are run in one forward pass",
+		required=True,
+		default_value="8",
+		validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+	)
+
+	MAX_BATCH_WAIT = PropertyDescriptor(
+		name="Max Batch Wait (ms)",
+		description="How long the first image of a batch waits for other images to join it",
+		required=True,
+		default_value="10",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	BACKEND = PropertyDescriptor(
+		name="Inference Backend",
+		description="Run the model with eager PyTorch, or exported to ONNX Runtime (optionally int8 dynamically quantized)",
+		required=True,
+		default_value="pytorch",
+		allowable_values=["pytorch", "onnxruntime", "onnxruntime-int8"]
+	)
+
+	ONNX_CACHE_DIR = PropertyDescriptor(
+		name="ONNX Cache Directory",
+		description="Directory the exported ONNX models and parity reports are stored in, defaults to FLANK_ONNX_CACHE_DIR or ~/.cache/flank-onnx",
+		required=False,
+		validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+	)
+
+	RESULT_CACHE_SIZE = PropertyDescriptor(
+		name="Result Cache Size",
+		description="Number of results kept in memory, keyed by a hash of the image bytes and the model. 0 disables the cache",
+		required=True,
+		default_value="0",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	RESULT_CACHE_TTL = PropertyDescriptor(
+		name="Result Cache TTL (s)",
+		description="Seconds a cached result stays valid. 0 keeps results until they are evicted",
+		required=True,
+		default_value="3600",
+		validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+	)
+
+	RESULT_CACHE_PATH = PropertyDescriptor(
+		name="Result Cache Path",
+		description="Optional SQLite file for an on-disk cache tier that survives restarts, holding up to 10 times the in-memory entries",
+		required=False,
+		validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+	)
+
+	TIMING_ATTRIBUTES = PropertyDescriptor(
+		name="Emit Timing Attributes",
+		description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+		required=True,
+		default_value="false",
+		allowable_values=["true", "false"]
+	)
+
 	property_descriptors = [
-		HF_OPTION
+		HF_OPTION,
+		MAX_BATCH_SIZE,
+		MAX_BATCH_WAIT,
+		BACKEND,
+		ONNX_CACHE_DIR,
+		RESULT_CACHE_SIZE,
+		RESULT_CACHE_TTL,
+		RESULT_CACHE_PATH,
+		TIMING_ATTRIBUTES
 	]
 
 	def __init__(self, **kwargs):
 		super().__init__()
 		self.property_descriptors.append(self.HF_OPTION)
+		self.property_descriptors.append(self.MAX_BATCH_SIZE)
+		self.property_descriptors.append(self.MAX_BATCH_WAIT)
+		self.property_descriptors.append(self.BACKEND)
+		self.property_descriptors.append(self.ONNX_CACHE_DIR)
+		self.property_descriptors.append(self.RESULT_CACHE_SIZE)
+		self.property_descriptors.append(self.RESULT_CACHE_TTL)
+		self.property_descriptors.append(self.RESULT_CACHE_PATH)
+		self.property_descriptors.append(self.TIMING_ATTRIBUTES)
 
 	def getPropertyDescriptors(self):
 		return self.property_descriptors
 
-	def transform(self, context, flowfile):
-		from transformers import AutoImageProcessor, ResNetForImageClassification
+	def loadModel(self):
+		from model_registry import get_model
+
+		def loader():
+			from transformers import AutoImageProcessor, ResNetForImageClassification
+			image_processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
+			model = ResNetForImageClassification.from_pretrained(MODEL_NAME)
+			model.eval()
+			return (image_processor, model)
+
+		return get_model("image-classification-model:" + MODEL_NAME, loader)
+
+	def classifyBatch(self, images):
 		import torch
-		from datasets import load_dataset
+
+		image_processor, model = self.loadModel()
+		inputs = image_processor(images, return_tensors="pt")
+
+		with torch.no_grad():
+		    logits = model(**inputs).logits
+
+		return [str(model.config.id2label[label]) for label in logits.argmax(-1).tolist()]
+
+	def getBatcher(self, context):
+		from inference_batcher import get_batcher
+		import onnx_backend
+
+		backend = context.getProperty(self.BACKEND).getValue()
+		cache_dir = context.getProperty(self.ONNX_CACHE_DIR).getValue()
+
+		if backend == onnx_backend.PYTORCH:
+			key = "image-classification-model:" + MODEL_NAME
+			batch_fn = self.classifyBatch
+		else:
+			key = backend + ":" + onnx_backend.model_dir(cache_dir, MODEL_NAME)
+			def batch_fn(images):
+				return onnx_backend.get_classifier(MODEL_NAME, backend, cache_dir).predict(images)
+
+		return get_batcher(key, batch_fn,
+			context.getProperty(self.MAX_BATCH_SIZE).asInteger(),
+			context.getProperty(self.MAX_BATCH_WAIT).asInteger())
+
+	def getResultCache(self, context):
+		from result_cache import get_cache
+
+		size = context.getProperty(self.RESULT_CACHE_SIZE).asInteger()
+		if size is None or size <= 0:
+			return None
+
+		return get_cache("image-classification-model:" + MODEL_NAME, size,
+			context.getProperty(self.RESULT_CACHE_TTL).asInteger(),
+			context.getProperty(self.RESULT_CACHE_PATH).getValue())
+
+	def loadBackend(self, context):
+		import onnx_backend
+
+		backend = context.getProperty(self.BACKEND).getValue()
+		if backend == onnx_backend.PYTORCH:
+			return self.loadModel()
+
+		return onnx_backend.get_classifier(MODEL_NAME, backend, context.getProperty(self.ONNX_CACHE_DIR).getValue())
+
+	def onScheduled(self, context):
+		import model_registry
+		import onnx_backend
+		import stage_timer
+
+		with stage_timer.timed("RESNetImageClassification", "load"):
+			self.loadBackend(context)
+
+		if context.getProperty(self.BACKEND).getValue() != onnx_backend.PYTORCH:
+			parity = onnx_backend.parity_report(MODEL_NAME, context.getProperty(self.ONNX_CACHE_DIR).getValue())
+			self.logger.info("ONNX parity " + json.dumps(parity))
+		self.logger.info("Model registry " + json.dumps(model_registry.stats()))
+
+	def transform(self, context, flowfile):
 		import sys
 		import io
 		import requests
 		from PIL import Image
-		model_name = "microsoft/resnet-50"
+		from result_cache import content_key
+		import stage_timer
 
+		timer = stage_timer.start("RESNetImageClassification")
 		attributes = dict()
-		image_processor = AutoImageProcessor.from_pretrained(model_name)
-		model = ResNetForImageClassification.from_pretrained(model_name)
+		batcher = self.getBatcher(context)
 
 		hf_option = context.getProperty(self.HF_OPTION).evaluateAttributeExpressions(flowfile).getValue()
 
 		# Read the FlowFile content as "image".
-		imagebinary = flowfile.getContentsAsBytes() 
-		raw_image = Image.open(io.BytesIO(imagebinary))
+		with timer.stage("read"):
+			imagebinary = flowfile.getContentsAsBytes() 
 
-		try:
-			inputs = image_processor(raw_image, return_tensors="pt")
+		backend = context.getProperty(self.BACKEND).getValue()
+		cache = self.getResultCache(context)
+		cached = None
+		if cache is not None:
+			with timer.stage("cache"):
+				cache_key = content_key(imagebinary, backend + ":" + MODEL_NAME)
+				cached = cache.get(cache_key)
 
-			with torch.no_grad():
-			    logits = model(**inputs).logits
+		if cached is not None:
+			attributes.update(cached)
+		else:
+			with timer.stage("load"):
+				self.loadBackend(context)
+			with timer.stage("decode"):
+				raw_image = Image.open(io.BytesIO(imagebinary)).convert("RGB")
+			try:
+				with timer.stage("inference"):
+					attributes["classificationlabel"] = batcher.submit(raw_image)
+				if cache is not None:
+					cache.put(cache_key, dict(attributes))
+			except Exception as ex:
+				print(ex)
 
-			predicted_label = logits.argmax(-1).item()
-			attributes["classificationlabel"] = str(model.config.id2label[predicted_label])
-		except Exception as ex:
-			print(ex)
+		attributes["cachehit"] = str(cached is not None).lower()
 
 		attributes["hfoption"] = str(hf_option)
-		attributes["modelused"] = str(model_name)
+		attributes["modelused"] = MODEL_NAME
+		attributes["backend"] = str(backend)
+		attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
 
 		return FlowFileTransformResult(relationship = "success", contents=flowfile, attributes=attributes)
@@ -19,36 +19,244 @@ from nifiapi.flowfiletransform import FlowFileTransform, FlowFileTransformResult
 from nifiapi.properties import PropertyDescriptor, StandardValidators, ExpressionLanguageScope
 import datetime
 
+TEXT = "text"
+JSONL = "jsonl"
+VTT = "vtt"
+TRANSLATION_CHUNK = 512
+
+### Streams the cues of a WebVTT file (vtt_stream.py) and writes their text, one cue per line,
+### one JSON Lines record per cue with start and end seconds, or WebVTT with the cue timings.
+### With a MarianMT style model (https://huggingface.co/Helsinki-NLP) the cue texts are translated
+### TRANSLATION_CHUNK cues at a time: every distinct text once per file, looked up in the phrase
+### cache first, the rest in batches of Translation Batch Size per forward pass
 class TranslateWebVTT(FlowFileTransform):
     class Java:
         implements = ['org.apache.nifi.python.processor.FlowFileTransform']
 
     class ProcessorDetails:
         version = '2.0.0-M2'
-        dependencies = ['webvtt-py']
-        description = """Parse text from Web VTT """
-        tags = ["vtt", "webvtt", "python",  "parsing", "text", "text extract", "video"]
+        dependencies = []
+        description = """Parse text from Web VTT and optionally translate it with a local MarianMT model"""
+        tags = ["vtt", "webvtt", "python",  "parsing", "text", "text extract", "video", "translation", "marianmt", "subtitles"]
+
+    OUTPUT_FORMAT = PropertyDescriptor(
+        name="Output Format",
+        description="text writes the cue text, one cue per line. jsonl writes one JSON record per cue with id, start and end (seconds) and text. vtt writes WebVTT with the cue identifiers, timings and settings kept, the way to get translated subtitles",
+        required=True,
+        default_value=TEXT,
+        allowable_values=[TEXT, JSONL, VTT]
+    )
+
+    WINDOW_SECONDS = PropertyDescriptor(
+        name="Window (s)",
+        description="Merge the cues starting in each window of this many seconds into one line or record (with window, start, end, text and cues), sized for downstream NLP. 0 keeps every cue. Not used for vtt output",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NUMBER_VALIDATOR]
+    )
+
+    TRANSLATION_MODEL_DIRECTORY = PropertyDescriptor(
+        name="Translation Model Directory",
+        description="Local directory of a MarianMT style translation model (save_pretrained layout, e.g. Helsinki-NLP/opus-mt-en-de). When set, cue texts are translated. Empty only extracts the text",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TRANSLATION_BATCH_SIZE = PropertyDescriptor(
+        name="Translation Batch Size",
+        description="Distinct cue texts translated in one forward pass",
+        required=True,
+        default_value="32",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    NUM_BEAMS = PropertyDescriptor(
+        name="Beam Size",
+        description="Beams of the translation search, 1 is greedy decoding and the fastest",
+        required=True,
+        default_value="1",
+        validators=[StandardValidators.POSITIVE_INTEGER_VALIDATOR]
+    )
+
+    PHRASE_CACHE_SIZE = PropertyDescriptor(
+        name="Phrase Cache Size",
+        description="Number of translated cue texts kept in memory across files, keyed by the exact text and the model. 0 disables the cache",
+        required=True,
+        default_value="10000",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    PHRASE_CACHE_TTL = PropertyDescriptor(
+        name="Phrase Cache TTL (s)",
+        description="Seconds a translated cue text stays valid. 0 keeps it until it is evicted",
+        required=True,
+        default_value="0",
+        validators=[StandardValidators.NON_NEGATIVE_INTEGER_VALIDATOR]
+    )
+
+    PHRASE_CACHE_PATH = PropertyDescriptor(
+        name="Phrase Cache Path",
+        description="Optional SQLite file for an on-disk phrase cache tier that survives restarts, holding up to 10 times the in-memory entries",
+        required=False,
+        validators=[StandardValidators.NON_EMPTY_VALIDATOR]
+    )
+
+    TIMING_ATTRIBUTES = PropertyDescriptor(
+        name="Emit Timing Attributes",
+        description="Add timing.<stage>.ms attributes with the time spent in each stage of the transform",
+        required=True,
+        default_value="false",
+        allowable_values=["true", "false"]
+    )
+
+    property_descriptors = [
+        OUTPUT_FORMAT,
+        WINDOW_SECONDS,
+        TRANSLATION_MODEL_DIRECTORY,
+        TRANSLATION_BATCH_SIZE,
+        NUM_BEAMS,
+        PHRASE_CACHE_SIZE,
+        PHRASE_CACHE_TTL,
+        PHRASE_CACHE_PATH,
+        TIMING_ATTRIBUTES
+    ]
 
     def __init__(self, **kwargs):
         super().__init__()
+        self.property_descriptors.append(self.OUTPUT_FORMAT)
+        self.property_descriptors.append(self.WINDOW_SECONDS)
+        self.property_descriptors.append(self.TRANSLATION_MODEL_DIRECTORY)
+        self.property_descriptors.append(self.TRANSLATION_BATCH_SIZE)
+        self.property_descriptors.append(self.NUM_BEAMS)
+        self.property_descriptors.append(self.PHRASE_CACHE_SIZE)
+        self.property_descriptors.append(self.PHRASE_CACHE_TTL)
+        self.property_descriptors.append(self.PHRASE_CACHE_PATH)
+        self.property_descriptors.append(self.TIMING_ATTRIBUTES)
+
+    def getPropertyDescriptors(self):
+        return self.property_descriptors
+
+    def modelDirectory(self, context):
+        path = context.getProperty(self.TRANSLATION_MODEL_DIRECTORY).getValue()
+        return path.strip() if path is not None and path.strip() != "" else None
+
+    def loadTranslator(self, context):
+        from nlp_models import load_translator
+        return load_translator(self.modelDirectory(context))
+
+    def onScheduled(self, context):
+        import stage_timer
+
+        if self.modelDirectory(context) is not None:
+            with stage_timer.timed("TranslateWebVTT", "load"):
+                self.loadTranslator(context)
+
+    def getPhraseCache(self, context):
+        from result_cache import get_cache
+
+        size = context.getProperty(self.PHRASE_CACHE_SIZE).asInteger()
+        if size is None or size <= 0:
+            return None
+
+        return get_cache("TranslateWebVTT", size,
+                         context.getProperty(self.PHRASE_CACHE_TTL).asInteger(),
+                         context.getProperty(self.PHRASE_CACHE_PATH).getValue())
+
+    def translateCues(self, context, cues, timer, stats):
+        """Yield cues with their text translated, TRANSLATION_CHUNK cues at a time."""
+        import os
+        from itertools import islice
+        from nlp_models import translate
+        from result_cache import text_key
+
+        with timer.stage("load"):
+            translator = self.loadTranslator(context)
+        cache = self.getPhraseCache(context)
+        model_id = "TranslateWebVTT:" + os.path.abspath(self.modelDirectory(context)) + ":" + str(context.getProperty(self.NUM_BEAMS).asInteger())
+        # captions repeat ("[Music]", speaker tags), every distinct text is translated once per file
+        translated = dict()
+        while True:
+            with timer.stage("parse"):
+                chunk = list(islice(cues, TRANSLATION_CHUNK))
+            if len(chunk) == 0:
+                break
+            missing = list(dict.fromkeys(cue["text"] for cue in chunk if cue["text"] not in translated))
+            stats["distinctcues"] += len(missing)
+            if cache is not None and len(missing) > 0:
+                with timer.stage("cache"):
+                    for text in missing:
+                        cached = cache.get(text_key(text, model_id, normalize=False))
+                        if cached is not None:
+                            translated[text] = cached["text"]
+                remaining = [text for text in missing if text not in translated]
+                stats["phrasecachehits"] += len(missing) - len(remaining)
+                missing = remaining
+            if len(missing) > 0:
+                with timer.stage("inference"):
+                    # a cue split over several lines is one sentence
+                    outputs = translate(translator, [text.replace("\n", " ") for text in missing],
+                                        context.getProperty(self.TRANSLATION_BATCH_SIZE).asInteger(),
+                                        context.getProperty(self.NUM_BEAMS).asInteger())
+                stats["translatedcues"] += len(missing)
+                for text, output in zip(missing, outputs):
+                    translated[text] = output
+                    if cache is not None:
+                        cache.put(text_key(text, model_id, normalize=False), {"text": output})
+            for cue in chunk:
+                cue["text"] = translated[cue["text"]]
+                yield cue
 
     def transform(self, context, flowfile):
-        import webvtt
-        import requests
         import io
-        from io import StringIO
+        import stage_timer
+        from stage_timer import optional_stage
+        from vtt_stream import cue_block, iter_cues, windows
 
-        vttFile = flowfile.getContentsAsBytes().decode()
+        timer = stage_timer.start("TranslateWebVTT")
 
-        buffer = StringIO(str(vttFile))
+        with timer.stage("read"):
+            vttFile = flowfile.getContentsAsBytes()
+
+        output_format = context.getProperty(self.OUTPUT_FORMAT).getValue()
+        window_seconds = float(context.getProperty(self.WINDOW_SECONDS).getValue()) if output_format != VTT else 0
+        translating = self.modelDirectory(context) is not None
 
         outputBuffer = io.StringIO()
+        if output_format == VTT:
+            outputBuffer.write("WEBVTT\n\n")
+        cuecount = 0
+        linecount = 0
+        stats = {"distinctcues": 0, "phrasecachehits": 0, "translatedcues": 0}
 
-        for caption in webvtt.read_buffer(buffer):
-            # print(caption.start)
-            # print(caption.end)
-            outputBuffer.write(caption.text)
+        # cues are parsed and written one at a time, the transcript is never decoded as a whole,
+        # translation times its own parse, cache and inference stages
+        with optional_stage(None if translating else timer, "parse"):
+            cues = iter_cues(vttFile)
+            if translating:
+                cues = self.translateCues(context, cues, timer, stats)
+            captions = windows(cues, window_seconds) if window_seconds > 0 else cues
+            for caption in captions:
+                linecount += 1
+                cuecount += caption.get("cues", 1)
+                if output_format == VTT:
+                    outputBuffer.write(cue_block(caption))
+                    continue
+                if output_format == JSONL:
+                    record = {"id": caption["id"]} if "id" in caption else {"window": caption["window"], "cues": caption["cues"]}
+                    record.update({"start": round(caption["start"], 3), "end": round(caption["end"], 3), "text": caption["text"]})
+                    outputBuffer.write(json.dumps(record))
+                else:
+                    outputBuffer.write(caption["text"])
+                outputBuffer.write("\n")
 
         result = outputBuffer.getvalue()
 
-        return FlowFileTransformResult(relationship = "success", contents=result)
+        mime_types = {TEXT: "text/plain", JSONL: "application/x-ndjson", VTT: "text/vtt"}
+        attributes = {"cuecount": str(cuecount), "mime.type": mime_types[output_format]}
+        if window_seconds > 0:
+            attributes["windowcount"] = str(linecount)
+        if translating:
+            attributes.update({name: str(count) for name, count in stats.items()})
+        attributes.update(timer.finish(context.getProperty(self.TIMING_ATTRIBUTES).asBoolean()))
+
+        return FlowFileTransformResult(relationship = "success", contents=result, attributes=attributes)
@@ -0,0 +1,222 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import codecs
+import re
+import threading
+from collections import deque
+
+### Streaming address scanner
+### The content is decoded block by block and read line by line.  A cheap
+### prefilter (a street number followed by a street suffix, a PO
+### box, or a postal code for the countries that have a distinctive one)
+### marks candidate lines; only the window of lines around a candidate is
+### handed to pyap, once per country.  Windows that touch are merged, so an
+### address spread over several lines is parsed whole.  Lines without a digit
+### are never matched against the prefilter.
+
+COUNTRIES = ["US", "CA", "GB"]
+READ_BLOCK = 64 * 1024
+
+DIGIT = re.compile(r"\d")
+STREET_NUMBER = re.compile(r"\b\d[\dA-Za-z-]{0,7}\b")
+WORD = re.compile(r"[A-Za-z]+")
+SUFFIX_REACH = 60
+PO_BOX = re.compile(r"\bP\.?\s?O\.?\s*Box\s*\d", re.IGNORECASE)
+POSTAL_CODES = {
+    "CA": re.compile(r"\b[ABCEGHJ-NPRSTVXY]\d[ABCEGHJ-NPRSTV-Z]\s?\d[ABCEGHJ-NPRSTV-Z]\d\b"),
+    "GB": re.compile(r"\b[A-Z]{1,2}\d[A-Z\d]?\s*\d[ABD-HJLNP-UW-Z]{2}\b"),
+}
+
+# pyap parses a normalized copy of the text (see pyap.parser.AddressParser._normalize_string),
+# its match offsets are mapped back through the same substitutions
+NORMALIZATION = [
+    (re.compile(r"\r*(\n\r*)+", re.UNICODE), ", "),
+    (re.compile(r"\s*(\,\s*)+", re.UNICODE), ", "),
+    (re.compile(r"\s+", re.UNICODE), " "),
+    (re.compile("[\u2010\u2011\u2012\u2013\u2014\u2015]"), "-"),
+]
+
+_suffixes = None
+_parsers = threading.local()
+_lock = threading.Lock()
+
+
+def street_suffixes():
+    global _suffixes
+    with _lock:
+        if _suffixes is None:
+            from pyap.source_US.data import street_type_list
+            _suffixes = frozenset(suffix.lower() for suffix in street_type_list)
+        return _suffixes
+
+
+def get_parser(country):
+    """pyap parser for country, built once per thread (pyap.parse builds a new one per call,
+    and a parser keeps the text it is parsing on itself)."""
+    parsers = getattr(_parsers, "by_country", None)
+    if parsers is None:
+        parsers = dict()
+        _parsers.by_country = parsers
+    parser = parsers.get(country)
+    if parser is None:
+        from pyap.parser import AddressParser
+        parser = AddressParser(country=country)
+        parsers[country] = parser
+    return parser
+
+
+class Prefilter:
+    """Cheap test for lines that may hold an address: a street number followed within
+    SUFFIX_REACH characters by a street suffix word, a PO box, or a postal code."""
+
+    def __init__(self, countries):
+        self.suffixes = street_suffixes()
+        self.postal_codes = [POSTAL_CODES[country] for country in countries if country in POSTAL_CODES]
+
+    def search(self, line):
+        if DIGIT.search(line) is None:
+            return False
+        for number in STREET_NUMBER.finditer(line):
+            for word in WORD.findall(line, number.end(), number.end() + SUFFIX_REACH):
+                if word.lower() in self.suffixes:
+                    return True
+        if PO_BOX.search(line) is not None:
+            return True
+        return any(pattern.search(line) is not None for pattern in self.postal_codes)
+
+
+def parse_countries(value):
+    countries = [country.strip().upper() for country in (value or "US").split(",") if country.strip() != ""]
+    for country in countries:
+        if country not in COUNTRIES:
+            raise ValueError("Unsupported country " + country + ", expected " + ", ".join(COUNTRIES))
+    return countries
+
+
+def normalize(text):
+    """pyap's normalized text and the offset in text of each of its characters."""
+    positions = list(range(len(text)))
+    for pattern, replacement in NORMALIZATION:
+        pieces = []
+        mapped = []
+        last = 0
+        for match in pattern.finditer(text):
+            pieces.append(text[last:match.start()])
+            mapped.extend(positions[last:match.start()])
+            pieces.append(replacement)
+            mapped.extend([positions[match.start()] if match.start() < len(positions) else len(text)] * len(replacement))
+            last = match.end()
+        pieces.append(text[last:])
+        mapped.extend(positions[last:])
+        text = "".join(pieces)
+        positions = mapped
+    return text, positions
+
+
+def parse(text, country="US"):
+    """pyap addresses in text as dicts with address, start, end, country and parsed, offsets are into text."""
+    clean, positions = normalize(text)
+    found = []
+    for address in get_parser(country).parse(clean):
+        if str(address) == "":
+            continue
+        start = positions[address.match_start]
+        end = positions[address.match_end - 1] + 1
+        # a trailing separator of the normalized text maps back to a newline or comma
+        while end > start and text[end - 1] in " \t\r\n,":
+            end -= 1
+        found.append({"address": str(address), "start": start, "end": end, "country": country, "parsed": address.as_dict()})
+    return found
+
+
+def iter_lines(data, encoding="utf-8"):
+    """Yield (offset, line) for data (bytes or str), offsets are in characters and lines keep their ending."""
+    if isinstance(data, str):
+        offset = 0
+        for line in data.splitlines(True):
+            yield offset, line
+            offset += len(line)
+        return
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    view = memoryview(data)
+    offset = 0
+    pending = ""
+    for position in range(0, len(view), READ_BLOCK):
+        final = position + READ_BLOCK >= len(view)
+        pending += decoder.decode(view[position:position + READ_BLOCK], final=final)
+        lines = pending.splitlines(True)
+        # the last piece may continue in the next block, a trailing \r may be the first half of \r\n
+        pending = lines.pop() if len(lines) > 0 and (not lines[-1].endswith(("\n", "\r")) or (lines[-1].endswith("\r") and not final)) else ""
+        for line in lines:
+            yield offset, line
+            offset += len(line)
+    if pending != "":
+        yield offset, pending
+
+
+class AddressScanner:
+    def __init__(self, countries=None, window_lines=3):
+        self.countries = list(countries or ["US"])
+        self.window_lines = max(int(window_lines), 1)
+        self.prefilter = Prefilter(self.countries)
+        self.lines = 0
+        self.candidates = 0
+        self.windows = 0
+
+    def scan(self, data):
+        """Yield every address in data as a dict with address, start, end, country and parsed, in text order."""
+        context = self.window_lines - 1
+        before = deque(maxlen=context)
+        window = []
+        remaining = 0
+        for offset, line in iter_lines(data):
+            self.lines += 1
+            if self.prefilter.search(line):
+                self.candidates += 1
+                if len(window) == 0:
+                    window.extend(before)
+                    before.clear()
+                window.append((offset, line))
+                remaining = context
+            elif len(window) > 0 and remaining > 0:
+                window.append((offset, line))
+                remaining -= 1
+            else:
+                if len(window) > 0:
+                    for address in self._parse(window):
+                        yield address
+                    window = []
+                before.append((offset, line))
+        if len(window) > 0:
+            for address in self._parse(window):
+                yield address
+
+    def _parse(self, window):
+        self.windows += 1
+        base = window[0][0]
+        text = "".join(line for offset, line in window)
+        found = dict()
+        for country in self.countries:
+            for address in parse(text, country):
+                address["start"] += base
+                address["end"] += base
+                # the first country that finds a span keeps it
+                found.setdefault((address["start"], address["end"]), address)
+        return [found[span] for span in sorted(found)]
+
+    def stats(self):
+        return {"linecount": str(self.lines), "candidatelines": str(self.candidates), "candidatewindows": str(self.windows)}
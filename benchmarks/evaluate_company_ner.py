@@ -0,0 +1,142 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+### ORG accuracy and speed of the ExtractCompanyName model tiers
+### Runs every tier over an annotated corpus (JSON Lines, {"text", "orgs"})
+### and reports ORG precision, recall and F1 on the set of names per text,
+### plus load time, texts/s and the estimated model size.
+###
+### python benchmarks/evaluate_company_ner.py [--tiers large,large-int8,distilled]
+###     [--model-directory ./models/distilbert-ner] [--corpus corpus.jsonl] [--repeat 3] [--json results.json]
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_CORPUS = os.path.join(BENCHMARK_DIR, "fixtures", "company_ner.jsonl")
+
+
+def normalize(name):
+    name = re.sub(r"\s+", " ", str(name)).strip().lower()
+    return re.sub(r"^the ", "", name)
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as corpus:
+        return [json.loads(line) for line in corpus if line.strip() != ""]
+
+
+def score(corpus, predictions):
+    truepositives = 0
+    predicted = 0
+    expected = 0
+    for example, found in zip(corpus, predictions):
+        gold = set(normalize(name) for name in example["orgs"])
+        guessed = set(normalize(name) for name in found if normalize(name) != "")
+        truepositives += len(gold & guessed)
+        predicted += len(guessed)
+        expected += len(gold)
+    precision = truepositives / predicted if predicted else 0.0
+    recall = truepositives / expected if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def evaluate(tier, model_checkpoint, model_directory, corpus, repeat):
+    import model_registry
+    from nlp_models import load_token_classifier, tier_model
+
+    result = {"tier": tier, "status": "ok"}
+    try:
+        checkpoint, quantize = tier_model(tier, model_checkpoint, model_directory)
+        start = time.perf_counter()
+        classifier = load_token_classifier(checkpoint, quantize)
+        result["loadseconds"] = time.perf_counter() - start
+        result["model"] = checkpoint
+    except ImportError as ex:
+        return {"tier": tier, "status": "skipped", "reason": "missing dependency: " + str(ex)}
+    except Exception as ex:
+        return {"tier": tier, "status": "error", "reason": type(ex).__name__ + ": " + str(ex)}
+
+    texts = [example["text"] for example in corpus]
+    # warm up, the first call pays for lazy initialisation
+    classifier(texts[0])
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        predictions = [[item["word"] for item in classifier(text) if item["entity_group"] == "ORG"] for text in texts]
+    elapsed = time.perf_counter() - start
+
+    result.update(score(corpus, predictions))
+    result.update({
+        "texts": len(texts) * repeat,
+        "throughput": len(texts) * repeat / elapsed if elapsed > 0 else 0.0,
+        "charspersecond": sum(len(text) for text in texts) * repeat / elapsed if elapsed > 0 else 0.0,
+        "modelmb": model_registry.estimate_size(classifier) / (1024.0 * 1024.0),
+    })
+
+    # free the tier before loading the next one
+    model_registry.REGISTRY.clear()
+    return result
+
+
+def print_row(result):
+    if result["status"] != "ok":
+        print("%-12s %s (%s)" % (result["tier"], result["status"], result.get("reason")), flush=True)
+        return
+    print("%-12s precision %.3f  recall %.3f  f1 %.3f  %8.1f texts/s  load %6.1f s  model %7.1f MB" % (
+        result["tier"], result["precision"], result["recall"], result["f1"], result["throughput"],
+        result["loadseconds"], result["modelmb"]), flush=True)
+
+
+def main():
+    sys.path.insert(0, REPOSITORY_DIR)
+    from nlp_models import DISTILLED, MODEL_TIERS
+
+    parser = argparse.ArgumentParser(description="Compare the ExtractCompanyName model tiers on an annotated corpus")
+    parser.add_argument("--tiers", default=",".join(MODEL_TIERS), help="comma separated tiers to evaluate")
+    parser.add_argument("--checkpoint", default="xlm-roberta-large-finetuned-conll03-english", help="checkpoint of the large tiers")
+    parser.add_argument("--model-directory", help="local checkpoint directory for the distilled tier")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON Lines with text and orgs")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus for the throughput numbers")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    results = []
+    for tier in [tier.strip() for tier in args.tiers.split(",") if tier.strip() != ""]:
+        if tier == DISTILLED and not args.model_directory:
+            result = {"tier": tier, "status": "skipped", "reason": "no --model-directory"}
+            results.append(result)
+            print_row(result)
+            continue
+        result = evaluate(tier, args.checkpoint, args.model_directory, corpus, max(args.repeat, 1))
+        results.append(result)
+        print_row(result)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import re
+
+### Fake NiFi process context, property values and FlowFiles
+### Properties are given by display name, unset properties fall back to the
+### descriptor default.  Expression language supports plain ${attribute}.
+
+EXPRESSION = re.compile(r"\$\{([^}:]+)\}")
+
+
+class FakePropertyValue:
+    def __init__(self, value):
+        self.value = value
+
+    def getValue(self):
+        return self.value
+
+    def isSet(self):
+        return self.value is not None
+
+    def asInteger(self):
+        return None if self.value is None else int(self.value)
+
+    def asFloat(self):
+        return None if self.value is None else float(self.value)
+
+    def asBoolean(self):
+        return None if self.value is None else str(self.value).lower() == "true"
+
+    def evaluateAttributeExpressions(self, flowfile=None, attributes=None):
+        if self.value is None:
+            return self
+        values = dict()
+        if flowfile is not None:
+            values.update(flowfile.getAttributes())
+        if attributes:
+            values.update(attributes)
+        return FakePropertyValue(EXPRESSION.sub(lambda match: str(values.get(match.group(1), "")), str(self.value)))
+
+
+class FakeContext:
+    def __init__(self, properties=None):
+        self.properties = dict(properties or {})
+
+    def getProperty(self, descriptor):
+        name = descriptor if isinstance(descriptor, str) else descriptor.name
+        value = self.properties.get(name)
+        if value is None and not isinstance(descriptor, str):
+            value = descriptor.defaultValue
+        return FakePropertyValue(value)
+
+    def getProperties(self):
+        return dict(self.properties)
+
+    def getName(self):
+        return "benchmark"
+
+
+class FakeFlowFile:
+    def __init__(self, contents=b"", attributes=None):
+        self.contents = contents if isinstance(contents, bytes) else str(contents).encode("utf-8")
+        self.attributes = dict(attributes or {})
+
+    def getContentsAsBytes(self):
+        return self.contents
+
+    def getSize(self):
+        return len(self.contents)
+
+    def getAttribute(self, name):
+        return self.attributes.get(name)
+
+    def getAttributes(self):
+        return dict(self.attributes)
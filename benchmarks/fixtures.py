@@ -0,0 +1,238 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+
+from fake_nifi import FakeFlowFile
+
+### Fixture data and one benchmark scenario per processor
+### Images, texts and VTT files are generated so the repository carries no
+### binary fixtures.  HTTP processors talk to the localhost stub.
+
+TEXTS = [
+    "Cloudera and Snowflake announced a partnership on Tuesday to bring Apache NiFi flows to the Data Cloud, according to a statement from Cloudera's office at 5470 Great America Parkway, Santa Clara, CA 95054.",
+    "Tim Spann spoke at the Apache Software Foundation meetup in New York on March 12, 2024 about streaming with Apache Kafka and Apache Flink.",
+    "Microsoft reported revenue of $62 billion for the quarter, while Alphabet and Amazon both beat expectations on cloud growth.",
+    "The Empire State Building at 350 5th Ave, New York, NY 10118 was lit blue to celebrate the launch of the new Metropolitan Transportation Authority app.",
+    "Shares of NVIDIA rose 4% after the company said demand from Meta Platforms and Tesla for its H100 chips remained strong through the end of the year.",
+    "A 3.2 magnitude earthquake was recorded near San Francisco at 4:15 a.m., the United States Geological Survey said, with no reports of damage to the Golden Gate Bridge.",
+    "IBM and Red Hat will host the Open Source Summit in Vancouver, Canada from June 10 to June 12, with keynotes from the Linux Foundation.",
+    "Deliveries should be sent to 1600 Pennsylvania Avenue NW, Washington, DC 20500 or to 1 Infinite Loop, Cupertino, CA 95014 before Friday.",
+]
+
+ADDRESSES = [
+    "350 5th Ave, New York, NY 10118",
+    "1600 Pennsylvania Avenue NW, Washington, DC 20500",
+    "5470 Great America Parkway, Santa Clara, CA 95054",
+    "1 Infinite Loop, Cupertino, CA 95014",
+]
+
+WIKI_PAGES = ["Apache NiFi", "Apache Kafka", "Apache Flink"]
+
+# GTFS vehicles and gazetteer places are spread around Halifax
+CENTER = (44.6488, -63.5752)
+
+GTFS_HOST = "gtfs.example.org"
+GTFS_PATH = "/realtime/VehiclePositions.pb"
+
+
+def image_bytes(seed=0, width=640, height=480, image_format="JPEG"):
+    """A synthetic photo-like image: gradient background with random shapes."""
+    from PIL import Image, ImageDraw
+
+    generator = random.Random(seed)
+    image = Image.new("RGB", (width, height))
+    draw = ImageDraw.Draw(image)
+    for y in range(height):
+        shade = int(255 * y / height)
+        draw.line([(0, y), (width, y)], fill=(shade, (shade + seed * 40) % 256, 255 - shade))
+    for _ in range(12):
+        x0, y0 = generator.randrange(width), generator.randrange(height)
+        x1, y1 = x0 + generator.randrange(20, 200), y0 + generator.randrange(20, 200)
+        color = tuple(generator.randrange(256) for _ in range(3))
+        if generator.random() < 0.5:
+            draw.ellipse([x0, y0, x1, y1], fill=color)
+        else:
+            draw.rectangle([x0, y0, x1, y1], fill=color)
+    output = io.BytesIO()
+    image.save(output, format=image_format)
+    return output.getvalue()
+
+
+def vtt_document(cues=600, seed=0):
+    generator = random.Random(seed)
+    lines = ["WEBVTT", ""]
+    for index in range(cues):
+        start = index * 3.0
+        end = start + 2.5
+        lines.append(str(index + 1))
+        lines.append("%s --> %s" % (vtt_timestamp(start), vtt_timestamp(end)))
+        lines.append("[Music]" if index % 10 == 0 else generator.choice(TEXTS)[:80])
+        lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+def vtt_timestamp(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return "%02d:%02d:%06.3f" % (hours, minutes, seconds)
+
+
+def gtfs_feed_bytes(vehicles=250, seed=0):
+    """A VehiclePositions feed, or None when gtfs-realtime-bindings is not installed."""
+    try:
+        from google.transit import gtfs_realtime_pb2
+    except ImportError:
+        return None
+
+    generator = random.Random(seed)
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = "2.0"
+    feed.header.timestamp = 1700000000
+    for index in range(vehicles):
+        entity = feed.entity.add()
+        entity.id = "vehicle-%d" % index
+        entity.vehicle.trip.trip_id = "trip-%d" % (index % 40)
+        entity.vehicle.trip.route_id = str(index % 12)
+        entity.vehicle.vehicle.id = str(1000 + index)
+        entity.vehicle.position.latitude = CENTER[0] + generator.uniform(-0.1, 0.1)
+        entity.vehicle.position.longitude = CENTER[1] + generator.uniform(-0.1, 0.1)
+        entity.vehicle.timestamp = 1700000000 - generator.randrange(60)
+    return feed.SerializeToString()
+
+
+def gazetteer_file(places=20000, seed=0):
+    """A CSV gazetteer of random places, written once to the temporary directory."""
+    path = os.path.join(tempfile.gettempdir(), "benchmark-gazetteer-%d-%d.csv" % (places, seed))
+    if os.path.exists(path):
+        return path
+    generator = random.Random(seed)
+    partial = path + ".%d.tmp" % os.getpid()
+    with open(partial, "w", newline="", encoding="utf-8") as output:
+        writer = csv.writer(output)
+        writer.writerow(["osm_id", "class", "type", "name", "display_name", "lat", "lon"])
+        for index in range(places):
+            name = "Place %d" % index
+            writer.writerow([index + 1, "place", "locality", name, name + ", Nova Scotia, Canada",
+                             round(CENTER[0] + generator.uniform(-1, 1), 6), round(CENTER[1] + generator.uniform(-1, 1), 6)])
+    os.replace(partial, path)
+    return path
+
+
+class Scenario:
+    def __init__(self, name, module, properties=None, flowfile=None, class_name=None):
+        self.name = name
+        self.module = module
+        self.class_name = class_name or module
+        self.properties = properties or {}
+        self.flowfile = flowfile or (lambda index: FakeFlowFile(b""))
+
+
+def image_flowfile(index):
+    return FakeFlowFile(image_bytes(seed=index % 8), {"filename": "image%d.jpg" % index})
+
+
+def text_flowfile(index):
+    text = TEXTS[index % len(TEXTS)]
+    return FakeFlowFile(text, {"text": text})
+
+
+def document_flowfile(index, paragraphs=400):
+    """A long report with an address in roughly one paragraph out of fifty."""
+    generator = random.Random(index)
+    lines = []
+    for paragraph in range(paragraphs):
+        lines.append(generator.choice(TEXTS[1:3] + TEXTS[4:7]))
+        if paragraph % 50 == 0:
+            lines.append(generator.choice(ADDRESSES))
+    return FakeFlowFile("\n".join(lines).encode("utf-8"))
+
+
+def address_flowfile(index):
+    address = ADDRESSES[index % len(ADDRESSES)]
+    return FakeFlowFile(address, {"address": address})
+
+
+def point_flowfile(index):
+    generator = random.Random(index)
+    return FakeFlowFile(b"", {"latitude": str(CENTER[0] + generator.uniform(-0.5, 0.5)),
+                              "longitude": str(CENTER[1] + generator.uniform(-0.5, 0.5))})
+
+
+def point_records_flowfile(index, records=200):
+    """JSON Lines of vehicle positions."""
+    generator = random.Random(index)
+    lines = []
+    for number in range(records):
+        lines.append(json.dumps({"id": number, "latitude": CENTER[0] + generator.uniform(-0.5, 0.5),
+                                 "longitude": CENTER[1] + generator.uniform(-0.5, 0.5)}))
+    return FakeFlowFile("\n".join(lines).encode("utf-8"))
+
+
+def address_records_flowfile(index, records=200):
+    """JSON Lines of addresses, most of them repeated with different spelling."""
+    generator = random.Random(index)
+    lines = []
+    for number in range(records):
+        address = generator.choice(ADDRESSES)
+        lines.append(json.dumps({"id": number, "address": address.upper() if number % 2 else address}))
+    return FakeFlowFile("\n".join(lines).encode("utf-8"))
+
+
+FAKE_RECORD_PROPERTIES = {name: "true" for name in [
+    "Include UUID", "Include CREATED_DT", "Include EMAIL", "Include IP V4", "Include USER_NAME",
+    "Include CLUSTER_NAME", "Include CITY", "Include COUNTRY", "Include POSTCODE", "Include STREET_ADDRESS",
+    "Include LICENSE_PLATE", "Include EAN13", "Include CATCH_PHRASE", "Include COMMENT", "Include COMPANY",
+    "Include LATITUDE", "Include LONGITUDE", "Include JOB", "Include MD5", "Include PASSWORD",
+    "Include FIRST_NAME", "Include LAST_NAME", "Include PHONE_NUMBER", "Include USER_AGENT"]}
+
+GTFS_URL = "https://" + GTFS_HOST + GTFS_PATH
+
+SCENARIOS = [
+    # the stub stands in for Nominatim, so the public 1 request per second limit is lifted
+    Scenario("AddressToLatLong", "AddressToLatLong", {"Parse Text": "${address}", "Requests Per Second": "0"}, address_flowfile),
+    Scenario("AddressToLatLongBulk", "AddressToLatLong", {"Input Source": "records", "Requests Per Second": "0", "Geocode Cache Size": "0"},
+             address_records_flowfile),
+    Scenario("AnalyzeImage", "AnalyzeImage", {}, image_flowfile),
+    Scenario("CaptionImage", "CaptionImage", {}, image_flowfile),
+    Scenario("ExtractCompanyName", "ExtractCompanyName", {"Parse Text": "${text}"}, text_flowfile),
+    Scenario("ExtractCompanyName2", "ExtractCompanyName2", {"Parse Text": "${text}"}, text_flowfile, class_name="ExtractCompanyName"),
+    Scenario("ExtractEntities", "ExtractEntities", {"Parse Text": "${text}"}, text_flowfile),
+    Scenario("FacialEmotionsImageDetection", "FacialEmotionsImageDetection", {}, image_flowfile),
+    Scenario("GetFakeRecord", "GetFakeRecord", FAKE_RECORD_PROPERTIES),
+    Scenario("GetGTFSCompoundFeed", "GetGTFSCompoundFeed", {"URL for GTFS Feed": GTFS_URL, "Type for GTFS Feed": "vehicle"}),
+    Scenario("GetGTFSFeed", "GetGTFSFeed", {"URL for GTFS Feed": GTFS_URL}),
+    Scenario("GetProcessSysMonitoring", "GetProcessSysMonitoring"),
+    Scenario("GetWikiDataBulk", "GetWikiData", {"Input Source": "bulk", "Page Cache Size": "0"},
+             lambda index: FakeFlowFile("\n".join(WIKI_PAGES * 50).encode("utf-8") + ("\nPage %d" % index).encode("utf-8"))),
+    Scenario("GetWikiData", "GetWikiData", {"Wiki Page": "${wikipage}"},
+             lambda index: FakeFlowFile(b"", {"wikipage": WIKI_PAGES[index % len(WIKI_PAGES)]})),
+    Scenario("LatLongToAddress", "LatLongToAddress", {"Gazetteer File": gazetteer_file()}, point_flowfile),
+    Scenario("LatLongToAddressBulk", "LatLongToAddress", {"Gazetteer File": gazetteer_file(), "Input Source": "records"},
+             point_records_flowfile),
+    Scenario("NSFWImageDetection", "NSFWImageDetection", {}, image_flowfile),
+    Scenario("ParseAddresses", "ParseAddresses", {"Parse Text": "${text}"}, text_flowfile),
+    Scenario("ParseAddressesStream", "ParseAddresses", {"Input Source": "stream"}, document_flowfile),
+    Scenario("RESNetImageClassification", "RESNetImageClassification", {}, image_flowfile),
+    Scenario("TranslateWebVTT", "TranslateWebVTT", {}, lambda index: FakeFlowFile(vtt_document(seed=index % 4))),
+]
+
+SCENARIOS_BY_NAME = {scenario.name: scenario for scenario in SCENARIOS}
@@ -0,0 +1,144 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import threading
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+### Localhost stand-in for the remote HTTP services the processors call
+### Recorded responses live in fixtures/http/<host>.json as a list of
+### {"path": ..., "content_type": ..., "body": ...} routes, matched by the
+### longest path prefix.  redirect_http() rewrites every outgoing requests,
+### urllib and httpx call to http://127.0.0.1:<port>/<original host><path>.
+
+HTTP_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "http")
+LOCALHOSTS = ("127.0.0.1", "localhost")
+
+
+class HttpStub:
+    def __init__(self, directory=HTTP_FIXTURES):
+        self.routes = dict()
+        self.requests = 0
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name)) as fixture:
+                        for route in json.load(fixture):
+                            body = route["body"]
+                            if not isinstance(body, str):
+                                body = json.dumps(body)
+                            self.add(name[:-len(".json")], route["path"], body.encode("utf-8"), route.get("content_type", "application/json"))
+        self.server = None
+
+    def add(self, host, path, body, content_type="application/octet-stream"):
+        self.routes[(host, path)] = (content_type, body)
+
+    def lookup(self, host, path):
+        best = None
+        for (route_host, route_path), response in self.routes.items():
+            if route_host == host and path.startswith(route_path):
+                if best is None or len(route_path) > len(best[0]):
+                    best = (route_path, response)
+        return None if best is None else best[1]
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in two writes, kept-alive clients would wait on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                stub.requests += 1
+                parsed = urllib.parse.urlsplit(self.path)
+                host, _, path = parsed.path.lstrip("/").partition("/")
+                response = stub.lookup(host, "/" + path)
+                if response is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                content_type, body = response
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = do_GET
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def rewrite_url(url, port):
+    parts = urllib.parse.urlsplit(url)
+    if parts.hostname in LOCALHOSTS or parts.hostname is None:
+        return url
+    return urllib.parse.urlunsplit(("http", "127.0.0.1:%d" % port, "/" + parts.hostname + parts.path, parts.query, ""))
+
+
+def redirect_http(port):
+    """Send every requests, urllib and httpx call in this process to the stub on port."""
+    original_open = urllib.request.OpenerDirector.open
+
+    def open(self, fullurl, data=None, *args, **kwargs):
+        if isinstance(fullurl, str):
+            fullurl = rewrite_url(fullurl, port)
+        else:
+            fullurl.full_url = rewrite_url(fullurl.full_url, port)
+        return original_open(self, fullurl, data, *args, **kwargs)
+
+    urllib.request.OpenerDirector.open = open
+
+    try:
+        import requests
+
+        original_request = requests.Session.request
+
+        def request(self, method, url, *args, **kwargs):
+            return original_request(self, method, rewrite_url(url, port), *args, **kwargs)
+
+        requests.Session.request = request
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+
+        original_send = httpx.Client.send
+
+        def send(self, request, *args, **kwargs):
+            request.url = httpx.URL(rewrite_url(str(request.url), port))
+            return original_send(self, request, *args, **kwargs)
+
+        httpx.Client.send = send
+    except ImportError:
+        pass
@@ -0,0 +1,51 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+
+### Local stand-in for nifiapi.flowfiletransform
+### Enough of the API for the benchmarks to call transform() without NiFi.
+
+
+class FlowFileTransformResult:
+    def __init__(self, relationship, contents=None, attributes=None):
+        self.relationship = relationship
+        self.contents = contents
+        self.attributes = attributes
+
+    def getRelationship(self):
+        return self.relationship
+
+    def getContents(self):
+        if isinstance(self.contents, str):
+            return self.contents.encode("utf-8")
+        if self.contents is not None and hasattr(self.contents, "getContentsAsBytes"):
+            return self.contents.getContentsAsBytes()
+        return self.contents
+
+    def getAttributes(self):
+        return self.attributes
+
+
+class FlowFileTransform:
+    def __init__(self, **kwargs):
+        self.logger = logging.getLogger(type(self).__name__)
+
+    def onScheduled(self, context):
+        pass
+
+    def onStopped(self, context):
+        pass
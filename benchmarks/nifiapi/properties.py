@@ -0,0 +1,73 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from enum import Enum
+
+### Local stand-in for nifiapi.properties
+### PropertyDescriptor only records its arguments; validators are names.
+
+
+class ExpressionLanguageScope(Enum):
+    NONE = 1
+    ENVIRONMENT = 2
+    FLOWFILE_ATTRIBUTES = 3
+
+
+class StandardValidators:
+    ALWAYS_VALID = "ALWAYS_VALID"
+    NON_EMPTY_VALIDATOR = "NON_EMPTY_VALIDATOR"
+    INTEGER_VALIDATOR = "INTEGER_VALIDATOR"
+    POSITIVE_INTEGER_VALIDATOR = "POSITIVE_INTEGER_VALIDATOR"
+    POSITIVE_LONG_VALIDATOR = "POSITIVE_LONG_VALIDATOR"
+    NON_NEGATIVE_INTEGER_VALIDATOR = "NON_NEGATIVE_INTEGER_VALIDATOR"
+    NUMBER_VALIDATOR = "NUMBER_VALIDATOR"
+    LONG_VALIDATOR = "LONG_VALIDATOR"
+    PORT_VALIDATOR = "PORT_VALIDATOR"
+    NON_EMPTY_EL_VALIDATOR = "NON_EMPTY_EL_VALIDATOR"
+    BOOLEAN_VALIDATOR = "BOOLEAN_VALIDATOR"
+    URL_VALIDATOR = "URL_VALIDATOR"
+    URI_VALIDATOR = "URI_VALIDATOR"
+    REGULAR_EXPRESSION_VALIDATOR = "REGULAR_EXPRESSION_VALIDATOR"
+    TIME_PERIOD_VALIDATOR = "TIME_PERIOD_VALIDATOR"
+    DATA_SIZE_VALIDATOR = "DATA_SIZE_VALIDATOR"
+    FILE_EXISTS_VALIDATOR = "FILE_EXISTS_VALIDATOR"
+
+
+class PropertyDescriptor:
+    def __init__(self, name, description, required=False, sensitive=False,
+                 display_name=None, default_value=None, allowable_values=None,
+                 dependencies=None, expression_language_scope=ExpressionLanguageScope.NONE,
+                 dynamic=False, validators=None, resource_definition=None,
+                 controller_service_definition=None):
+        self.name = name
+        self.description = description
+        self.required = required
+        self.sensitive = sensitive
+        self.displayName = display_name
+        self.defaultValue = None if default_value is None else str(default_value)
+        self.allowableValues = allowable_values
+        self.dependencies = dependencies
+        self.expressionLanguageScope = expression_language_scope
+        self.dynamic = dynamic
+        self.validators = validators or []
+        self.resourceDefinition = resource_definition
+        self.controllerServiceDefinition = controller_service_definition
+
+
+class PropertyDependency:
+    def __init__(self, property_descriptor, *dependent_values):
+        self.property_descriptor = property_descriptor
+        self.dependent_values = dependent_values
@@ -0,0 +1,185 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+### Offline benchmarks for every processor
+### Each processor runs in its own Python process against the local nifiapi
+### stand-in, fixture data and the localhost HTTP stub, and reports cold
+### start, p50/p95/p99 latency, throughput and peak RSS.
+###
+### python benchmarks/run_benchmarks.py [--iterations 50] [--threads 4] [--only CaptionImage,ExtractEntities]
+###     [--set "CaptionImage:Max Batch Size=1"] [--json results.json]
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARK_DIR)
+STUB_PORT = "FLANK_BENCH_STUB_PORT"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def parse_overrides(values):
+    overrides = dict()
+    for value in values or []:
+        processor, _, assignment = value.partition(":")
+        name, _, setting = assignment.partition("=")
+        overrides.setdefault(processor, dict())[name] = setting
+    return overrides
+
+
+def run_worker(name, iterations, threads, overrides):
+    sys.path.insert(0, REPOSITORY_DIR)
+    sys.path.insert(0, BENCHMARK_DIR)
+
+    from fake_nifi import FakeContext
+    from fixtures import SCENARIOS_BY_NAME
+    from http_stub import redirect_http
+
+    if os.environ.get(STUB_PORT):
+        redirect_http(int(os.environ[STUB_PORT]))
+
+    scenario = SCENARIOS_BY_NAME[name]
+    properties = dict(scenario.properties)
+    properties.update(overrides)
+    context = FakeContext(properties)
+
+    result = {"processor": name, "status": "ok"}
+    try:
+        flowfiles = [scenario.flowfile(index) for index in range(iterations + 1)]
+        start = time.perf_counter()
+        module = importlib.import_module(scenario.module)
+        processor = getattr(module, scenario.class_name)()
+        processor.onScheduled(context)
+        processor.transform(context, flowfiles[0])
+        result["coldstartms"] = (time.perf_counter() - start) * 1000.0
+    except ImportError as ex:
+        return {"processor": name, "status": "skipped", "reason": "missing dependency: " + str(ex)}
+    except Exception as ex:
+        return {"processor": name, "status": "error", "reason": type(ex).__name__ + ": " + str(ex)}
+
+    def timed(flowfile):
+        begin = time.perf_counter()
+        processor.transform(context, flowfile)
+        return (time.perf_counter() - begin) * 1000.0
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = sorted(pool.map(timed, flowfiles[1:]))
+        elapsed = time.perf_counter() - start
+    except Exception as ex:
+        result.update({"status": "error", "reason": type(ex).__name__ + ": " + str(ex)})
+        return result
+
+    result.update({
+        "iterations": iterations,
+        "threads": threads,
+        "p50ms": percentile(latencies, 0.50),
+        "p95ms": percentile(latencies, 0.95),
+        "p99ms": percentile(latencies, 0.99),
+        "throughput": iterations / elapsed if elapsed > 0 else 0.0,
+        "peakrssmb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    })
+    return result
+
+
+def run_all(args):
+    sys.path.insert(0, BENCHMARK_DIR)
+    from fixtures import SCENARIOS, GTFS_HOST, GTFS_PATH, gtfs_feed_bytes
+    from http_stub import HttpStub
+
+    stub = HttpStub()
+    feed = gtfs_feed_bytes()
+    if feed is not None:
+        stub.add(GTFS_HOST, GTFS_PATH, feed)
+    port = stub.start()
+
+    names = [scenario.name for scenario in SCENARIOS]
+    if args.only:
+        names = [name for name in names if name in args.only.split(",")]
+
+    results = []
+    environment = dict(os.environ)
+    environment[STUB_PORT] = str(port)
+    try:
+        for name in names:
+            command = [sys.executable, os.path.abspath(__file__), "--worker", name,
+                       "--iterations", str(args.iterations), "--threads", str(args.threads)]
+            for override in args.set or []:
+                command += ["--set", override]
+            try:
+                completed = subprocess.run(command, env=environment, capture_output=True, text=True, timeout=args.timeout)
+                lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+                if lines:
+                    result = json.loads(lines[-1])
+                else:
+                    result = {"processor": name, "status": "error", "reason": completed.stderr.strip().splitlines()[-1:] or "no output"}
+            except subprocess.TimeoutExpired:
+                result = {"processor": name, "status": "error", "reason": "timed out after %ds" % args.timeout}
+            results.append(result)
+            print_row(result)
+    finally:
+        stub.stop()
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return results
+
+
+def print_row(result):
+    if result["status"] != "ok":
+        print("%-30s %s (%s)" % (result["processor"], result["status"], result.get("reason")), flush=True)
+        return
+    print("%-30s cold %9.1f ms  p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms  %8.1f /s  rss %7.1f MB" % (
+        result["processor"], result["coldstartms"], result["p50ms"], result["p95ms"], result["p99ms"],
+        result["throughput"], result["peakrssmb"]), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the FLaNK Python processors outside NiFi")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=1, help="concurrent transform() calls, like NiFi concurrent tasks")
+    parser.add_argument("--only", help="comma separated processor names")
+    parser.add_argument("--set", action="append", help="property override, Processor:Property Name=value")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--timeout", type=int, default=1800, help="seconds per processor")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        overrides = parse_overrides(args.set).get(args.worker, {})
+        print(json.dumps(run_worker(args.worker, args.iterations, args.threads, overrides)))
+        return
+
+    run_all(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+from collections import deque
+
+### Gazetteer of known names
+### An Aho-Corasick automaton built once from a name list, matching every
+### known name in one pass over the text whatever the size of the list.
+### Matching ignores case and treats any run of whitespace as one space;
+### matches must start and end on word boundaries, and overlapping matches
+### resolve to the leftmost, then longest, name.
+###
+### The list file has one name per line, or alias<TAB>canonical name to
+### report an alias under another name.  Blank lines and # comments are skipped.
+
+
+def _fold(character):
+    if character.isspace():
+        return " "
+    lower = character.lower()
+    # keep offsets aligned with the text, characters that lower to several characters stay as they are
+    return lower if len(lower) == 1 else character
+
+
+def _is_word(character):
+    return character.isalnum() or character == "_"
+
+
+class Gazetteer:
+    def __init__(self, names):
+        self._goto = [dict()]
+        self._fail = [0]
+        self._output = [None]
+        self.size = 0
+        for name in names:
+            if isinstance(name, tuple):
+                self.add(name[0], name[1])
+            else:
+                self.add(name)
+        self._build()
+
+    def add(self, alias, canonical=None):
+        folded = " ".join("".join(_fold(character) for character in alias).split())
+        if folded == "":
+            return
+        node = 0
+        for character in folded:
+            following = self._goto[node].get(character)
+            if following is None:
+                following = len(self._goto)
+                self._goto[node][character] = following
+                self._goto.append(dict())
+                self._fail.append(0)
+                self._output.append(None)
+            node = following
+        if self._output[node] is None:
+            self.size += 1
+        self._output[node] = (len(folded), canonical if canonical else alias.strip())
+
+    def _build(self):
+        # breadth first, each node fails to the longest proper suffix that is also in the trie
+        self._matches = [None] * len(self._goto)
+        queue = deque()
+        for following in self._goto[0].values():
+            self._fail[following] = 0
+            queue.append(following)
+        while len(queue) > 0:
+            node = queue.popleft()
+            for character, following in self._goto[node].items():
+                queue.append(following)
+                fallback = self._fail[node]
+                while fallback != 0 and character not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(character, 0)
+
+        # every node reports its own name and those of its suffixes, nodes without a name share their suffix list
+        self._matches[0] = ()
+        for node in self._breadth_first()[1:]:
+            inherited = self._matches[self._fail[node]]
+            if self._output[node] is None:
+                self._matches[node] = inherited
+            else:
+                self._matches[node] = (self._output[node],) + inherited
+
+    def _breadth_first(self):
+        order = [0]
+        index = 0
+        while index < len(order):
+            order.extend(self._goto[order[index]].values())
+            index += 1
+        return order
+
+    def find(self, text):
+        """Known names in text as dicts with text, name, start and end, in text order."""
+        if not text or self.size == 0:
+            return []
+
+        candidates = []
+        positions = []
+        node = 0
+        previous = None
+        for index, character in enumerate(text):
+            folded = _fold(character)
+            if folded == " " and previous == " ":
+                continue
+            previous = folded
+            positions.append(index)
+
+            while node != 0 and folded not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(folded, 0)
+
+            for length, name in self._matches[node]:
+                start = positions[len(positions) - length]
+                end = index + 1
+                if start > 0 and _is_word(text[start - 1]) and _is_word(text[start]):
+                    continue
+                if end < len(text) and _is_word(text[end]) and _is_word(text[end - 1]):
+                    continue
+                candidates.append((start, end, name))
+
+        found = []
+        taken = 0
+        for start, end, name in sorted(candidates, key=lambda candidate: (candidate[0], candidate[0] - candidate[1])):
+            if start < taken:
+                continue
+            found.append({"text": text[start:end], "name": name, "start": start, "end": end})
+            taken = end
+        return found
+
+
+def read_names(path):
+    names = []
+    with open(path, encoding="utf-8") as lines:
+        for line in lines:
+            line = line.rstrip("\n")
+            if line.strip() == "" or line.lstrip().startswith("#"):
+                continue
+            alias, _, canonical = line.partition("\t")
+            names.append((alias, canonical.strip() or None))
+    return names
+
+
+_gazetteers = dict()
+_gazetteers_lock = threading.Lock()
+
+
+def load_gazetteer(path):
+    """Gazetteer for a name list file, built once and rebuilt when the file changes."""
+    path = os.path.abspath(path)
+    modified = os.path.getmtime(path)
+    with _gazetteers_lock:
+        cached = _gazetteers.get(path)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        gazetteer = Gazetteer(read_names(path))
+        _gazetteers[path] = (modified, gazetteer)
+        return gazetteer
@@ -0,0 +1,51 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import unicodedata
+
+from result_cache import text_key
+
+### Geocode cache
+### Geocoder answers are kept in a result_cache (memory LRU plus an optional
+### SQLite file), keyed by the normalized address: case folded, punctuation
+### dropped, whitespace collapsed and the usual street, unit and direction
+### words folded to their postal abbreviation, so "123 Main Street, Apt. 4"
+### and "123  main st apt 4" share one entry.  Addresses the geocoder does
+### not know are cached too, with their own (shorter) TTL.
+
+ABBREVIATIONS = {
+    "alley": "aly", "avenue": "ave", "av": "ave", "boulevard": "blvd", "circle": "cir", "court": "ct",
+    "drive": "dr", "expressway": "expy", "freeway": "fwy", "highway": "hwy", "lane": "ln",
+    "parkway": "pkwy", "place": "pl", "plaza": "plz", "road": "rd", "square": "sq", "street": "st",
+    "terrace": "ter", "trail": "trl", "way": "way",
+    "apartment": "apt", "building": "bldg", "floor": "fl", "room": "rm", "suite": "ste", "unit": "unit",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+    "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+    "mount": "mt", "saint": "st", "fort": "ft",
+}
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_address(address):
+    text = unicodedata.normalize("NFKC", str(address)).casefold()
+    words = PUNCTUATION.sub(" ", text).split()
+    return " ".join(ABBREVIATIONS.get(word, word) for word in words)
+
+
+def address_key(address, geocoder_id):
+    return text_key(normalize_address(address), geocoder_id, normalize=False)
+
@@ -0,0 +1,156 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from geocode_cache import normalize_address
+
+### Shared Nominatim client
+### Every concurrent task of a processor (and every processor pointing at the
+### same server) shares one client per server URL and user agent:
+###   - a token bucket holds the requests per second the provider allows
+###     (public Nominatim: 1 per second, https://operations.osmfoundation.org/policies/nominatim/)
+###   - one requests.Session keeps the connections alive between requests
+###   - concurrent lookups of the same normalized address wait for the one
+###     request already in flight instead of sending their own (single-flight)
+### Throttled answers (429, 503) are retried after Retry-After.
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+RETRY_STATUS = (429, 503)
+
+
+def retry_after(value, default=1.0):
+    """Seconds to wait for a Retry-After header, delay seconds or an HTTP-date (RFC 9110), default when unreadable."""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it. A rate of 0 or less is unlimited."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # the token is taken now and the caller sleeps off the debt, so callers are served in order
+            self.tokens -= 1.0
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, function):
+        """function() once for every caller that asks for key while it runs, all get its result."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function())
+        except BaseException as ex:
+            future.set_exception(ex)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
+
+
+class GeocodingClient:
+    def __init__(self, url=NOMINATIM_URL, user_agent="nifi-AddressToLatLong-nominatim", rate=1.0, timeout=10, retries=2):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.bucket = TokenBucket(rate)
+        self.flights = SingleFlight()
+        self.requests = 0
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def search(self, address):
+        """Raw Nominatim answer (dict) of the first match for address, or None."""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self.requests += 1
+            response = self.session.get(self.url + "/search", params={"q": address, "format": "json", "limit": 1},
+                                        timeout=self.timeout)
+            if response.status_code in RETRY_STATUS and attempt < self.retries:
+                time.sleep(retry_after(response.headers.get("Retry-After")))
+                continue
+            response.raise_for_status()
+            found = response.json()
+            return found[0] if len(found) > 0 else None
+
+    def geocode(self, address):
+        """search(address), shared with concurrent callers asking for the same normalized address."""
+        return self.flights.do(normalize_address(address), lambda: self.search(str(address)))
+
+
+_clients = dict()
+_clients_lock = threading.Lock()
+
+
+def get_client(url=NOMINATIM_URL, user_agent="nifi-AddressToLatLong-nominatim", rate=1.0, timeout=10):
+    """The shared client for url and user_agent, rate and timeout follow the latest caller."""
+    key = (url.rstrip("/"), user_agent)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = GeocodingClient(url, user_agent, rate, timeout)
+            _clients[key] = client
+        client.bucket.rate = float(rate)
+        client.timeout = timeout
+        return client
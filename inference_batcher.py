@@ -0,0 +1,99 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+### Micro-batching for model inference
+### Concurrent transform() calls submit one input each.  A worker thread
+### gathers up to max_batch_size inputs, waiting at most max_wait_ms after
+### the first one arrives, runs a single batched forward pass and hands each
+### result back to the caller that submitted it.
+
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=8, max_wait_ms=10, name="batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait_ms = max(int(max_wait_ms), 0)
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item, timeout=None):
+        """Queue one input and block until its result is ready."""
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # past the deadline the inputs already queued still join the batch
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            inputs = [item for item, future in batch]
+            try:
+                results = self.batch_fn(inputs)
+                if len(results) != len(inputs):
+                    raise ValueError("batch function returned %d results for %d inputs" % (len(results), len(inputs)))
+            except Exception as ex:
+                for item, future in batch:
+                    future.set_exception(ex)
+                continue
+
+            self.batches += 1
+            self.items += len(inputs)
+            for (item, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        average = (self.items / self.batches) if self.batches else 0.0
+        return {"batches": self.batches, "items": self.items, "averagebatchsize": average}
+
+
+_batchers = dict()
+_lock = threading.Lock()
+
+
+def get_batcher(key, batch_fn, max_batch_size=8, max_wait_ms=10):
+    """Return the process-wide batcher for key, creating it on first use.
+
+    Every processor instance that runs the same model shares one batcher, so
+    their concurrent tasks end up in the same forward pass.  The most recent
+    batch size and wait settings win.
+    """
+    with _lock:
+        batcher = _batchers.get(key)
+        if batcher is None:
+            batcher = MicroBatcher(batch_fn, max_batch_size, max_wait_ms, name="batcher-" + str(key))
+            _batchers[key] = batcher
+        else:
+            batcher.max_batch_size = max(int(max_batch_size), 1)
+            batcher.max_wait_ms = max(int(max_wait_ms), 0)
+        return batcher
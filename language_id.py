@@ -0,0 +1,69 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+from model_registry import get_model
+
+### Language identification ahead of the NER models
+### A fastText character n-gram classifier (lid.176.ftz, under 1 MB, 176
+### languages) loaded once per process through the model registry.  Only the
+### first PREFIX_CHARS characters are classified, that is enough to tell the
+### language and keeps the cost in the tens of microseconds per text.
+### https://fasttext.cc/docs/en/language-identification.html
+
+UNDETERMINED = "und"
+PREFIX_CHARS = 1000
+LABEL_PREFIX = "__label__"
+
+
+def load_language_model(path):
+    path = os.path.abspath(path)
+
+    def loader():
+        import fasttext
+        return fasttext.load_model(path)
+
+    return get_model("fasttext-lid:" + path, loader, size=os.path.getsize(path))
+
+
+def identify(model, text, min_confidence=0.0):
+    """(language, confidence) of text, the language is UNDETERMINED below min_confidence."""
+    # fastText classifies one line at a time
+    text = " ".join(str(text)[:PREFIX_CHARS].split())
+    if text == "":
+        return UNDETERMINED, 0.0
+    # the native predict, the Python wrapper of fasttext 0.9.2 builds its scores with
+    # np.array(copy=False) which raises under numpy 2
+    predictions = model.f.predict(text + "\n", 1, 0.0, "strict")
+    if len(predictions) == 0:
+        return UNDETERMINED, 0.0
+    score, label = predictions[0]
+    language = label[len(LABEL_PREFIX):] if label.startswith(LABEL_PREFIX) else label
+    confidence = min(float(score), 1.0)
+    return (language if confidence >= min_confidence else UNDETERMINED), confidence
+
+
+def parse_languages(value, default=None):
+    """'en=en_core_web_sm, de=de_core_news_sm' as {"en": "en_core_web_sm", "de": "de_core_news_sm"}.
+
+    A language without a model name maps to default.
+    """
+    languages = dict()
+    for entry in (value or "").split(","):
+        language, _, model_name = entry.partition("=")
+        if language.strip() != "":
+            languages[language.strip().lower()] = model_name.strip() or default
+    return languages
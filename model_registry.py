@@ -0,0 +1,188 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+from collections import OrderedDict
+
+### Process-wide model registry
+### Every processor in the same Python worker shares one registry, so a
+### HuggingFace pipeline or spaCy model is loaded once and reused by all
+### concurrent tasks and processor instances.  Models are evicted least
+### recently used once the estimated memory budget is exceeded.
+###
+### FLANK_MODEL_CACHE_MB sets the budget (default 4096, 0 = unlimited)
+
+DEFAULT_BUDGET_MB = 4096
+
+
+def _tensors_size(values):
+    """Bytes of the tensors in values, shared (tied) tensors counted once.
+
+    state_dict() rather than parameters() and buffers(): dynamically quantized
+    Linear layers keep their int8 weights in _packed_params, which only the
+    state_dict holds (as a (weight, bias) tuple).
+    """
+    seen = set()
+    total = 0
+    stack = list(values)
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (tuple, list)):
+            stack.extend(value)
+            continue
+        if not hasattr(value, "numel") or not hasattr(value, "element_size"):
+            continue
+        try:
+            pointer = value.data_ptr()
+        except Exception:
+            pointer = id(value)
+        if pointer in seen:
+            continue
+        seen.add(pointer)
+        total += value.numel() * value.element_size()
+    return total
+
+
+def estimate_size(obj):
+    """Best effort size in bytes of a loaded model (torch weights, pipelines, tuples)."""
+    if obj is None:
+        return 0
+    # wrappers that know their own footprint, e.g. ONNX Runtime sessions
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_size(item) for item in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_size(item) for item in obj.values())
+
+    # transformers pipeline -> underlying model
+    model = getattr(obj, "model", None)
+    if model is not None and model is not obj and hasattr(model, "state_dict"):
+        return estimate_size(model)
+
+    if hasattr(obj, "state_dict"):
+        try:
+            return _tensors_size(obj.state_dict().values())
+        except Exception:
+            return 0
+
+    # spaCy Language: sum the serialized size of the vocab vectors and components
+    if hasattr(obj, "pipe_names") and hasattr(obj, "vocab"):
+        try:
+            return len(obj.to_bytes(exclude=["vocab"])) + obj.vocab.vectors.data.nbytes
+        except Exception:
+            return 0
+
+    return 0
+
+
+class ModelRegistry:
+    def __init__(self, budget_bytes=0):
+        self.budget_bytes = budget_bytes
+        self._lock = threading.Lock()
+        self._key_locks = dict()
+        self._models = OrderedDict()
+        self._sizes = dict()
+        self.loads = 0
+        self.evictions = 0
+        self.hits = 0
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = threading.Lock()
+                self._key_locks[key] = lock
+            return lock
+
+    def get(self, key, loader, size=None):
+        """Return the model stored under key, calling loader() once if it is not loaded yet."""
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key]
+
+        # Only one thread loads a given key, the others wait and then reuse it
+        with self._key_lock(key):
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self.hits += 1
+                    return self._models[key]
+
+            model = loader()
+            model_size = size if size is not None else estimate_size(model)
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = model_size
+                self.loads += 1
+                self._evict(keep=key)
+            return model
+
+    def _evict(self, keep=None):
+        # caller holds self._lock
+        if self.budget_bytes <= 0:
+            return
+        while sum(self._sizes.values()) > self.budget_bytes and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            del self._sizes[oldest]
+            self.evictions += 1
+
+    def evict(self, key):
+        with self._lock:
+            if key in self._models:
+                del self._models[key]
+                del self._sizes[key]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"modelsloaded": len(self._models),
+                    "modelbytes": sum(self._sizes.values()),
+                    "modelbudgetbytes": self.budget_bytes,
+                    "modelloads": self.loads,
+                    "modelhits": self.hits,
+                    "modelevictions": self.evictions}
+
+
+def _budget_from_env():
+    try:
+        megabytes = int(os.environ.get("FLANK_MODEL_CACHE_MB", DEFAULT_BUDGET_MB))
+    except ValueError:
+        megabytes = DEFAULT_BUDGET_MB
+    return max(megabytes, 0) * 1024 * 1024
+
+
+REGISTRY = ModelRegistry(_budget_from_env())
+
+
+def get_model(key, loader, size=None):
+    return REGISTRY.get(key, loader, size)
+
+
+def stats():
+    return REGISTRY.stats()
@@ -0,0 +1,154 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+### Near duplicate index for text
+### Texts are reduced to MinHash signatures over character shingles of the
+### normalized text (lower case, URLs without their query string, whitespace
+### collapsed).  LSH bands find candidate texts among the most recent
+### `window` entries, and a candidate is a near duplicate when the estimated
+### Jaccard similarity of the signatures reaches the threshold.  The oldest
+### entries are dropped first, so memory stays bounded.
+
+SHINGLE_SIZE = 5
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+URL_QUERY = re.compile(r"(https?://[^\s?#]+)[?#]\S*")
+
+
+def normalize(text):
+    text = URL_QUERY.sub(r"\1", str(text).lower())
+    return " ".join(text.split())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    text = normalize(text)
+    if len(text) <= size:
+        return set([text])
+    return set(text[index:index + size] for index in range(len(text) - size + 1))
+
+
+def _integrate(function, low, high, steps=100):
+    width = (high - low) / steps
+    return sum(function(low + (step + 0.5) * width) for step in range(steps)) * width
+
+
+def bands_for(threshold, num_perm, false_negative_weight=0.9):
+    """LSH bands and rows per band (bands * rows <= num_perm) with the least weighted false positive
+    plus false negative probability mass around threshold.
+
+    Missed near duplicates weigh most, a false candidate only costs one signature comparison.
+    """
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+            false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+            error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=0.8, num_perm=128, window=10000, seed=1):
+        import numpy as np
+
+        self.threshold = float(threshold)
+        self.num_perm = int(num_perm)
+        self.window = max(int(window), 1)
+        self.bands, self.rows = bands_for(self.threshold, self.num_perm)
+        generator = np.random.RandomState(seed)
+        self._a = generator.randint(1, MAX_HASH, size=self.num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, MAX_HASH, size=self.num_perm, dtype=np.uint64)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = [dict() for _ in range(self.bands)]
+        self._next_id = 0
+        self.duplicates = 0
+        self.unique = 0
+
+    def signature(self, text):
+        import numpy as np
+
+        hashes = np.fromiter((int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+                              for shingle in shingles(text)), dtype=np.uint64)
+        permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def query(self, signature):
+        """(payload, similarity) of the most similar recent text at or above the threshold, or None."""
+        with self._lock:
+            candidates = set()
+            for band, key in enumerate(self._band_keys(signature)):
+                candidates.update(self._buckets[band].get(key, ()))
+            best = None
+            for entry_id in candidates:
+                stored, payload = self._entries[entry_id]
+                similarity = float((stored == signature).mean())
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (payload, similarity)
+            if best is None:
+                self.unique += 1
+            else:
+                self.duplicates += 1
+            return best
+
+    def add(self, signature, payload):
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (signature, payload)
+            for band, key in enumerate(self._band_keys(signature)):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.window:
+                self._forget(*self._entries.popitem(last=False))
+
+    def _forget(self, entry_id, entry):
+        # caller holds self._lock
+        for band, key in enumerate(self._band_keys(entry[0])):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if len(bucket) == 0:
+                    del self._buckets[band][key]
+
+    def stats(self):
+        with self._lock:
+            return {"nearduplicates": self.duplicates, "nearunique": self.unique, "nearentries": len(self._entries)}
+
+
+_indexes = dict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(name, threshold=0.8, window=10000, num_perm=128):
+    """Process-wide index for name, recreated when the threshold or signature size changes."""
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.threshold != float(threshold) or index.num_perm != int(num_perm):
+            index = NearDuplicateIndex(threshold, num_perm, window)
+            _indexes[name] = index
+        else:
+            index.window = max(int(window), 1)
+        return index
@@ -0,0 +1,119 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+from model_registry import get_model
+
+### Shared loaders for the NLP models
+### Used by the processors and by the worker processes of text_chunker, so a
+### model is loaded the same way (and cached under the same registry key)
+### wherever it runs.
+
+### Token classification tiers, fastest last
+###   large       the checkpoint as published (fp32)
+###   large-int8  the same checkpoint with its Linear layers dynamically quantized to int8 (CPU)
+###   distilled   a smaller NER checkpoint from a local model directory (save_pretrained layout)
+LARGE = "large"
+LARGE_INT8 = "large-int8"
+DISTILLED = "distilled"
+MODEL_TIERS = [LARGE, LARGE_INT8, DISTILLED]
+
+
+def load_spacy(model_name):
+    def loader():
+        import spacy
+        return spacy.load(model_name)
+
+    return get_model("spacy:" + model_name, loader)
+
+
+def load_spacy_ner(model_name):
+    """spaCy pipeline reduced to ner and the tok2vec it listens to."""
+    def loader():
+        import spacy
+        nlp = spacy.load(model_name)
+        # keep ner and any shared tok2vec it listens to, drop tagger, parser, lemmatizer, ...
+        keep = set(["ner"])
+        for name, component in nlp.pipeline:
+            if "ner" in getattr(component, "listening_components", []):
+                keep.add(name)
+        for name in list(nlp.pipe_names):
+            if name not in keep:
+                nlp.remove_pipe(name)
+        return nlp
+
+    return get_model("spacy-ner:" + model_name, loader)
+
+
+def tier_model(tier, model_checkpoint, model_directory=None):
+    """(checkpoint, quantize) to load for a model tier."""
+    if tier == LARGE:
+        return (model_checkpoint, False)
+    if tier == LARGE_INT8:
+        return (model_checkpoint, True)
+    if tier == DISTILLED:
+        if not model_directory or not os.path.isdir(model_directory):
+            raise ValueError("The distilled tier needs a local model directory, got " + str(model_directory))
+        return (os.path.abspath(model_directory), False)
+    raise ValueError("Unknown model tier " + str(tier) + ", expected " + ", ".join(MODEL_TIERS))
+
+
+def load_token_classifier(model_checkpoint, quantize=False):
+    def loader():
+        from transformers import pipeline
+        classifier = pipeline("token-classification", model=model_checkpoint, aggregation_strategy="simple")
+        if quantize:
+            import torch
+            classifier.model = torch.quantization.quantize_dynamic(classifier.model, {torch.nn.Linear}, dtype=torch.qint8)
+        classifier.model.eval()
+        return classifier
+
+    prefix = "token-classification-int8:" if quantize else "token-classification:"
+    return get_model(prefix + model_checkpoint, loader)
+
+
+def load_translator(model_directory):
+    """(tokenizer, model) of a MarianMT style seq2seq translation model in a local directory."""
+    if not model_directory or not os.path.isdir(model_directory):
+        raise ValueError("Translation needs a local model directory (save_pretrained layout), got " + str(model_directory))
+    path = os.path.abspath(model_directory)
+
+    def loader():
+        from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        model = AutoModelForSeq2SeqLM.from_pretrained(path)
+        model.eval()
+        return (tokenizer, model)
+
+    return get_model("translation:" + path, loader)
+
+
+def translate(translator, texts, batch_size=32, num_beams=1, max_new_tokens=256):
+    """Translations of texts, batch_size texts per forward pass."""
+    import torch
+
+    tokenizer, model = translator
+    # texts of similar length share a batch, so there is little padding
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+    translations = [None] * len(texts)
+    for start in range(0, len(order), max(int(batch_size), 1)):
+        batch = order[start:start + max(int(batch_size), 1)]
+        inputs = tokenizer([texts[index] for index in batch], return_tensors="pt", padding=True, truncation=True)
+        with torch.inference_mode():
+            outputs = model.generate(**inputs, num_beams=num_beams, max_new_tokens=max_new_tokens)
+        for index, translation in zip(batch, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+            translations[index] = translation
+    return translations
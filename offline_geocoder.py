@@ -0,0 +1,186 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import json
+import os
+import threading
+
+from geocode_cache import normalize_address
+
+### Offline geocoder
+### Places come from a local gazetteer file (CSV with a header row, or
+### Parquet through pyarrow), for example an OSM or Nominatim export, with at
+### least display_name (or name), lat and lon columns.  Addresses are matched
+### against the address column when there is one, else display_name.  Any of osm_id,
+### place_id, class, type, place_rank, importance, addresstype, name,
+### boundingbox and licence are passed through, so a match looks like the raw
+### Nominatim answer.
+###
+### Lookups normalize the address the same way as the geocode cache.  An exact
+### normalized match is a dict lookup; otherwise the character trigrams of the
+### address are looked up in an inverted index and the place with the best
+### Dice similarity wins, ties going to the higher importance.  Trigrams found
+### in more than COMMON_FRACTION of the places (" st", "ave") do not pick
+### candidates while rarer ones are available, they only add to the scores
+### of the MAX_CANDIDATES places sharing the most rare trigrams.
+
+COMMON_FRACTION = 0.05
+MAX_CANDIDATES = 512
+OSM_LICENCE = "Data © OpenStreetMap contributors, ODbL 1.0. http://osm.org/copyright"
+PASSTHROUGH = ["osm_id", "place_id", "class", "type", "place_rank", "importance", "addresstype", "name", "licence"]
+
+
+def trigrams(text):
+    padded = "  " + text + " "
+    return set(padded[index:index + 3] for index in range(len(padded) - 2))
+
+
+def read_places(path):
+    """Rows of a CSV or Parquet gazetteer as dicts."""
+    if path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet
+
+        return pyarrow.parquet.read_table(path).to_pylist()
+    with open(path, encoding="utf-8", newline="") as rows:
+        return list(csv.DictReader(rows))
+
+
+def _bounding_box(row, latitude, longitude):
+    box = row.get("boundingbox")
+    if isinstance(box, str) and box.strip() != "":
+        try:
+            box = json.loads(box)
+        except ValueError:
+            box = [part.strip() for part in box.strip("[]()").split(",")]
+    if not box:
+        box = [latitude, latitude, longitude, longitude]
+    return [str(value) for value in box]
+
+
+def to_place(row):
+    """Gazetteer row as a raw Nominatim style answer."""
+    latitude = str(row["lat"])
+    longitude = str(row["lon"])
+    place = {"lat": latitude, "lon": longitude}
+    # every field Nominatim answers with is present, empty when the gazetteer does not have it
+    for field in PASSTHROUGH:
+        value = row.get(field)
+        place[field] = value if value is not None else ""
+    place["licence"] = place["licence"] or OSM_LICENCE
+    place["display_name"] = row.get("display_name") or row.get("name") or ""
+    place["name"] = place["name"] or place["display_name"].split(",")[0]
+    place["boundingbox"] = _bounding_box(row, latitude, longitude)
+    return place
+
+
+def _importance(place):
+    try:
+        return float(place.get("importance") or 0.0)
+    except ValueError:
+        return 0.0
+
+
+class OfflineGeocoder:
+    def __init__(self, rows):
+        import numpy as np
+
+        self.places = []
+        self.exact = dict()
+        self._sizes = []
+        postings = dict()
+        for row in rows:
+            if row.get("lat") in (None, "") or row.get("lon") in (None, ""):
+                continue
+            place = to_place(row)
+            key = normalize_address(row.get("address") or place["display_name"])
+            if key == "":
+                continue
+            index = len(self.places)
+            self.places.append(place)
+            # the most important place wins an exact name shared by several
+            if key not in self.exact or _importance(place) > _importance(self.places[self.exact[key]]):
+                self.exact[key] = index
+            grams = trigrams(key)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(index)
+
+        self._sizes = np.array(self._sizes, dtype=np.int32)
+        self._importance = np.array([_importance(place) for place in self.places], dtype=np.float64)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.common = max(int(len(self.places) * COMMON_FRACTION), 1)
+
+    def __len__(self):
+        return len(self.places)
+
+    def geocode(self, address, min_score=0.5):
+        """(place, score) of the best match for address, or (None, best score) below min_score."""
+        import numpy as np
+
+        key = normalize_address(address)
+        if key == "" or len(self.places) == 0:
+            return None, 0.0
+        index = self.exact.get(key)
+        if index is not None:
+            return self.places[index], 1.0
+
+        grams = trigrams(key)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if len(lists) == 0:
+            return None, 0.0
+        rare = [ids for ids in lists if len(ids) <= self.common]
+        common = [ids for ids in lists if len(ids) > self.common]
+        if len(rare) == 0:
+            rare, common = common, []
+        # only the places in the rare postings are counted, the cost does not grow with the gazetteer
+        candidates, counts = np.unique(np.concatenate(rare), return_counts=True)
+        if len(candidates) > MAX_CANDIDATES:
+            top = np.argpartition(-counts, MAX_CANDIDATES)[:MAX_CANDIDATES]
+            candidates = candidates[top]
+            counts = counts[top]
+        # the common trigrams still count towards the score of the candidates,
+        # postings are sorted so membership is a binary search
+        for ids in common:
+            positions = np.minimum(np.searchsorted(ids, candidates), len(ids) - 1)
+            counts += ids[positions] == candidates
+        scores = 2.0 * counts / (len(grams) + self._sizes[candidates])
+        best = np.lexsort((-self._importance[candidates], -scores))[0]
+        score = float(scores[best])
+        if score < min_score:
+            return None, score
+        return self.places[int(candidates[best])], score
+
+
+_indexes = dict()
+_indexes_lock = threading.Lock()
+
+
+def load_index(path, index_class):
+    """index_class(rows) over a gazetteer file, built once and rebuilt when the file changes."""
+    path = os.path.abspath(path)
+    modified = os.path.getmtime(path)
+    key = (index_class.__name__, path)
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == modified:
+            return cached[1]
+        index = index_class(read_places(path))
+        _indexes[key] = (modified, index)
+        return index
+
+
+def load_geocoder(path):
+    return load_index(path, OfflineGeocoder)
@@ -0,0 +1,300 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, the export is then only serialized within one process
+    fcntl = None
+
+### ONNX Runtime CPU backend for the image classifiers
+### A HuggingFace image classification model is exported to ONNX once and
+### stored in a local cache directory, optionally with an int8 dynamically
+### quantized copy.  Every export is checked against the PyTorch logits of
+### preprocessed sample images and the result is written next to the model as
+### parity.json; a model that fails the check is not served.
+###
+### NiFi runs a Python worker per processor and processors may share the cache
+### directory, so exports hold a file lock on the model directory and every
+### file is written to a .<pid>.tmp path and renamed into place: a model file
+### that exists is complete and has passed through the parity check.
+###
+### FLANK_ONNX_CACHE_DIR sets the default cache directory
+### FLANK_ONNX_PARITY_IMAGES a directory of images to check parity on, instead of synthetic ones
+
+PYTORCH = "pytorch"
+ONNXRUNTIME = "onnxruntime"
+ONNXRUNTIME_INT8 = "onnxruntime-int8"
+BACKENDS = [PYTORCH, ONNXRUNTIME, ONNXRUNTIME_INT8]
+
+DEFAULT_CACHE_DIR = os.environ.get("FLANK_ONNX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "flank-onnx"))
+PARITY_IMAGES_DIR = os.environ.get("FLANK_ONNX_PARITY_IMAGES")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+_export_lock = threading.Lock()
+
+
+def model_dir(cache_dir, model_name):
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+
+
+def input_size(image_processor):
+    """(height, width) of the pixel_values the image processor produces."""
+    config = image_processor.to_dict()
+    for name in ("crop_size", "size"):
+        size = config.get(name)
+        if isinstance(size, dict):
+            if "height" in size and "width" in size:
+                return (size["height"], size["width"])
+            if "shortest_edge" in size:
+                return (size["shortest_edge"], size["shortest_edge"])
+        elif isinstance(size, int):
+            return (size, size)
+    return (224, 224)
+
+
+def parity_check(torch_model, session, pixel_values, atol=1e-3):
+    """Compare ONNX Runtime logits with PyTorch logits for the same inputs."""
+    import numpy as np
+    import torch
+
+    with torch.no_grad():
+        expected = torch_model(pixel_values=pixel_values).logits.numpy()
+    actual = session.run(["logits"], {"pixel_values": pixel_values.numpy()})[0]
+
+    max_abs_diff = float(np.max(np.abs(expected - actual)))
+    top1_agreement = float(np.mean(expected.argmax(-1) == actual.argmax(-1)))
+    return {"maxabsdiff": max_abs_diff,
+            "top1agreement": top1_agreement,
+            "samples": int(pixel_values.shape[0]),
+            "passed": bool(top1_agreement == 1.0 and max_abs_diff <= atol)}
+
+
+def sample_images(count=4, seed=0):
+    """RGB images to check parity on: the files of FLANK_ONNX_PARITY_IMAGES when set,
+    otherwise synthetic photo-like images (gradient background with random shapes)."""
+    import random
+    from PIL import Image, ImageDraw
+
+    if PARITY_IMAGES_DIR:
+        names = sorted(name for name in os.listdir(PARITY_IMAGES_DIR) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if len(names) > 0:
+            return [Image.open(os.path.join(PARITY_IMAGES_DIR, name)).convert("RGB") for name in names[:count]]
+
+    generator = random.Random(seed)
+    images = []
+    for index in range(count):
+        image = Image.new("RGB", (320, 240))
+        draw = ImageDraw.Draw(image)
+        for y in range(240):
+            shade = int(255 * y / 240)
+            draw.line([(0, y), (320, y)], fill=(shade, (shade + index * 40) % 256, 255 - shade))
+        for _ in range(12):
+            x0, y0 = generator.randrange(320), generator.randrange(240)
+            x1, y1 = x0 + generator.randrange(20, 160), y0 + generator.randrange(20, 160)
+            color = tuple(generator.randrange(256) for _ in range(3))
+            if generator.random() < 0.5:
+                draw.ellipse([x0, y0, x1, y1], fill=color)
+            else:
+                draw.rectangle([x0, y0, x1, y1], fill=color)
+        images.append(image)
+    return images
+
+
+def _partial(path):
+    return path + "." + str(os.getpid()) + ".tmp"
+
+
+@contextmanager
+def _export_file_lock(directory):
+    """Hold an exclusive lock on directory, across threads and (with fcntl) processes."""
+    with _export_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, ".export.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _write_report(directory, model_file, result):
+    report_path = os.path.join(directory, "parity.json")
+    report = dict()
+    if os.path.exists(report_path):
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+    report[model_file] = result
+    partial = _partial(report_path)
+    with open(partial, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    os.replace(partial, report_path)
+
+
+def export(model_name, torch_model, image_processor, cache_dir=None, quantize=False, parity_samples=4):
+    """Export torch_model to ONNX (and int8) once, returning the path of the model to load."""
+    import torch
+
+    directory = model_dir(cache_dir, model_name)
+    fp32_path = os.path.join(directory, "model.onnx")
+    int8_path = os.path.join(directory, "model.int8.onnx")
+    target = int8_path if quantize else fp32_path
+
+    with _export_file_lock(directory):
+        # another worker may have exported it while this one waited for the lock
+        if os.path.exists(target):
+            return target
+
+        pixel_values = image_processor(sample_images(parity_samples), return_tensors="pt")["pixel_values"]
+        torch_model.eval()
+
+        paths = [(fp32_path, 1e-3)] + ([(int8_path, 5e-2)] if quantize else [])
+        for path, atol in paths:
+            if os.path.exists(path):
+                continue
+            partial = _partial(path)
+            try:
+                if path == fp32_path:
+                    torch.onnx.export(torch_model, (pixel_values[:1],), partial,
+                                      input_names=["pixel_values"], output_names=["logits"],
+                                      dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+                                      opset_version=17)
+                else:
+                    from onnxruntime.quantization import quantize_dynamic, QuantType
+                    quantize_dynamic(fp32_path, partial, weight_type=QuantType.QInt8)
+                # the report is written before the model, a model file always has its parity result
+                _write_report(directory, os.path.basename(path),
+                              parity_check(torch_model, create_session(partial), pixel_values, atol=atol))
+                os.replace(partial, path)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+    return target
+
+
+def check_parity(model_name, path, cache_dir=None):
+    """Raise ValueError when the parity check of the exported model at path failed."""
+    result = parity_report(model_name, cache_dir).get(os.path.basename(path))
+    if result is not None and not result.get("passed", False):
+        raise ValueError("ONNX export " + path + " of " + model_name + " differs from PyTorch " + json.dumps(result)
+                         + ", use the pytorch backend or remove the file to export it again")
+
+
+def parity_report(model_name, cache_dir=None):
+    report_path = os.path.join(model_dir(cache_dir, model_name), "parity.json")
+    if not os.path.exists(report_path):
+        return dict()
+    with open(report_path) as report_file:
+        return json.load(report_file)
+
+
+def create_session(path):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return onnxruntime.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+class OnnxImageClassifier:
+    def __init__(self, path, image_processor, id2label):
+        self.session = create_session(path)
+        self.image_processor = image_processor
+        self.id2label = id2label
+        self.nbytes = os.path.getsize(path)
+
+    def logits(self, images):
+        pixel_values = self.image_processor(images, return_tensors="np")["pixel_values"]
+        return self.session.run(["logits"], {"pixel_values": pixel_values.astype("float32")})[0]
+
+    def classify(self, images, top_k=5):
+        """Same output shape as a transformers image-classification pipeline called on a list."""
+        import numpy as np
+
+        logits = self.logits(images)
+        exp = np.exp(logits - logits.max(-1, keepdims=True))
+        scores = exp / exp.sum(-1, keepdims=True)
+        results = []
+        for row in scores:
+            order = np.argsort(-row)[:top_k]
+            results.append([{"label": self.id2label[int(index)], "score": float(row[index])} for index in order])
+        return results
+
+    def predict(self, images):
+        return [self.id2label[int(index)] for index in self.logits(images).argmax(-1)]
+
+
+def get_classifier(model_name, backend, cache_dir=None):
+    """Shared OnnxImageClassifier for model_name, exporting it on first use.
+
+    The PyTorch model is only loaded when the ONNX file still has to be
+    exported and parity checked; afterwards only the config and image
+    processor are read.  A model that failed the parity check raises
+    ValueError, so onScheduled fails instead of serving it.
+    """
+    from model_registry import get_model
+
+    quantize = backend == ONNXRUNTIME_INT8
+
+    def loader():
+        from transformers import AutoConfig, AutoImageProcessor, AutoModelForImageClassification
+
+        image_processor = AutoImageProcessor.from_pretrained(model_name)
+        path = os.path.join(model_dir(cache_dir, model_name), "model.int8.onnx" if quantize else "model.onnx")
+        if not os.path.exists(path):
+            torch_model = AutoModelForImageClassification.from_pretrained(model_name)
+            path = export(model_name, torch_model, image_processor, cache_dir, quantize)
+            del torch_model
+        check_parity(model_name, path, cache_dir)
+        config = AutoConfig.from_pretrained(model_name)
+        return OnnxImageClassifier(path, image_processor, dict(config.id2label))
+
+    return get_model(backend + ":" + model_dir(cache_dir, model_name), loader)
+
+
+if __name__ == "__main__":
+    # python onnx_backend.py <model name> [--int8] [--cache-dir DIR] [image ...]
+    # Exports the model and checks ONNX Runtime against PyTorch, on the given images when there are any
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a HuggingFace image classifier to ONNX and check parity with PyTorch")
+    parser.add_argument("model")
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--cache-dir", default=None)
+    args = parser.parse_args()
+
+    from PIL import Image
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    image_processor = AutoImageProcessor.from_pretrained(args.model)
+    torch_model = AutoModelForImageClassification.from_pretrained(args.model)
+    torch_model.eval()
+    path = export(args.model, torch_model, image_processor, args.cache_dir, args.int8)
+    print(json.dumps(parity_report(args.model, args.cache_dir), indent=2))
+
+    if len(args.images) > 0:
+        images = [Image.open(image).convert("RGB") for image in args.images]
+        pixel_values = image_processor(images, return_tensors="pt")["pixel_values"]
+        print(json.dumps(parity_check(torch_model, create_session(path), pixel_values, atol=5e-2 if args.int8 else 1e-3), indent=2))
@@ -0,0 +1,107 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import io
+import json
+from itertools import islice
+
+from stage_timer import optional_stage
+
+### Record mode for the text processors
+### The FlowFile content is JSON Lines or CSV with one text per record.  The
+### records are read lazily, handed to the processor in batches and written
+### back with the extracted fields added, all into one output FlowFile.
+### In CSV output, list and dict fields are written as JSON strings.
+
+JSONL = "jsonl"
+CSV = "csv"
+RECORD_FORMATS = [JSONL, CSV]
+
+MIME_TYPES = {JSONL: "application/x-ndjson", CSV: "text/csv"}
+
+
+def iter_records(data, record_format=JSONL, encoding="utf-8"):
+    """Yield the records of data (bytes) as dicts, blank JSON Lines are skipped."""
+    text = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors="replace", newline="")
+    if record_format == CSV:
+        for record in csv.DictReader(text):
+            yield record
+        return
+    if record_format != JSONL:
+        raise ValueError("Unknown record format " + str(record_format) + ", expected " + ", ".join(RECORD_FORMATS))
+    for number, line in enumerate(text, 1):
+        if line.strip() == "":
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as ex:
+            raise ValueError("Record on line " + str(number) + " is not valid JSON: " + str(ex))
+        yield record if isinstance(record, dict) else {"value": record}
+
+
+class RecordWriter:
+    def __init__(self, record_format=JSONL):
+        self.record_format = record_format
+        self.output = io.StringIO()
+        self.count = 0
+        self._csv = None
+
+    def write(self, record):
+        self.count += 1
+        if self.record_format == JSONL:
+            self.output.write(json.dumps(record))
+            self.output.write("\n")
+            return
+        if self._csv is None:
+            # the header is taken from the first record
+            self._csv = csv.DictWriter(self.output, fieldnames=list(record), extrasaction="ignore", lineterminator="\n")
+            self._csv.writeheader()
+        self._csv.writerow({name: json.dumps(value) if isinstance(value, (list, dict)) else value
+                            for name, value in record.items()})
+
+    def getvalue(self):
+        return self.output.getvalue()
+
+
+def enrich(data, record_format, text_field, batch_size, function, timer=None):
+    """Add function(texts) -> [fields per text] to every record, returns (contents, record count).
+
+    Records without the text field are passed on with the fields of an empty text.
+    """
+    def add_fields(batch):
+        texts = [record.get(text_field) for record in batch]
+        for record, added in zip(batch, function(["" if text is None else str(text) for text in texts])):
+            record.update(added)
+
+    return enrich_records(data, record_format, batch_size, add_fields, timer)
+
+
+def enrich_records(data, record_format, batch_size, function, timer=None):
+    """Call function(records) on every batch of records, which updates them in place,
+    and write them back, returns (contents, record count)."""
+    writer = RecordWriter(record_format)
+    records = iter_records(data, record_format)
+    while True:
+        with optional_stage(timer, "parse"):
+            batch = list(islice(records, max(int(batch_size), 1)))
+        if len(batch) == 0:
+            break
+        with optional_stage(timer, "inference"):
+            function(batch)
+        with optional_stage(timer, "serialize"):
+            for record in batch:
+                writer.write(record)
+    return writer.getvalue(), writer.count
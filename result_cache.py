@@ -0,0 +1,198 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import sqlite3
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+### Result cache for model outputs
+### An in-memory LRU tier with an optional SQLite tier on local disk, both
+### with a TTL.  Values are JSON serializable attribute maps.  Caches are
+### shared per (name, path) across every processor instance in the worker.
+### Their counters are added to the stage_timer Prometheus export.
+
+NEVER = 1e18
+
+
+def content_key(data, model_id):
+    """Cache key for raw FlowFile content (e.g. image bytes) and the model that processed it."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(model_id).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def normalize_text(text):
+    """Unicode NFKC with runs of whitespace collapsed to one space and the ends stripped."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", str(text))).strip()
+
+
+def text_key(text, model_id, normalize=True):
+    """Cache key for input text and the processor/model that processed it.
+
+    Use normalize=False when the result holds character offsets into the text.
+    """
+    return content_key((normalize_text(text) if normalize else str(text)).encode("utf-8"), model_id)
+
+
+class ResultCache:
+    def __init__(self, max_entries=10000, ttl_seconds=3600, path=None, max_disk_entries=None):
+        self.max_entries = max(int(max_entries), 0)
+        self.ttl_seconds = float(ttl_seconds) if ttl_seconds else 0.0
+        self.max_disk_entries = max_disk_entries if max_disk_entries is not None else self.max_entries * 10
+        self.path = path
+        self.hits = 0
+        self.diskhits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._db = None
+        if path:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def _expiry(self, now, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else float(ttl_seconds)
+        return now + ttl if ttl > 0 else NEVER
+
+    def get(self, key):
+        """Cached value for key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.hits += 1
+                        self.diskhits += 1
+                        return value
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value, ttl_seconds=None):
+        now = time.time()
+        expires = self._expiry(now, ttl_seconds)
+        with self._lock:
+            self._remember(key, expires, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO results (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+                                 (key, json.dumps(value), expires, now))
+                self._trim_disk()
+
+    def _remember(self, key, expires, value):
+        # caller holds self._lock
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _trim_disk(self):
+        # caller holds self._lock
+        if self.max_disk_entries is None or self.max_disk_entries <= 0:
+            return
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)", (excess,))
+            self.evictions += excess
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"cachehits": self.hits,
+                    "cachediskhits": self.diskhits,
+                    "cachemisses": self.misses,
+                    "cacheevictions": self.evictions,
+                    "cacheentries": len(self._memory),
+                    "cachehitrate": (self.hits / lookups) if lookups else 0.0}
+
+
+_caches = dict()
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, max_entries=10000, ttl_seconds=3600, path=None, max_disk_entries=None):
+    """Process-wide cache for name (and disk path), created on first use.
+
+    The most recent size and TTL settings win.  The disk tier holds max_disk_entries,
+    10 times max_entries by default.
+    """
+    key = (name, os.path.abspath(path) if path else None)
+    import stage_timer
+    stage_timer.register_collector(prometheus_lines)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResultCache(max_entries, ttl_seconds, path, max_disk_entries)
+            _caches[key] = cache
+        else:
+            cache.max_entries = max(int(max_entries), 0)
+            cache.ttl_seconds = float(ttl_seconds) if ttl_seconds else 0.0
+            cache.max_disk_entries = max_disk_entries if max_disk_entries is not None else cache.max_entries * 10
+        return cache
+
+
+def prometheus_lines():
+    with _caches_lock:
+        caches = [(name, path, cache.stats()) for (name, path), cache in _caches.items()]
+    lines = []
+    for metric, field, kind in (("flank_result_cache_hits_total", "cachehits", "counter"),
+                                ("flank_result_cache_disk_hits_total", "cachediskhits", "counter"),
+                                ("flank_result_cache_misses_total", "cachemisses", "counter"),
+                                ("flank_result_cache_evictions_total", "cacheevictions", "counter"),
+                                ("flank_result_cache_entries", "cacheentries", "gauge")):
+        lines.append("# TYPE %s %s" % (metric, kind))
+        for name, path, stats in caches:
+            lines.append('%s{cache="%s",path="%s"} %d' % (metric, name, path or "", stats[field]))
+    lines.append("# TYPE flank_result_cache_hit_ratio gauge")
+    for name, path, stats in caches:
+        lines.append('flank_result_cache_hit_ratio{cache="%s",path="%s"} %.6f' % (name, path or "", stats["cachehitrate"]))
+    return lines if len(caches) > 0 else []
@@ -0,0 +1,172 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+from offline_geocoder import load_index, to_place
+
+### Reverse geocoder
+### The places of a gazetteer file (the same CSV or Parquet as the offline
+### geocoder) go into a KD-tree over their positions on the unit sphere, so
+### the straight line (chord) distance between two points orders them like
+### the great circle distance and there is no special case at the poles or
+### the antimeridian.  The tree is built once per file; a nearest place query
+### visits a few leaves of LEAF_SIZE places.
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 32
+SUMMARY_FIELDS = ["display_name", "name", "osm_id", "class", "type", "lat", "lon"]
+
+
+def coordinate(latitude, longitude):
+    """(latitude, longitude) as floats, or None when they are missing or out of range."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        return None
+    return latitude, longitude
+
+
+def unit_vector(latitude, longitude):
+    phi = math.radians(latitude)
+    lam = math.radians(longitude)
+    return (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * math.asin(min(chord / 2.0, 1.0))
+
+
+def km_to_chord(km):
+    return 2.0 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2.0)
+
+
+class ReverseGeocoder:
+    def __init__(self, rows):
+        import numpy as np
+
+        self.places = []
+        vectors = []
+        for row in rows:
+            position = coordinate(row.get("lat"), row.get("lon"))
+            if position is None:
+                continue
+            self.places.append(to_place(row))
+            vectors.append(unit_vector(*position))
+
+        points = np.array(vectors, dtype=np.float64).reshape(-1, 3)
+        order = np.arange(len(points))
+        # nodes are kept in plain lists, a query walks them in Python
+        self._dims = []
+        self._splits = []
+        self._children = []
+        self._ranges = []
+        stack = [(self._node(), 0, len(points))]
+        while stack:
+            node, low, high = stack.pop()
+            self._ranges[node] = (low, high)
+            if high - low <= LEAF_SIZE:
+                continue
+            block = points[order[low:high]]
+            dim = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            middle = (low + high) // 2
+            order[low:high] = order[low:high][np.argpartition(block[:, dim], middle - low)]
+            left = self._node()
+            right = self._node()
+            self._dims[node] = dim
+            self._splits[node] = float(points[order[middle], dim])
+            self._children[node] = (left, right)
+            stack.append((left, low, middle))
+            stack.append((right, middle, high))
+
+        # leaves are contiguous slices of the reordered points
+        self._points = points[order]
+        self._order = order
+
+    def _node(self):
+        self._dims.append(-1)
+        self._splits.append(0.0)
+        self._children.append(None)
+        self._ranges.append(None)
+        return len(self._dims) - 1
+
+    def __len__(self):
+        return len(self.places)
+
+    def nearest(self, latitude, longitude, max_km=None):
+        """(place, distance in km) of the place nearest to the point, or (None, None) when
+        there is none within max_km or the point is not a valid coordinate."""
+        import numpy as np
+
+        position = coordinate(latitude, longitude)
+        if position is None or len(self.places) == 0:
+            return None, None
+        query = unit_vector(*position)
+        target = np.array(query)
+        best = math.inf if not max_km else km_to_chord(max_km) ** 2
+        found = -1
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound >= best:
+                continue
+            children = self._children[node]
+            if children is None:
+                low, high = self._ranges[node]
+                distances = ((self._points[low:high] - target) ** 2).sum(axis=1)
+                index = int(np.argmin(distances))
+                if distances[index] < best:
+                    best = float(distances[index])
+                    found = low + index
+                continue
+            offset = query[self._dims[node]] - self._splits[node]
+            near, far = children if offset <= 0 else (children[1], children[0])
+            # the far side is at least the distance to the splitting plane away
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+        if found < 0:
+            return None, None
+        return self.places[int(self._order[found])], chord_to_km(math.sqrt(best))
+
+    def nearest_many(self, points, max_km=None):
+        return [self.nearest(latitude, longitude, max_km) for latitude, longitude in points]
+
+
+def summary(place, distance_km):
+    """The fields of place added to an enriched record, None when there is no place."""
+    if place is None:
+        return None
+    found = {field: place.get(field, "") for field in SUMMARY_FIELDS}
+    found["distance_km"] = round(distance_km, 3)
+    return found
+
+
+def positions(value, latitude_field, longitude_field):
+    """Every dict in value (a record or JSON document, searched depth first) holding both fields."""
+    if isinstance(value, dict):
+        if latitude_field in value and longitude_field in value:
+            yield value
+        for item in value.values():
+            yield from positions(item, latitude_field, longitude_field)
+    elif isinstance(value, list):
+        for item in value:
+            yield from positions(item, latitude_field, longitude_field)
+
+
+def load_reverse_geocoder(path):
+    return load_index(path, ReverseGeocoder)
@@ -0,0 +1,101 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+
+### spaCy annotations passed between the NLP processors
+### ExtractEntities can write the processed Doc as a spaCy DocBin, either as
+### the FlowFile content (mime.type application/x-spacy-docbin) or as a
+### sidecar file named after its hash whose path travels in the
+### spacy.docbin.path attribute, so it survives processors that replace the
+### content.  Downstream processors take the text, tokens and entities from
+### it instead of running a pipeline again.
+### https://spacy.io/api/docbin
+
+MIME_TYPE = "application/x-spacy-docbin"
+PATH_ATTRIBUTE = "spacy.docbin.path"
+MODEL_ATTRIBUTE = "spacy.model"
+
+
+def to_bytes(docs):
+    from spacy.tokens import DocBin
+
+    docbin = DocBin(store_user_data=False)
+    for doc in docs:
+        docbin.add(doc)
+    return docbin.to_bytes()
+
+
+def from_bytes(data):
+    from spacy.tokens import DocBin
+    from spacy.vocab import Vocab
+
+    # the DocBin carries its own strings, an empty vocab is enough to rebuild the Docs
+    return list(DocBin().from_bytes(data).get_docs(Vocab()))
+
+
+def write_sidecar(directory, data):
+    """Write data to directory under its hash and return the path, identical Docs share one file."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(os.path.abspath(directory), hashlib.sha256(data).hexdigest() + ".spacy")
+    if not os.path.exists(path):
+        partial = path + "." + str(os.getpid()) + ".tmp"
+        with open(partial, "wb") as output:
+            output.write(data)
+        os.replace(partial, path)
+    return path
+
+
+def sidecar_path(path, directory):
+    """path resolved (symbolic links and ..) when it is a file inside directory, otherwise None."""
+    if not path or not directory:
+        return None
+    path = os.path.realpath(path)
+    directory = os.path.realpath(directory)
+    if os.path.commonpath([path, directory]) != directory or not os.path.isfile(path):
+        return None
+    return path
+
+
+def read_annotations(flowfile, data=None, directory=None):
+    """Docs carried by flowfile as DocBin content or sidecar, or None.
+
+    data is the content when the caller has already read it.  A sidecar is only
+    read from directory (the Annotation Directory of ExtractEntities), the
+    spacy.docbin.path attribute can be set by any upstream processor.
+    """
+    if flowfile.getAttribute("mime.type") == MIME_TYPE:
+        return from_bytes(data if data is not None else flowfile.getContentsAsBytes())
+    path = sidecar_path(flowfile.getAttribute(PATH_ATTRIBUTE), directory)
+    if path is not None:
+        with open(path, "rb") as sidecar:
+            return from_bytes(sidecar.read())
+    return None
+
+
+def annotation_text(docs):
+    return "".join(doc.text for doc in docs)
+
+
+def annotation_entities(docs, labels=None):
+    """Entities of docs as dicts with text, label, start and end (offsets into annotation_text)."""
+    entities = []
+    offset = 0
+    for doc in docs:
+        entities.extend({"text": entity.text, "label": entity.label_, "start": offset + entity.start_char, "end": offset + entity.end_char}
+                        for entity in doc.ents if labels is None or entity.label_ in labels)
+        offset += len(doc.text)
+    return entities
@@ -0,0 +1,223 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+### Per-stage timing for the processors
+### A StageTimer times the named stages of one transform() call (load, read,
+### decode, inference, serialize, http, ...), can hand them back as
+### timing.<stage>.ms attributes and adds them to per-processor histograms.
+###
+### The histograms are exported in Prometheus text format:
+###   FLANK_METRICS_PORT      serve http://<host>:<port>/metrics from the Python worker
+###   FLANK_METRICS_HOST      address the endpoint binds to (default 127.0.0.1)
+###   FLANK_METRICS_FILE      write the same text to this file every FLANK_METRICS_INTERVAL seconds (default 15)
+### NiFi runs every Python processor in its own process: only the first one to
+### bind FLANK_METRICS_PORT serves it (the others log a warning and go on), and
+### each process writes its own file, FLANK_METRICS_FILE with its pid before the
+### extension (metrics.prom -> metrics.<pid>.prom).
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(BUCKETS_MS) and value > BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = dict()
+
+    def observe(self, processor, stage, milliseconds):
+        with self._lock:
+            histogram = self._histograms.get((processor, stage))
+            if histogram is None:
+                histogram = Histogram()
+                self._histograms[(processor, stage)] = histogram
+            histogram.observe(milliseconds)
+
+    def prometheus_text(self):
+        lines = ["# HELP flank_stage_duration_ms Time spent in a processor stage in milliseconds",
+                 "# TYPE flank_stage_duration_ms histogram"]
+        with self._lock:
+            for (processor, stage), histogram in sorted(self._histograms.items()):
+                labels = 'processor="%s",stage="%s"' % (processor, stage)
+                cumulative = 0
+                for bound, count in zip(BUCKETS_MS, histogram.counts):
+                    cumulative += count
+                    lines.append('flank_stage_duration_ms_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+                lines.append('flank_stage_duration_ms_bucket{%s,le="+Inf"} %d' % (labels, histogram.count))
+                lines.append("flank_stage_duration_ms_sum{%s} %.3f" % (labels, histogram.sum))
+                lines.append("flank_stage_duration_ms_count{%s} %d" % (labels, histogram.count))
+        for collector in list(_collectors):
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        temporary = path + ".tmp"
+        with open(temporary, "w") as output:
+            output.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+METRICS = Metrics()
+
+_collectors = []
+
+
+def register_collector(collector):
+    """Add collector() -> list of Prometheus text lines to every export, e.g. cache counters."""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+
+class StageTimer:
+    def __init__(self, processor):
+        self.processor = processor
+        self.stages = dict()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - begin) * 1000.0)
+
+    def add(self, name, milliseconds):
+        self.stages[name] = self.stages.get(name, 0.0) + milliseconds
+
+    def finish(self, emit_attributes=False):
+        """Record every stage plus the total; returns timing attributes when emit_attributes is set."""
+        self.add("total", (time.perf_counter() - self.started) * 1000.0)
+        for name, milliseconds in self.stages.items():
+            METRICS.observe(self.processor, name, milliseconds)
+        if not emit_attributes:
+            return dict()
+        return {"timing." + name + ".ms": "%.3f" % milliseconds for name, milliseconds in self.stages.items()}
+
+
+def start(processor):
+    _start_exporters()
+    return StageTimer(processor)
+
+
+def record(processor, stage, milliseconds):
+    _start_exporters()
+    METRICS.observe(processor, stage, milliseconds)
+
+
+def optional_stage(timer, name):
+    """timer.stage(name), or nothing when there is no timer (e.g. in worker threads)."""
+    return timer.stage(name) if timer is not None else nullcontext()
+
+
+@contextmanager
+def timed(processor, stage):
+    """Time a block outside of transform(), e.g. model loading in onScheduled."""
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(processor, stage, (time.perf_counter() - begin) * 1000.0)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _start_exporters():
+    global _exporters_started
+    if _exporters_started:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+        port = os.environ.get("FLANK_METRICS_PORT")
+        if port:
+            try:
+                serve(int(port), os.environ.get("FLANK_METRICS_HOST", "127.0.0.1"))
+            except OSError as ex:
+                # another processor process already serves the port
+                logger.warning("Metrics endpoint not started on port %s: %s", port, ex)
+
+        path = process_file(os.environ.get("FLANK_METRICS_FILE"))
+        if path:
+            interval = float(os.environ.get("FLANK_METRICS_INTERVAL", "15"))
+
+            def dump_forever():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        METRICS.dump(path)
+                    except OSError:
+                        pass
+
+            threading.Thread(target=dump_forever, name="flank-metrics-dump", daemon=True).start()
+
+
+def process_file(path):
+    """path with the pid of this process before its extension, None when path is empty."""
+    if not path:
+        return None
+    root, extension = os.path.splitext(path)
+    return root + "." + str(os.getpid()) + extension
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve the histograms at http://host:port/metrics, returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            found = self.path.startswith("/metrics")
+            body = METRICS.prometheus_text().encode("utf-8") if found else b""
+            self.send_response(200 if found else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="flank-metrics-http", daemon=True).start()
+    return server
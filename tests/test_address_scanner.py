@@ -0,0 +1,40 @@
+import importlib.util
+
+import pytest
+
+from address_scanner import AddressScanner, normalize, parse
+
+needs_pyap = pytest.mark.skipif(importlib.util.find_spec("pyap") is None, reason="pyap is not installed")
+
+
+def test_normalize_maps_every_character_back():
+    text = "5470 Great America Parkway,\n   Santa Clara–CA"
+    clean, positions = normalize(text)
+    assert clean == "5470 Great America Parkway, Santa Clara-CA"
+    assert len(positions) == len(clean)
+    for index, character in enumerate(clean):
+        if character not in " ,-":
+            assert text[positions[index]] == character
+
+
+@needs_pyap
+@pytest.mark.parametrize("text", [
+    "Office at 5470 Great America Parkway,\n   Santa Clara,  CA 95054 today",
+    "Office at 5470 Great America Parkway\r\nSanta Clara, CA 95054\r\n",
+])
+def test_parse_offsets_are_into_the_original_text(text):
+    found = parse(text)
+    assert [address["address"] for address in found] == ["5470 Great America Parkway, Santa Clara, CA 95054"]
+    span = text[found[0]["start"]:found[0]["end"]]
+    assert span.startswith("5470") and span.endswith("95054")
+
+
+@needs_pyap
+def test_scan_offsets_are_into_the_whole_document():
+    document = "intro\n" * 5 + "It is at 350 5th Ave,\n\nNew York, NY 10118\n" + "filler\n" * 10 + \
+        "Office at 5470 Great America Parkway\r\nSanta Clara, CA 95054\r\n"
+    scanner = AddressScanner(["US"], window_lines=3)
+    found = list(scanner.scan(document.encode("utf-8")))
+    assert [document[address["start"]:address["end"]] for address in found] == [
+        "350 5th Ave,\n\nNew York, NY 10118", "5470 Great America Parkway\r\nSanta Clara, CA 95054"]
+    assert scanner.stats()["candidatewindows"] == "2"
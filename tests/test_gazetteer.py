@@ -0,0 +1,30 @@
+from gazetteer import Gazetteer, read_names
+
+
+def spans(gazetteer, text):
+    return [(match["text"], match["name"], match["start"], match["end"]) for match in gazetteer.find(text)]
+
+
+def test_leftmost_longest():
+    gazetteer = Gazetteer(["Apache", "Apache NiFi", "NiFi Registry", "Registry"])
+    assert spans(gazetteer, "Apache NiFi Registry") == [("Apache NiFi", "Apache NiFi", 0, 11), ("Registry", "Registry", 12, 20)]
+
+
+def test_word_boundaries():
+    gazetteer = Gazetteer(["IBM", "Meta"])
+    assert spans(gazetteer, "IBMers and Metadata") == []
+    assert spans(gazetteer, "IBM, Meta_x and (Meta).") == [("IBM", "IBM", 0, 3), ("Meta", "Meta", 17, 21)]
+
+
+def test_case_and_whitespace_keep_offsets():
+    gazetteer = Gazetteer(["Red Hat"])
+    text = "Shares of RED\n  hat rose"
+    assert spans(gazetteer, text) == [("RED\n  hat", "Red Hat", 10, 19)]
+
+
+def test_aliases(tmp_path):
+    path = tmp_path / "names.txt"
+    path.write_text("# companies\nAlphabet\nGoogle\tAlphabet\n\n", encoding="utf-8")
+    gazetteer = Gazetteer(read_names(str(path)))
+    assert gazetteer.size == 2
+    assert [match["name"] for match in gazetteer.find("Google and Alphabet")] == ["Alphabet", "Alphabet"]
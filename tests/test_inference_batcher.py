@@ -0,0 +1,67 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from inference_batcher import MicroBatcher, get_batcher
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_queued_inputs_share_a_batch():
+    started = threading.Event()
+    release = threading.Event()
+    sizes = []
+
+    def batch_fn(inputs):
+        sizes.append(len(inputs))
+        started.set()
+        release.wait(5)
+        return [value * 10 for value in inputs]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=0)
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        first = pool.submit(batcher.submit, 0)
+        started.wait(5)
+        # the worker is busy with the first input, the others queue up behind it
+        rest = [pool.submit(batcher.submit, value) for value in range(1, 7)]
+        wait_for(lambda: batcher._queue.qsize() == 6)
+        release.set()
+        results = [first.result(5)] + [future.result(5) for future in rest]
+
+    assert results == [value * 10 for value in range(7)]
+    assert sizes == [1, 4, 2]
+    assert batcher.stats() == {"batches": 3, "items": 7, "averagebatchsize": 7 / 3}
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def batch_fn(inputs):
+        if "bad" in inputs:
+            raise RuntimeError("model failed")
+        return [value.upper() for value in inputs]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="model failed"):
+        batcher.submit("bad", timeout=5)
+    # the worker keeps running after a failed batch
+    assert batcher.submit("good", timeout=5) == "GOOD"
+    assert batcher.stats()["batches"] == 1
+
+
+def test_wrong_number_of_results_fails_the_batch():
+    batcher = MicroBatcher(lambda inputs: [], max_batch_size=8, max_wait_ms=0)
+    with pytest.raises(ValueError, match="0 results for 1 inputs"):
+        batcher.submit("x", timeout=5)
+
+
+def test_get_batcher_is_shared_and_takes_the_latest_settings():
+    batcher = get_batcher("test-shared", lambda inputs: inputs, 2, 5)
+    assert get_batcher("test-shared", lambda inputs: [], 16, 0) is batcher
+    assert (batcher.max_batch_size, batcher.max_wait_ms) == (16, 0)
+    assert batcher.submit("x", timeout=5) == "x"
@@ -0,0 +1,32 @@
+from address_scanner import READ_BLOCK, iter_lines
+from vtt_stream import iter_cues
+
+
+def crlf_at_boundary(lines, line_index):
+    """CRLF text of lines padded so the \\r of lines[line_index] is the last byte of the first read block."""
+    text = "\r\n".join(lines) + "\r\n"
+    before = sum(len(line) + 2 for line in lines[:line_index]) + len(lines[line_index])
+    padding = READ_BLOCK - 1 - before + len("PADDING")
+    assert padding > 0
+    return text.replace("PADDING", "x" * padding, 1)
+
+
+def test_iter_lines_keeps_crlf_across_blocks():
+    text = crlf_at_boundary(["PADDING", "first", "second", "third"], 1)
+    assert text.encode("utf-8")[READ_BLOCK - 1:READ_BLOCK + 1] == b"\r\n"
+    from_bytes = list(iter_lines(text.encode("utf-8")))
+    assert from_bytes == list(iter_lines(text))
+    assert [line for offset, line in from_bytes][1:] == ["first\r\n", "second\r\n", "third\r\n"]
+
+
+def test_iter_lines_trailing_cr():
+    text = "x" * (READ_BLOCK - 1) + "\r"
+    assert list(iter_lines(text.encode("utf-8"))) == list(iter_lines(text))
+
+
+def test_iter_cues_crlf_timing_line_at_block_boundary():
+    text = crlf_at_boundary(["WEBVTT", "", "NOTE PADDING", "", "00:00:01.000 --> 00:00:02.000", "Hello world", ""], 4)
+    assert text.encode("utf-8")[READ_BLOCK - 1:READ_BLOCK + 1] == b"\r\n"
+    from_bytes = [(cue["start"], cue["text"]) for cue in iter_cues(text.encode("utf-8"))]
+    assert from_bytes == [(cue["start"], cue["text"]) for cue in iter_cues(text)]
+    assert from_bytes == [(1.0, "Hello world")]
@@ -0,0 +1,38 @@
+from near_duplicates import NearDuplicateIndex, bands_for, shingles
+
+TEXT = ("Cloudera and Snowflake announced a partnership on Tuesday to bring Apache NiFi flows to the Data Cloud, "
+        "according to a statement from the office in Santa Clara, California.")
+EDITED = TEXT.replace("Tuesday", "Monday")
+OTHER = "Tim Spann spoke at the Apache Software Foundation meetup in New York about streaming with Apache Kafka and Apache Flink."
+
+
+def test_bands_for_fits_the_signature():
+    for threshold in (0.5, 0.7, 0.8, 0.9):
+        bands, rows = bands_for(threshold, 128)
+        assert bands * rows <= 128
+        # the S-curve of the bands rises at or below the threshold, so near duplicates are rarely missed
+        assert (1.0 / bands) ** (1.0 / rows) <= threshold
+
+
+def test_shingles_normalize_urls_and_whitespace():
+    assert shingles("See  https://nifi.apache.org/docs?x=1") == shingles("see https://nifi.apache.org/docs")
+    assert shingles("abc") == {"abc"}
+
+
+def test_edit_is_a_near_duplicate():
+    index = NearDuplicateIndex(threshold=0.8)
+    index.add(index.signature(TEXT), "first")
+    payload, similarity = index.query(index.signature(EDITED))
+    assert payload == "first"
+    assert 0.8 <= similarity < 1.0
+    assert index.query(index.signature(OTHER)) is None
+    assert index.stats() == {"nearduplicates": 1, "nearunique": 1, "nearentries": 1}
+
+
+def test_window_forgets_oldest_entries():
+    index = NearDuplicateIndex(threshold=0.8, window=1)
+    index.add(index.signature(TEXT), "first")
+    index.add(index.signature(OTHER), "second")
+    assert index.query(index.signature(TEXT)) is None
+    assert index.query(index.signature(OTHER))[0] == "second"
+    assert sum(len(bucket) for bucket in index._buckets) == index.bands
@@ -0,0 +1,53 @@
+import random
+
+from geocode_cache import normalize_address
+from offline_geocoder import OfflineGeocoder, trigrams
+
+ROWS = [
+    {"display_name": "350 5th Ave, New York, NY 10118", "lat": "40.7484", "lon": "-73.9857", "importance": "0.9"},
+    {"display_name": "1600 Pennsylvania Avenue NW, Washington, DC 20500", "lat": "38.8977", "lon": "-77.0365", "importance": "0.8"},
+    {"display_name": "1 Infinite Loop, Cupertino, CA 95014", "lat": "37.3318", "lon": "-122.0312", "importance": "0.5"},
+    {"display_name": "Springfield", "lat": "39.7817", "lon": "-89.6501", "importance": "0.7", "osm_id": "1"},
+    {"display_name": "Springfield", "lat": "42.1015", "lon": "-72.5898", "importance": "0.4", "osm_id": "2"},
+    {"display_name": "No coordinates", "lat": "", "lon": ""},
+]
+
+
+def dice(address, place):
+    a = trigrams(normalize_address(address))
+    b = trigrams(normalize_address(place["display_name"]))
+    return 2.0 * len(a & b) / (len(a) + len(b))
+
+
+def test_exact_match_prefers_importance():
+    geocoder = OfflineGeocoder(ROWS)
+    assert len(geocoder) == 5
+    place, score = geocoder.geocode("  SPRINGFIELD ")
+    assert score == 1.0
+    assert place["osm_id"] == "1"
+
+
+def test_fuzzy_match_is_the_best_dice_score():
+    geocoder = OfflineGeocoder(ROWS)
+    place, score = geocoder.geocode("1600 Pensylvania Ave NW, Washington DC")
+    assert place["lat"] == "38.8977"
+    assert abs(score - max(dice("1600 Pensylvania Ave NW, Washington DC", row) for row in geocoder.places)) < 1e-9
+    assert geocoder.geocode("Rue de Rivoli, Paris")[0] is None
+
+
+def test_ranking_matches_brute_force():
+    generator = random.Random(3)
+    streets = ["Main St", "Oak Ave", "Maple Rd", "Pine Ln", "Cedar Blvd", "Elm St", "Lake Dr"]
+    cities = ["Halifax", "Dartmouth", "Bedford", "Truro", "Sydney"]
+    rows = [{"display_name": "%d %s, %s" % (number, generator.choice(streets), generator.choice(cities)),
+             "lat": str(number), "lon": "0", "importance": str(generator.random())} for number in range(1, 400)]
+    geocoder = OfflineGeocoder(rows)
+    for _ in range(50):
+        row = generator.choice(rows)
+        query = row["display_name"].replace("St", "Street").replace(",", "")
+        place, score = geocoder.geocode(query, min_score=0.0)
+        scores = [dice(query, candidate) for candidate in geocoder.places]
+        best = max(scores)
+        assert abs(score - best) < 1e-9
+        tied = [candidate for candidate, value in zip(geocoder.places, scores) if abs(value - best) < 1e-9]
+        assert float(place["importance"]) == max(float(candidate["importance"]) for candidate in tied)
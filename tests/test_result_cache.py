@@ -0,0 +1,79 @@
+import result_cache
+from result_cache import ResultCache, text_key
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def frozen(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    return clock
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    frozen(monkeypatch)
+    cache = ResultCache(max_entries=2, ttl_seconds=0)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.get("c") == {"v": 3}
+    assert cache.stats()["cacheevictions"] == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    clock = frozen(monkeypatch)
+    cache = ResultCache(max_entries=10, ttl_seconds=10)
+    cache.put("a", {"v": 1})
+    cache.put("forever", {"v": 2}, ttl_seconds=0)
+    clock.now += 9
+    assert cache.get("a") == {"v": 1}
+    clock.now += 2
+    assert cache.get("a") is None
+    assert cache.get("forever") == {"v": 2}
+
+
+def test_disk_tier_serves_entries_evicted_from_memory(monkeypatch, tmp_path):
+    frozen(monkeypatch)
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResultCache(max_entries=1, ttl_seconds=0, path=path)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["cachediskhits"] == 1
+
+    # a new cache on the same file, as after a restart
+    reopened = ResultCache(max_entries=1, ttl_seconds=0, path=path)
+    assert reopened.get("b") == {"v": 2}
+    assert reopened.stats()["cachediskhits"] == 1
+
+
+def test_disk_tier_ttl_and_trim(monkeypatch, tmp_path):
+    clock = frozen(monkeypatch)
+    cache = ResultCache(max_entries=0, ttl_seconds=10, path=str(tmp_path / "cache.sqlite"), max_disk_entries=2)
+    cache.put("a", {"v": 1})
+    clock.now += 1
+    cache.put("b", {"v": 2})
+    clock.now += 1
+    assert cache.get("a") == {"v": 1}
+    clock.now += 1
+    cache.put("c", {"v": 3})
+    # b was accessed least recently
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    clock.now += 10
+    assert cache.get("c") is None
+
+
+def test_text_key_normalization():
+    assert text_key("Apache  NiFi\n", "model") == text_key("Apache NiFi", "model")
+    assert text_key("Apache  NiFi", "model", normalize=False) != text_key("Apache NiFi", "model", normalize=False)
+    assert text_key("Apache NiFi", "model") != text_key("Apache NiFi", "other")
@@ -0,0 +1,51 @@
+import math
+import random
+
+from reverse_geocoder import EARTH_RADIUS_KM, ReverseGeocoder, positions
+
+
+def haversine_km(latitude, longitude, place):
+    phi1, phi2 = math.radians(latitude), math.radians(float(place["lat"]))
+    dphi = phi2 - phi1
+    dlam = math.radians(float(place["lon"]) - longitude)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def random_rows(count, generator):
+    return [{"osm_id": str(index), "lat": str(generator.uniform(-90, 90)), "lon": str(generator.uniform(-180, 180))}
+            for index in range(count)]
+
+
+def test_nearest_matches_brute_force():
+    generator = random.Random(7)
+    geocoder = ReverseGeocoder(random_rows(2000, generator))
+    queries = [(generator.uniform(-90, 90), generator.uniform(-180, 180)) for _ in range(200)]
+    # the poles and both sides of the antimeridian
+    queries += [(90.0, 0.0), (-90.0, 45.0), (10.0, 179.999), (10.0, -179.999)]
+    for latitude, longitude in queries:
+        place, distance = geocoder.nearest(latitude, longitude)
+        expected = min(haversine_km(latitude, longitude, candidate) for candidate in geocoder.places)
+        assert abs(distance - expected) < 1e-6
+        assert abs(haversine_km(latitude, longitude, place) - expected) < 1e-6
+
+
+def test_nearest_across_the_antimeridian():
+    geocoder = ReverseGeocoder([{"osm_id": "east", "lat": "0", "lon": "179.9"}, {"osm_id": "west", "lat": "0", "lon": "-170"}])
+    place, distance = geocoder.nearest(0, -179.9)
+    assert place["osm_id"] == "east"
+    assert abs(distance - haversine_km(0, -179.9, place)) < 1e-6
+
+
+def test_max_distance_and_invalid_points():
+    geocoder = ReverseGeocoder([{"osm_id": "1", "lat": "44.6488", "lon": "-63.5752"}, {"lat": "", "lon": "0"}])
+    assert len(geocoder) == 1
+    assert geocoder.nearest(44.7, -63.6, max_km=10)[0]["osm_id"] == "1"
+    assert geocoder.nearest(45.6, -63.6, max_km=10) == (None, None)
+    assert geocoder.nearest("north", -63.6) == (None, None)
+    assert geocoder.nearest(91, 0) == (None, None)
+
+
+def test_positions_finds_nested_points():
+    document = {"entity": [{"vehicle": {"position": {"latitude": 1, "longitude": 2}}}, {"id": "x"}]}
+    assert list(positions(document, "latitude", "longitude")) == [{"latitude": 1, "longitude": 2}]
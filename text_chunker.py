@@ -0,0 +1,200 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import codecs
+import multiprocessing
+import os
+import re
+import threading
+from collections import deque
+
+### Chunked extraction over large FlowFile content
+### The content is decoded block by block and cut into sentence aligned chunks
+### that overlap by a few sentences, so an entity on a chunk boundary is seen
+### whole by at least one chunk.  Chunks run on a process pool (the model is
+### loaded once per worker process through nlp_models), at most two chunks per
+### worker are in flight, and the entities are shifted back to document
+### offsets and deduplicated where the chunks overlap.
+###
+###   FLANK_POOL_START_METHOD  multiprocessing start method for the pool (default fork,
+###                            spawn and forkserver re-import the __main__ module of the worker)
+### In content mode the processors only load their models inside the pool, so
+### the forked process does not inherit torch threads.
+
+READ_BLOCK = 64 * 1024
+START_METHOD = os.environ.get("FLANK_POOL_START_METHOD", "fork")
+
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+|\n")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _sentence_cut(buffer, limit):
+    """End of the last sentence that fits in buffer[:limit], falls back to whitespace, then to limit."""
+    floor = limit // 2
+    cut = None
+    for match in SENTENCE_END.finditer(buffer, floor, limit):
+        cut = match.end()
+    if cut is not None:
+        return cut
+    for match in WHITESPACE.finditer(buffer, floor, limit):
+        cut = match.end()
+    return cut if cut is not None else limit
+
+
+def _sentence_start(buffer, low, cut):
+    """Start of the first sentence at or after low, the next chunk starts there."""
+    if low >= cut:
+        return cut
+    match = SENTENCE_END.search(buffer, low, cut)
+    if match is not None and match.end() < cut:
+        return match.end()
+    match = WHITESPACE.search(buffer, low, cut)
+    if match is not None and match.end() < cut:
+        return match.end()
+    return low
+
+
+def iter_chunks(data, chunk_chars=20000, overlap_chars=200, encoding="utf-8"):
+    """Yield (offset, text) chunks of data (bytes or str), offsets are in characters."""
+    chunk_chars = max(int(chunk_chars), 2)
+    overlap_chars = min(max(int(overlap_chars), 0), chunk_chars // 4)
+
+    if isinstance(data, str):
+        buffer = data
+        done = True
+    else:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        view = memoryview(data)
+        position = 0
+        buffer = ""
+        done = False
+
+    base = 0
+    while True:
+        while not done and len(buffer) <= chunk_chars:
+            block = view[position:position + READ_BLOCK]
+            position += len(block)
+            done = position >= len(view)
+            buffer += decoder.decode(block, final=done)
+
+        if len(buffer) <= chunk_chars:
+            if buffer.strip() != "":
+                yield base, buffer
+            return
+
+        cut = _sentence_cut(buffer, chunk_chars)
+        yield base, buffer[:cut]
+        restart = _sentence_start(buffer, cut - overlap_chars, cut) if overlap_chars > 0 else cut
+        buffer = buffer[restart:]
+        base += restart
+
+
+def merge_entities(entities):
+    """Drop the copies of an entity found twice in overlapping chunks.
+
+    Overlapping spans with the same label are the same entity cut differently
+    by a chunk edge, the longest span is kept.
+    """
+    merged = []
+    for entity in sorted(entities, key=lambda item: (item["start"], item["start"] - item["end"])):
+        previous = merged[-1] if len(merged) > 0 else None
+        if previous is not None and previous["label"] == entity["label"] and entity["start"] < previous["end"]:
+            if entity["end"] - entity["start"] > previous["end"] - previous["start"]:
+                merged[-1] = entity
+            continue
+        merged.append(entity)
+    return merged
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """Process pool with workers processes (0 = one per CPU), shared per size."""
+    workers = int(workers) if workers else (os.cpu_count() or 1)
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD))
+            _pools[workers] = pool
+        return pool, workers
+
+
+def map_chunks(function, argument, chunks, workers=0):
+    """Yield (offset, function(argument, text)) for each chunk, in order.
+
+    workers=1 runs in the calling process.
+    """
+    if workers == 1:
+        for offset, text in chunks:
+            yield offset, function(argument, text)
+        return
+
+    pool, size = get_pool(workers)
+    pending = deque()
+    for offset, text in chunks:
+        pending.append((offset, pool.submit(function, argument, text)))
+        if len(pending) >= size * 2:
+            offset, future = pending.popleft()
+            yield offset, future.result()
+    while len(pending) > 0:
+        offset, future = pending.popleft()
+        yield offset, future.result()
+
+
+def extract(function, argument, data, chunk_chars=20000, overlap_chars=200, workers=0):
+    """Entities with document offsets for all of data, and the number of chunks."""
+    entities = []
+    chunkcount = 0
+    for offset, found in map_chunks(function, argument, iter_chunks(data, chunk_chars, overlap_chars), workers):
+        chunkcount += 1
+        for entity in found:
+            entity["start"] += offset
+            entity["end"] += offset
+            entities.append(entity)
+    return merge_entities(entities), chunkcount
+
+
+### Chunk workers, module level so the pool can pickle them
+
+def spacy_entities(model_name, text):
+    from nlp_models import load_spacy_ner
+
+    doc = load_spacy_ner(model_name)(text)
+    return [{"text": entity.text, "label": entity.label_, "start": entity.start_char, "end": entity.end_char}
+            for entity in doc.ents]
+
+
+def token_entities(model, text):
+    """model is the (checkpoint, quantize) pair from nlp_models.tier_model."""
+    from nlp_models import load_token_classifier
+
+    model_checkpoint, quantize = model
+    return [{"text": item["word"], "label": item["entity_group"], "start": int(item["start"]), "end": int(item["end"]),
+             "score": float(item["score"])}
+            for item in load_token_classifier(model_checkpoint, quantize)(text)]
+
+
+def pyap_addresses(countries, text):
+    """countries is a country code or a list of them."""
+    from address_scanner import parse
+
+    # offsets into text, pyap's own offsets are into its normalized copy
+    return [{"text": address["address"], "label": "ADDRESS", "start": address["start"], "end": address["end"],
+             "country": address["country"], "address": address["parsed"]}
+            for country in ([countries] if isinstance(countries, str) else countries)
+            for address in parse(text, country)]
@@ -0,0 +1,141 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import html
+import re
+
+from address_scanner import iter_lines
+
+### Streaming WebVTT cue parser
+### The content is decoded block by block and read line by line, one cue
+### block at a time, so a transcript is never held as a second string and
+### only the current cue is in memory.  NOTE, STYLE and REGION blocks are
+### skipped.  Cue text loses its tags (<v Speaker>, <i>, <00:01.000>) and
+### HTML entities are unescaped; cue_block puts back the voice tag a payload
+### starts with, so written WebVTT keeps its speakers.
+### https://www.w3.org/TR/webvtt1/
+
+TIMESTAMP = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})")
+TIMING = re.compile(r"^\s*(\S+)\s+-->\s+(\S+)\s*(.*)$")
+TAG = re.compile(r"<[^>]*>")
+VOICE = re.compile(r"<v(?:\.[^\s>]*)?[ \t][^>]*>")
+SKIPPED_BLOCKS = ("NOTE", "STYLE", "REGION")
+
+
+def parse_timestamp(value):
+    """Seconds of a WebVTT timestamp (hh:mm:ss.ttt or mm:ss.ttt)."""
+    match = TIMESTAMP.fullmatch(value)
+    if match is None:
+        raise ValueError("Invalid WebVTT timestamp " + value)
+    hours, minutes, seconds, milliseconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000.0
+
+
+def format_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    return "%02d:%02d:%02d.%03d" % (hours, minutes, milliseconds // 1000, milliseconds % 1000)
+
+
+def cue_text(payload):
+    text = "\n".join(payload)
+    if "<" in text:
+        text = TAG.sub("", text)
+    return html.unescape(text) if "&" in text else text
+
+
+def voice_tag(payload):
+    """The <v Speaker> tag the first payload line starts with, or an empty string."""
+    if len(payload) == 0:
+        return ""
+    match = VOICE.match(payload[0].lstrip())
+    return "" if match is None else match.group(0)
+
+
+def _cue(block):
+    """The cue of a block of lines as a dict, or None for other blocks."""
+    if block[0].startswith(SKIPPED_BLOCKS):
+        return None
+    identifier = None
+    timing = TIMING.match(block[0]) if "-->" in block[0] else None
+    if timing is None and len(block) > 1 and "-->" in block[1]:
+        identifier = block[0]
+        timing = TIMING.match(block[1])
+    if timing is None:
+        return None
+    payload = block[2 if identifier is not None else 1:]
+    return {"id": identifier, "start": parse_timestamp(timing.group(1)), "end": parse_timestamp(timing.group(2)),
+            "settings": timing.group(3), "payload": payload, "text": cue_text(payload)}
+
+
+def iter_cues(data, encoding="utf-8"):
+    """Yield the cues of a WebVTT file (bytes or str) as dicts with id, start and end (seconds),
+    settings, payload (the raw text lines) and text."""
+    lines = iter_lines(data, encoding)
+    first = next(lines, None)
+    if first is None or not first[1].lstrip("\ufeff").startswith("WEBVTT"):
+        raise ValueError("Content is not a WebVTT file, it does not start with WEBVTT")
+    header = True
+    block = []
+    for offset, line in lines:
+        line = line.rstrip("\r\n")
+        if line.strip() != "":
+            block.append(line)
+            continue
+        if len(block) > 0 and not header:
+            cue = _cue(block)
+            if cue is not None:
+                yield cue
+        # the header runs to the first blank line
+        header = False
+        block = []
+    if len(block) > 0 and not header:
+        cue = _cue(block)
+        if cue is not None:
+            yield cue
+
+
+def windows(cues, seconds):
+    """Merge cues into fixed windows of seconds by their start time, yields dicts with
+    window, start, end, text (the cue texts on one line) and cues (the number merged)."""
+    current = None
+    texts = []
+    for cue in cues:
+        window = int(cue["start"] // seconds)
+        if current is not None and current["window"] != window:
+            current["text"] = " ".join(texts)
+            yield current
+            current = None
+        if current is None:
+            current = {"window": window, "start": cue["start"], "end": cue["end"], "text": "", "cues": 0}
+            texts = []
+        current["end"] = max(current["end"], cue["end"])
+        current["cues"] += 1
+        texts.append(cue["text"].replace("\n", " "))
+    if current is not None:
+        current["text"] = " ".join(texts)
+        yield current
+
+
+def cue_block(cue):
+    """cue as WebVTT with its text as the payload, after the voice tag of its original payload,
+    ending with the blank line after it."""
+    lines = [] if cue["id"] is None else [cue["id"]]
+    timing = format_timestamp(cue["start"]) + " --> " + format_timestamp(cue["end"])
+    lines.append(timing + " " + cue["settings"] if cue["settings"] else timing)
+    # the text was unescaped, & < and > are not allowed bare in a cue payload
+    lines.append(voice_tag(cue["payload"]) + html.escape(cue["text"], quote=False))
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,130 @@
+# Licensed to the Apache Software Foundation (ASF) under one or more
+# contributor license agreements.  See the NOTICE file distributed with
+# this work for additional information regarding copyright ownership.
+# The ASF licenses this file to You under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with
+# the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+
+### Bulk Wikipedia extracts
+### One MediaWiki query takes up to MAX_TITLES titles.  TextExtracts returns
+### several extracts per response only for the intro section (exintro), at
+### most 20, so a query is continued until every page of the batch has its
+### extract.  Normalized titles and redirects are followed and mapped back
+### to the title that was asked for.  The same query without exintro fetches
+### the full extract of one page, and a prop=info query the last revision ids
+### of up to MAX_TITLES pages, which is all a cached page needs to revalidate.
+### https://www.mediawiki.org/wiki/Extension:TextExtracts#API
+
+MAX_TITLES = 50
+TITLE_SEPARATOR = re.compile(r"[|\r\n]+")
+# section headings of a TextExtracts extract, the patterns wikipediaapi splits pages on
+WIKI_SECTION = re.compile(r"\n\n *(==+) (.*?) (==+) *\n")
+HTML_SECTION = re.compile(r"\n? *<h([1-9])[^>]*?>(<span[^>]*></span>)? *(<span[^>]*>)? *(<span[^>]*></span>)? *(.*?) *"
+                          r"(</span>)?(<span>Edit</span>)?</h[1-9]>\n?")
+
+
+def parse_titles(text):
+    """Distinct titles of text, one per line or separated by | (which titles cannot contain), in order."""
+    titles = [title.strip() for title in TITLE_SEPARATOR.split(text or "")]
+    return list(dict.fromkeys(title for title in titles if title != ""))
+
+
+def batches(items, size=MAX_TITLES):
+    size = min(max(int(size), 1), MAX_TITLES)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def api_url(language):
+    return "https://" + language + ".wikipedia.org/w/api.php"
+
+
+def _resolve(titles, query):
+    """Map every requested title to the page title the API answers with."""
+    resolved = {title: title for title in titles}
+    for step in ("normalized", "redirects"):
+        renames = {item["from"]: item["to"] for item in query.get(step, [])}
+        for title, current in resolved.items():
+            resolved[title] = renames.get(current, current)
+    return resolved
+
+
+def fetch_batch(session, language, titles, html=False, timeout=30, intro=True):
+    """{requested title: page} for at most MAX_TITLES titles, a page has title, pageid, revid
+    and extract, or missing set when there is no such page.
+
+    intro=False fetches the full extract, which TextExtracts only returns for one page per query.
+    """
+    params = {"action": "query", "format": "json", "prop": "extracts|info", "titles": "|".join(titles),
+              "exlimit": "max", "redirects": 1}
+    if intro:
+        params["exintro"] = 1
+    if not html:
+        params.update({"explaintext": 1, "exsectionformat": "wiki"})
+    pages = dict()
+    resolved = None
+    continuation = dict()
+    while True:
+        response = session.get(api_url(language), params=dict(params, **continuation), timeout=timeout)
+        response.raise_for_status()
+        answer = response.json()
+        query = answer.get("query", {})
+        if resolved is None:
+            resolved = _resolve(titles, query)
+        for page in query.get("pages", {}).values():
+            found = pages.setdefault(page["title"], {"title": page["title"]})
+            if "missing" in page or "invalid" in page:
+                found["missing"] = True
+                continue
+            found["pageid"] = page.get("pageid")
+            if "lastrevid" in page:
+                found["revid"] = page["lastrevid"]
+            if "extract" in page:
+                found["extract"] = page["extract"]
+        if "continue" not in answer:
+            break
+        continuation = answer["continue"]
+    return {title: pages.get(resolved[title], {"title": resolved[title], "missing": True}) for title in titles}
+
+
+def fetch_revisions(session, language, titles, timeout=30):
+    """{requested title: last revision id} for at most MAX_TITLES titles, None for missing pages."""
+    params = {"action": "query", "format": "json", "prop": "info", "titles": "|".join(titles), "redirects": 1}
+    response = session.get(api_url(language), params=params, timeout=timeout)
+    response.raise_for_status()
+    query = response.json().get("query", {})
+    resolved = _resolve(titles, query)
+    revisions = {page["title"]: page.get("lastrevid") for page in query.get("pages", {}).values()
+                 if "missing" not in page and "invalid" not in page}
+    return {title: revisions.get(resolved[title]) for title in titles}
+
+
+def page_text(extract, html=False):
+    """The full text of a page from its extract, laid out like the text of a wikipediaapi page:
+    the summary, then every section as its title (or <hN> heading) and text."""
+    matches = list((HTML_SECTION if html else WIKI_SECTION).finditer(extract))
+    summary = extract[:matches[0].start()].strip() if len(matches) > 0 else ""
+    # as in wikipediaapi, a page that starts with a section has the whole extract as summary
+    text = (summary or extract.strip()) + "\n\n"
+    depth = 0
+    for number, match in enumerate(matches):
+        level = int(match.group(1)) if html else len(match.group(1))
+        title = (match.group(5) if html else match.group(2)).strip()
+        end = matches[number + 1].start() if number + 1 < len(matches) else len(extract)
+        body = extract[match.end():end]
+        if number + 1 < len(matches):
+            body = body.strip()
+        # wikipediaapi nests a section under the last one with a lower heading level
+        depth = min(depth + 1, level - 1)
+        heading = "<h%d>%s</h%d>" % (depth + 1, title, depth + 1) if html else title
+        text += heading + "\n" + body + ("\n\n" if len(body) > 0 else "")
+    return text.strip()